@@ -0,0 +1,142 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# --- CONFIGURATION ---
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Minimum cosine similarity for a new question to reuse a cached answer (0 disables the semantic tier)
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+
+def normalize_question(question: str) -> str:
+    """Lowercases, collapses whitespace and strips trailing punctuation so trivial variants share a key."""
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class _Entry:
+    __slots__ = ("answer", "created_at", "vector")
+
+    def __init__(self, answer: str, vector: Optional[np.ndarray]):
+        self.answer = answer
+        self.created_at = time.monotonic()
+        self.vector = vector
+
+
+class AnswerCache:
+    """
+    Two-tier cache of generated answers.
+
+    The exact tier is keyed by (namespace, normalized question). The semantic tier
+    reuses an answer when a new question's embedding has cosine similarity of at
+    least `threshold` with a cached question in the same namespace. Both tiers share
+    one LRU with a TTL. The namespace separates answers that were personalised for
+    different users.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl: float = ANSWER_CACHE_TTL_SECONDS,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.threshold > 0
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def get_exact(self, namespace: str, question: str) -> Optional[str]:
+        """Returns the cached answer for the same normalized question, if any. Does not count a miss."""
+        key = (namespace, normalize_question(question))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.exact_hits += 1
+        return entry.answer
+
+    def get_semantic(self, namespace: str, embedding: List[float]) -> Optional[str]:
+        """Returns the answer of the most similar cached question above the threshold, if any."""
+        if not self.semantic_enabled:
+            return None
+        candidates = []
+        for key, entry in list(self._entries.items()):
+            if self._expired(entry):
+                del self._entries[key]
+            elif key[0] == namespace and entry.vector is not None:
+                candidates.append((key, entry))
+        if not candidates:
+            return None
+
+        query = _unit(embedding)
+        matrix = np.stack([entry.vector for _, entry in candidates])
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        key, entry = candidates[best]
+        self._entries.move_to_end(key)
+        self.semantic_hits += 1
+        return entry.answer
+
+    def record_miss(self):
+        self.misses += 1
+
+    def put(self, namespace: str, question: str, answer: str, embedding: Optional[List[float]] = None):
+        """Stores an answer; the embedding is optional and only needed for the semantic tier."""
+        if self.max_entries <= 0:
+            return
+        vector = _unit(embedding) if embedding is not None else None
+        key = (namespace, normalize_question(question))
+        self._entries[key] = _Entry(answer, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached answer, e.g. after the documents have been re-ingested."""
+        self._entries.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "semantic_threshold": self.threshold,
+        }
+
+
+def _unit(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+# Shared cache for the API process
+answer_cache = AnswerCache()
@@ -0,0 +1,268 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from clients import backoff_delay
+
+logger = logging.getLogger("collegegpt.batch_writer")
+
+# --- CONFIGURATION ---
+# Documents per insert batch at the start; adapted between the min and max below
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "100"))
+INSERT_MIN_BATCH_SIZE = int(os.getenv("INSERT_MIN_BATCH_SIZE", "5"))
+INSERT_MAX_BATCH_SIZE = int(os.getenv("INSERT_MAX_BATCH_SIZE", "400"))
+# Insert batches sent to the vector store at the same time
+INSERT_CONCURRENCY = int(os.getenv("INSERT_CONCURRENCY", "4"))
+# Retries of a batch after transient errors (with jittered backoff) before it is split to find bad documents
+INSERT_RETRIES = int(os.getenv("INSERT_RETRIES", "3"))
+# Successful batches after a timeout before sizes above the timed-out size are tried again
+INSERT_PROBE_AFTER = int(os.getenv("INSERT_PROBE_AFTER", "50"))
+# Documents that still fail on their own are appended here as JSON lines ("" disables)
+INSERT_DEAD_LETTER_PATH = os.getenv("INSERT_DEAD_LETTER_PATH", ".cache/dead_letter.jsonl")
+
+
+# Exception class name fragments of the clients involved (httpx, astrapy, requests, azure) that mean "try again"
+_TRANSIENT_NAMES = ("Timeout", "Connection", "Transport", "Network", "Unavailable", "Throttl", "TooManyRequests")
+
+
+def _causes(error: Optional[BaseException]):
+    """The error and the exceptions it was raised from."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    """True for timeouts from any of the clients involved, including wrapped ones."""
+    return any(
+        isinstance(e, TimeoutError) or any("Timeout" in cls.__name__ for cls in type(e).__mro__)
+        for e in _causes(error)
+    )
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    True for errors worth retrying as they are: timeouts, connection and transport
+    failures, and HTTP 408/429/5xx. Anything else (e.g. a document the store
+    rejects) fails again on retry, so the batch is split instead.
+    """
+    for e in _causes(error):
+        if isinstance(e, (TimeoutError, ConnectionError)):
+            return True
+        if any(name in cls.__name__ for cls in type(e).__mro__ for name in _TRANSIENT_NAMES):
+            return True
+        status = getattr(getattr(e, "response", None), "status_code", None) or getattr(e, "status_code", None)
+        if isinstance(status, int) and (status in (408, 429) or status >= 500):
+            return True
+    return False
+
+
+class _Batch:
+    __slots__ = ("start", "end", "attempts", "not_before")
+
+    def __init__(self, start: int, end: int, attempts: int = 0, not_before: float = 0.0):
+        self.start = start
+        self.end = end
+        self.attempts = attempts
+        self.not_before = not_before
+
+    def __len__(self):
+        return self.end - self.start
+
+
+class BatchWriter:
+    """
+    Inserts documents into the vector store in concurrent, adaptively sized batches.
+
+    Up to `concurrency` batches are in flight. The batch size grows by 10% per
+    round of successful batches and is halved after a timeout (AIMD); it then
+    stays below the size that timed out until `INSERT_PROBE_AFTER` batches have
+    succeeded, so it settles just below what the store handles in time.
+
+    Transient failures (timeouts, connection errors, 429/5xx) are retried with
+    jittered backoff. A batch that fails otherwise, or keeps failing after
+    `retries` attempts, is split in halves, and halves are split again while they
+    fail, until the documents that cannot be written are isolated. Those are
+    appended to the dead-letter file with their text and metadata so they can be
+    inspected and replayed; the rest of the batch is still written.
+
+    `write(documents, ids)` must be an upsert (as `add_documents` with IDs is),
+    since a batch that timed out may have been partly written before its retry.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List, Optional[List[str]]], Any],
+        batch_size: int = INSERT_BATCH_SIZE,
+        min_batch_size: int = INSERT_MIN_BATCH_SIZE,
+        max_batch_size: int = INSERT_MAX_BATCH_SIZE,
+        concurrency: int = INSERT_CONCURRENCY,
+        retries: int = INSERT_RETRIES,
+        dead_letter_path: Optional[str] = INSERT_DEAD_LETTER_PATH,
+    ):
+        self.write = write
+        self.min_batch_size = max(1, min_batch_size)
+        self.max_batch_size = max(self.min_batch_size, max_batch_size)
+        self.batch_size = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.dead_letter_path = dead_letter_path or None
+        self.written = 0
+        self.batches = 0
+        self.retried = 0
+        self.timeouts = 0
+        self.splits = 0
+        self.dead_lettered = 0
+        self.write_seconds = 0.0
+        # Size of the last batch that timed out, and successes since then
+        self._timed_out_size: Optional[int] = None
+        self._successes = 0
+
+    def _grow(self):
+        self._successes += 1
+        if self._timed_out_size is not None and self._successes >= INSERT_PROBE_AFTER:
+            # The store may have recovered; allow larger batches again
+            self._timed_out_size = None
+        if self._successes % self.concurrency:
+            # One step per round of concurrent batches, not per batch
+            return
+        ceiling = self.max_batch_size if self._timed_out_size is None else self._timed_out_size - 1
+        self.batch_size = max(self.batch_size, min(ceiling, self.batch_size + max(1, self.batch_size // 10)))
+
+    def _shrink(self, timed_out_size: int):
+        self._timed_out_size = timed_out_size
+        self._successes = 0
+        # Batches sent before an earlier halving already count towards it
+        if timed_out_size >= self.batch_size:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def write_all(self, documents: List, ids: Optional[List[str]] = None) -> Dict[int, Exception]:
+        """
+        Writes every document; returns {index: error} for the documents that could not
+        be written (and were dead-lettered). An empty dict means everything was written.
+        """
+        started = time.perf_counter()
+        failed: Dict[int, Exception] = {}
+        cursor = 0
+        # Retries and split halves, written before new documents
+        queue: List[_Batch] = []
+        running: Dict[Future, _Batch] = {}
+
+        def submit(batch: _Batch):
+            batch_ids = ids[batch.start:batch.end] if ids is not None else None
+            running[pool.submit(self.write, documents[batch.start:batch.end], batch_ids)] = batch
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while cursor < len(documents) or queue or running:
+                now = time.monotonic()
+                while len(running) < self.concurrency:
+                    ready = next((batch for batch in queue if batch.not_before <= now), None)
+                    if ready is not None:
+                        queue.remove(ready)
+                        submit(ready)
+                    elif cursor < len(documents):
+                        end = min(cursor + self.batch_size, len(documents))
+                        submit(_Batch(cursor, end))
+                        cursor = end
+                    else:
+                        break
+
+                if not running:
+                    # Only retries waiting out their backoff are left
+                    time.sleep(max(0.0, min(batch.not_before for batch in queue) - now))
+                    continue
+                timeout = max(0.0, min(batch.not_before for batch in queue) - now) if queue else None
+                done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    batch = running.pop(future)
+                    self.batches += 1
+                    error = future.exception()
+                    if error is None:
+                        self.written += len(batch)
+                        self._grow()
+                        continue
+                    self._handle_failure(batch, error, queue, failed, documents, ids)
+
+        self.write_seconds += time.perf_counter() - started
+        return failed
+
+    def _handle_failure(
+        self,
+        batch: _Batch,
+        error: Exception,
+        queue: List[_Batch],
+        failed: Dict[int, Exception],
+        documents: List,
+        ids: Optional[List[str]],
+    ):
+        if is_timeout_error(error):
+            self.timeouts += 1
+            self._shrink(len(batch))
+            if len(batch) > self.batch_size:
+                # Too big for the store right now: resend as batches of the new size
+                for start in range(batch.start, batch.end, self.batch_size):
+                    queue.append(_Batch(start, min(start + self.batch_size, batch.end), batch.attempts))
+                return
+
+        if batch.attempts < self.retries and is_transient_error(error):
+            self.retried += 1
+            queue.append(_Batch(batch.start, batch.end, batch.attempts + 1, time.monotonic() + backoff_delay(batch.attempts)))
+        elif len(batch) > 1:
+            # Split to isolate the documents that keep failing. Halves are tried
+            # once each, so only failing halves are split further; a single
+            # document gets its retries again before it is given up on.
+            self.splits += 1
+            middle = batch.start + len(batch) // 2
+            for start, end in ((batch.start, middle), (middle, batch.end)):
+                queue.append(_Batch(start, end, 0 if end - start == 1 else self.retries))
+        else:
+            failed[batch.start] = error
+            self.dead_lettered += 1
+            self._dead_letter(documents[batch.start], ids[batch.start] if ids is not None else None, error)
+
+    def _dead_letter(self, document: Any, doc_id: Optional[str], error: Exception):
+        logger.warning(
+            "Giving up on chunk",
+            extra={"chunk_id": doc_id, "source": document.metadata.get("source"), "error": f"{type(error).__name__}: {error}"},
+        )
+        if not self.dead_letter_path:
+            return
+        directory = os.path.dirname(self.dead_letter_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record = {
+            "id": doc_id,
+            "error": f"{type(error).__name__}: {error}",
+            "failed_at": time.time(),
+            "page_content": document.page_content,
+            "metadata": document.metadata,
+        }
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+
+    def stats(self) -> dict:
+        return {
+            "written": self.written,
+            "dead_lettered": self.dead_lettered,
+            "batches": self.batches,
+            "retried": self.retried,
+            "timeouts": self.timeouts,
+            "splits": self.splits,
+            "batch_size": self.batch_size,
+            "write_seconds": round(self.write_seconds, 3),
+            "docs_per_second": round(self.written / self.write_seconds, 2) if self.write_seconds else 0.0,
+        }
+
+    def print_summary(self):
+        stats = self.stats()
+        print(
+            f"Inserted {stats['written']} chunks in {stats['batches']} batches "
+            f"({stats['docs_per_second']} chunks/s while writing, final batch size {stats['batch_size']}; "
+            f"{stats['retried']} retries, {stats['timeouts']} timeouts, {stats['dead_lettered']} dead-lettered)"
+        )
@@ -0,0 +1,139 @@
+import asyncio
+import inspect
+import os
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Generic, List, Optional, TypeVar
+
+from langchain_core.embeddings import Embeddings
+
+from metrics import embedding_batch_size, embedding_batch_wait_seconds
+
+# --- CONFIGURATION ---
+EMBED_BATCHING_ENABLED = os.getenv("EMBED_BATCHING_ENABLED", "true").lower() == "true"
+# How long the first question of a batch waits for others to join it
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+# A batch is sent as soon as it holds this many questions
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects items submitted within `window_ms` of each other (up to `max_size`)
+    and processes them with one call to `process(items) -> results`. Each caller
+    awaits only its own result; an error in the batch call is raised to every caller.
+    """
+
+    def __init__(self, process: Callable[[List[T]], Awaitable[List[R]]],
+                 window_ms: float = EMBED_BATCH_WINDOW_MS, max_size: int = EMBED_BATCH_MAX_SIZE,
+                 history: int = 1024):
+        self.process = process
+        self.window = window_ms / 1000.0
+        self.max_size = max(1, max_size)
+        self._pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes: Counter = Counter()
+        self._waits = deque(maxlen=history)
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        self.batch_sizes[len(batch)] += 1
+        waits = [started - enqueued for _, _, enqueued in batch]
+        self._waits.extend(waits)
+        embedding_batch_size.observe(len(batch))
+        for wait in waits:
+            embedding_batch_wait_seconds.observe(wait)
+        try:
+            results = await self.process([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future, _), result in zip(batch, results):
+            # A caller that timed out has already cancelled its future
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3) if waits else 0.0
+
+        return {
+            "window_ms": self.window * 1000,
+            "max_size": self.max_size,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "queue_wait_ms": {"p50": percentile(0.50), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
+
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Sends concurrent `aembed_query` calls to the underlying model as one batched
+    `aembed_documents` call. Gemini embeds queries and documents with different
+    task types, so batched questions are still embedded as queries.
+    Document embedding and the synchronous methods are passed through unchanged.
+    """
+
+    def __init__(self, underlying: Embeddings, window_ms: float = EMBED_BATCH_WINDOW_MS,
+                 max_size: int = EMBED_BATCH_MAX_SIZE):
+        self.underlying = underlying
+        parameters = inspect.signature(underlying.aembed_documents).parameters
+        self._query_kwargs = {"task_type": "retrieval_query"} if "task_type" in parameters else {}
+        self.batcher = MicroBatcher(self._embed_queries, window_ms, max_size)
+
+    async def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Identical questions in one batch are embedded once
+        unique = list(dict.fromkeys(texts))
+        vectors = await self.underlying.aembed_documents(unique, **self._query_kwargs)
+        by_text = dict(zip(unique, vectors))
+        return [by_text[text] for text in texts]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.underlying.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.batcher.submit(text)
+
+    def stats(self) -> dict:
+        return self.batcher.stats()
@@ -0,0 +1,99 @@
+"""
+Measures admission control and per-client rate limiting on /api/chat.
+
+Overload: a burst of simultaneous questions hits a worker whose LLM takes
+--llm-latency seconds per answer. With an unbounded queue every request is
+eventually served but everyone waits; with the bounded queue excess requests
+get a fast 429 and the admitted ones keep their latency.
+
+Rate limit: one anonymous client sends questions back to back; requests beyond
+the token bucket's burst are rejected with 429 and a Retry-After header.
+
+Usage (from the backend directory):
+    python benchmarks/bench_admission.py --burst 200 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Distinct questions would miss the cache anyway; this keeps every request on the full path
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+import httpx
+
+from fakes import FakeRetriever, ScriptedChatModel, load_app, make_corpus
+from loadtest import percentile
+
+
+async def burst(app, count):
+    """Sends `count` questions at once; returns ([(status, seconds)], wall seconds)."""
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def one(i):
+            started = time.perf_counter()
+            response = await client.post("/api/chat", json={"question": f"What is the fee for course {i}?"})
+            results.append((response.status_code, time.perf_counter() - started))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(count)))
+        return results, time.perf_counter() - started
+
+
+def summarize(label, results, wall):
+    served = [seconds for status, seconds in results if status == 200]
+    rejected = [seconds for status, seconds in results if status == 429]
+    print(f"{label:<10} {len(served):>6} {len(rejected):>8} {percentile(served, 50) * 1000:>9.0f} "
+          f"{percentile(served, 95) * 1000:>9.0f} {percentile(rejected, 95) * 1000:>11.1f} {wall:>7.2f}")
+
+
+async def run(args):
+    app = load_app(FakeRetriever(documents=make_corpus(20)),
+                   ScriptedChatModel(first_token_latency=args.llm_latency, token_latency=0.0))
+    import main
+    import rate_limit
+    from concurrency import AdmissionController
+
+    # One warning per rejected request would bury the results
+    logging.getLogger("collegegpt.api").setLevel(logging.ERROR)
+
+    print(f"Burst of {args.burst} questions, {args.max_in_flight} in flight, LLM {args.llm_latency * 1000:.0f} ms")
+    print(f"{'queue':<10} {'served':>6} {'rejected':>8} {'p50 ms':>9} {'p95 ms':>9} {'429 p95 ms':>11} {'wall s':>7}")
+    main.chat_limiter = AdmissionController(args.max_in_flight, max_queue=10 ** 6, queue_timeout=None)
+    summarize("unbounded", *await burst(app, args.burst))
+    main.chat_limiter = AdmissionController(args.max_in_flight, args.max_queue, args.queue_timeout)
+    summarize("bounded", *await burst(app, args.burst))
+
+    # Per-client token bucket for an anonymous client
+    rate_limit.RATE_LIMIT_ENABLED = True
+    statuses, retry_after = [], None
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for i in range(args.sequential):
+            response = await client.post("/api/chat", json={"question": f"Where is room {i}?"})
+            statuses.append(response.status_code)
+            retry_after = response.headers.get("retry-after", retry_after)
+    print(f"\nOne anonymous client, {args.sequential} back-to-back questions "
+          f"({rate_limit.ANON_CHAT_RATE_PER_MINUTE:g}/min, burst {rate_limit.ANON_CHAT_RATE_BURST:g}): "
+          f"{statuses.count(200)} served, {statuses.count(429)} rejected, Retry-After {retry_after}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark admission control and rate limiting.")
+    parser.add_argument("--burst", type=int, default=200, help="Simultaneous questions")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per answer")
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    parser.add_argument("--max-queue", type=int, default=32)
+    parser.add_argument("--queue-timeout", type=float, default=2.0)
+    parser.add_argument("--sequential", type=int, default=20, help="Back-to-back questions from one client")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compares the old fixed-size insert loop with the adaptive batch writer against a
+simulated vector store.
+
+The store takes --rtt seconds per request plus --per-doc seconds per document,
+times out (after --timeout seconds) on batches larger than --capacity documents,
+fails --error-rate of requests transiently and always rejects --poison bad
+documents. The old loop wrote fixed batches of 100 one at a time and skipped a
+batch on any error; the batch writer runs concurrent AIMD-sized batches, retries,
+and splits failing batches so only the bad documents are dead-lettered.
+
+Usage (from the backend directory):
+    python benchmarks/bench_batch_writer.py --documents 5000 --capacity 120
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import install_offline_stubs
+
+
+class FlakyStore:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.poison = set(random.Random(args.seed).sample(range(args.documents), args.poison))
+        self.stored = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def add_documents(self, documents, ids=None):
+        args = self.args
+        with self._lock:
+            self.requests += 1
+            transient = self.rng.random() < args.error_rate
+        if len(documents) > args.capacity:
+            time.sleep(args.timeout)
+            raise TimeoutError(f"insert of {len(documents)} documents timed out")
+        time.sleep(args.rtt + args.per_doc * len(documents))
+        if transient:
+            raise ConnectionError("connection reset by peer")
+        bad = [doc_id for doc_id in ids if int(doc_id) in self.poison]
+        if bad:
+            raise ValueError(f"invalid document {bad[0]}")
+        with self._lock:
+            self.stored.update(ids)
+        return ids
+
+
+def fixed_loop(store, documents, ids, batch_size=100):
+    """The old create_vector_store loop."""
+    for i in range(0, len(documents), batch_size):
+        try:
+            store.add_documents(documents[i:i + batch_size], ids=ids[i:i + batch_size])
+        except Exception:
+            continue
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the adaptive batch writer.")
+    parser.add_argument("--documents", type=int, default=5000)
+    parser.add_argument("--capacity", type=int, default=120, help="Largest batch the store accepts in time")
+    parser.add_argument("--rtt", type=float, default=0.05, help="Seconds per request")
+    parser.add_argument("--per-doc", type=float, default=0.002, help="Seconds per document")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Seconds before an oversized batch fails")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Share of requests failing transiently")
+    parser.add_argument("--poison", type=int, default=3, help="Documents that always fail")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    install_offline_stubs()
+    from langchain_core.documents import Document
+    from batch_writer import BatchWriter
+
+    documents = [Document(page_content=f"Chunk {i}", metadata={"source": "bench.pdf"}) for i in range(args.documents)]
+    ids = [str(i) for i in range(args.documents)]
+
+    print(f"{args.documents} documents, capacity {args.capacity}/batch, {args.rtt * 1000:.0f} ms + "
+          f"{args.per_doc * 1000:.0f} ms/doc, {args.error_rate:.0%} transient errors, {args.poison} bad documents")
+    print(f"{'writer':<10} {'written':>8} {'lost':>6} {'dead-letter':>12} {'requests':>9} {'seconds':>8} {'docs/s':>8}")
+
+    store = FlakyStore(args)
+    started = time.perf_counter()
+    fixed_loop(store, documents, ids)
+    elapsed = time.perf_counter() - started
+    print(f"{'fixed 100':<10} {len(store.stored):>8} {args.documents - len(store.stored):>6} {0:>12} "
+          f"{store.requests:>9} {elapsed:>8.2f} {len(store.stored) / elapsed:>8.0f}")
+
+    store = FlakyStore(args)
+    with tempfile.TemporaryDirectory() as workdir:
+        writer = BatchWriter(store.add_documents, dead_letter_path=os.path.join(workdir, "dead_letter.jsonl"))
+        started = time.perf_counter()
+        failed = writer.write_all(documents, ids)
+        elapsed = time.perf_counter() - started
+    lost = args.documents - len(store.stored) - len(failed)
+    print(f"{'adaptive':<10} {len(store.stored):>8} {lost:>6} {len(failed):>12} "
+          f"{store.requests:>9} {elapsed:>8.2f} {len(store.stored) / elapsed:>8.0f}")
+    print(f"\nBatch writer: {writer.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Measures query-embedding micro-batching under a burst of concurrent questions.
+
+Each question is embedded once per mode against fake embeddings with a fixed
+per-call latency, so the difference shows up as the number of embedding calls
+and the wall time of the burst.
+
+Usage (from the backend directory):
+    python benchmarks/bench_batching.py --concurrency 64 --latency 0.08
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import BACKEND_DIR, FakeEmbeddings
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def burst(embeddings, concurrency):
+    questions = [f"What are the library hours for hostel block {i}?" for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(embeddings.aembed_query(q) for q in questions))
+    return time.perf_counter() - started
+
+
+async def run(args):
+    from batching import BatchedEmbeddings
+
+    plain = FakeEmbeddings(latency=args.latency)
+    plain_seconds = await burst(plain, args.concurrency)
+
+    fake = FakeEmbeddings(latency=args.latency)
+    batched = BatchedEmbeddings(fake, window_ms=args.window_ms, max_size=args.max_batch)
+    batched_seconds = await burst(batched, args.concurrency)
+
+    print(f"Burst of {args.concurrency} questions, {args.latency * 1000:.0f} ms per embedding call")
+    print(f"{'mode':<10} {'calls':>6} {'seconds':>9}")
+    print(f"{'unbatched':<10} {plain.calls:>6} {plain_seconds:>9.3f}")
+    print(f"{'batched':<10} {fake.calls:>6} {batched_seconds:>9.3f}")
+    print(f"Batcher stats: {batched.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query-embedding micro-batching.")
+    parser.add_argument("--concurrency", type=int, default=64, help="Questions arriving at once")
+    parser.add_argument("--latency", type=float, default=0.08, help="Seconds per embedding call")
+    parser.add_argument("--window-ms", type=float, default=5.0, help="Batching window")
+    parser.add_argument("--max-batch", type=int, default=32, help="Maximum batch size")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measures how much prompt the retrieved context costs before and after context assembly.
+
+Documents are split the way ingest.py splits them (1000 characters, 150 overlap) and
+retrieval is simulated by picking runs of neighbouring chunks plus a few duplicates,
+which is what the vector store returns for questions about one section of a document.
+"Before" is the list of Documents formatted into the prompt as-is; "after" is
+context.assemble_context at the configured token budget.
+
+Usage (from the backend directory):
+    python benchmarks/bench_context.py --questions 200 --k 5 --budget 1500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+WORDS = (
+    "admission semester credit hostel library examination syllabus faculty laboratory "
+    "attendance scholarship department elective project internship placement fee "
+    "timetable assessment lecture tutorial registrar certificate transcript"
+).split()
+
+
+def make_document(rng, paragraphs=30):
+    lines = []
+    for _ in range(paragraphs):
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 30)))
+        lines.append(sentence.capitalize() + ".")
+    return "\n\n".join(lines)
+
+
+def make_chunks(files, seed):
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    rng = random.Random(seed)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    chunks_by_source = {}
+    for i in range(files):
+        source = f"handbook_{i}.pdf"
+        pieces = splitter.split_text(make_document(rng))
+        chunks_by_source[source] = [
+            Document(page_content=text, metadata={"source": source, "page": index // 3, "chunk_index": index})
+            for index, text in enumerate(pieces)
+        ]
+    return chunks_by_source
+
+
+def simulate_retrieval(rng, chunks_by_source, k):
+    """A run of neighbouring chunks from one source, topped up with repeats and another source."""
+    source, chunks = rng.choice(list(chunks_by_source.items()))
+    run = min(len(chunks), rng.randint(2, k))
+    start = rng.randint(0, len(chunks) - run)
+    docs = chunks[start:start + run]
+    while len(docs) < k:
+        if rng.random() < 0.5:
+            docs.append(rng.choice(docs))
+        else:
+            other = rng.choice(list(chunks_by_source.values()))
+            docs.append(rng.choice(other))
+    rng.shuffle(docs)
+    return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark context de-duplication and token budgeting.")
+    parser.add_argument("--questions", type=int, default=200, help="Simulated retrievals")
+    parser.add_argument("--k", type=int, default=5, help="Chunks returned per question")
+    parser.add_argument("--budget", type=int, default=1500, help="Context token budget")
+    parser.add_argument("--files", type=int, default=20, help="Source documents")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from context import assemble_context, estimate_tokens
+
+    rng = random.Random(args.seed)
+    chunks_by_source = make_chunks(args.files, args.seed)
+    before, after, seconds = [], [], []
+    for _ in range(args.questions):
+        docs = simulate_retrieval(rng, chunks_by_source, args.k)
+        before.append(estimate_tokens(str(docs)))
+        started = time.perf_counter()
+        context = assemble_context(docs, token_budget=args.budget)
+        seconds.append(time.perf_counter() - started)
+        after.append(estimate_tokens(context))
+
+    print(f"{args.questions} retrievals, k={args.k}, budget={args.budget} tokens (estimated)")
+    print(f"{'':<22} {'mean':>8} {'p95':>8} {'max':>8}")
+    for label, values in (("tokens before", before), ("tokens after", after)):
+        ordered = sorted(values)
+        p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        print(f"{label:<22} {statistics.mean(values):>8.0f} {p95:>8} {ordered[-1]:>8}")
+    print(f"Reduction: {1 - sum(after) / sum(before):.1%}")
+    print(f"Assembly time: mean {statistics.mean(seconds) * 1000:.3f} ms, max {max(seconds) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
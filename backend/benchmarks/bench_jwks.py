@@ -0,0 +1,77 @@
+"""
+Benchmarks Clerk token verification against a local JWKS stub.
+
+Compares the old behaviour (fetch the JWKS on every request) with the cached
+key set and with the verified-token cache hot path.
+
+Usage (from the backend directory):
+    python benchmarks/bench_jwks.py --iterations 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import BACKEND_DIR, LocalJWKSServer
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+async def time_per_call(fn, iterations):
+    # One warm-up call so the cold JWKS fetch is not averaged into the hot path
+    await fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await fn()
+    return (time.perf_counter() - started) / iterations
+
+
+async def run(iterations):
+    with LocalJWKSServer() as server:
+        os.environ["ENVIRONMENT"] = "production"
+        os.environ["CLERK_SECRET_KEY"] = server.audience
+        import jwt
+        from fastapi.security import HTTPAuthorizationCredentials
+        from clerk_auth import ClerkAuth, JWKSCache, VerifiedTokenCache, fetch_jwks
+
+        token = server.make_token()
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+        async def uncached():
+            # What every request used to do: fetch the key set, then verify
+            jwks = await fetch_jwks(server.url)
+            key = jwt.PyJWKSet.from_dict(jwks)[server.kid]
+            jwt.decode(token, key=key.key, algorithms=["RS256"], audience=server.audience)
+
+        keys_only = ClerkAuth()
+        keys_only.jwks_cache = JWKSCache(url=server.url)
+        keys_only.token_cache = VerifiedTokenCache(max_size=0)
+
+        hot = ClerkAuth()
+        hot.jwks_cache = JWKSCache(url=server.url)
+
+        results = {
+            "fetch JWKS every request": await time_per_call(uncached, iterations),
+            "cached JWKS, verify signature": await time_per_call(lambda: keys_only.verify_token(credentials), iterations),
+            "cached JWKS + token cache": await time_per_call(lambda: hot.verify_token(credentials), iterations),
+        }
+
+        print(f"{'mode':<32} {'per call':>12}")
+        for mode, seconds in results.items():
+            print(f"{mode:<32} {seconds * 1e6:>10.1f}us")
+        print(f"\nJWKS requests served: {server.requests} "
+              f"(cached verifiers fetched {keys_only.jwks_cache.fetch_count + hot.jwks_cache.fetch_count} times)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Clerk token verification with a local JWKS stub.")
+    parser.add_argument("--iterations", type=int, default=500, help="Verifications per mode")
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compares the old temp-file document loading path with in-memory parsing.
+
+Each mode runs in its own subprocess so peak RSS can be measured independently.
+The synthetic corpus (text, PDF and PowerPoint files) is generated identically
+in both modes, so the difference in peak RSS comes from the loading path.
+
+Usage (from the backend directory):
+    python benchmarks/bench_loaders.py --files 30 --pages 20
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import BACKEND_DIR, make_blob_corpus
+
+sys.path.insert(0, BACKEND_DIR)
+
+def parse_via_tempfile(blob_name, blob_data):
+    """The previous loading path: write the bytes to disk, then reopen them with a file loader."""
+    import tempfile
+    from langchain_core.documents import Document
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(blob_name)[1]) as temp_file:
+        temp_file.write(blob_data)
+        temp_file_path = temp_file.name
+    try:
+        if blob_name.endswith(".pdf"):
+            return PyPDFLoader(temp_file_path).load()
+        if blob_name.endswith(".txt"):
+            return TextLoader(temp_file_path, encoding="utf-8").load()
+        if blob_name.endswith(".pptx"):
+            # UnstructuredPowerPointLoader is not installed by requirements.txt; read the file with python-pptx
+            from pptx import Presentation
+
+            presentation = Presentation(temp_file_path)
+            text = "\n\n".join(
+                shape.text_frame.text for slide in presentation.slides for shape in slide.shapes if shape.has_text_frame
+            )
+            return [Document(page_content=text, metadata={"source": temp_file_path})]
+        return []
+    finally:
+        os.unlink(temp_file_path)
+
+
+def run_worker(mode, files, pages, rounds):
+    import contextlib
+    import io
+
+    # Import the ingestion module in both modes so module imports do not skew peak RSS
+    import ingest
+
+    corpus = make_blob_corpus(files, pages)
+    parse_blob = ingest.parse_blob if mode == "memory" else parse_via_tempfile
+
+    documents = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(rounds):
+            for blob_name, blob_data in corpus:
+                documents += len(parse_blob(blob_name, blob_data))
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "mode": mode,
+        "seconds": elapsed,
+        "documents": documents,
+        "corpus_mb": sum(len(data) for _, data in corpus) / 1e6,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark temp-file vs in-memory document loading.")
+    parser.add_argument("--files", type=int, default=30, help="Number of synthetic files (txt/pdf/pptx)")
+    parser.add_argument("--pages", type=int, default=20, help="Pages/slides per file")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each file is parsed")
+    parser.add_argument("--worker", choices=["tempfile", "memory"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.files, args.pages, args.rounds)
+        return
+
+    results = []
+    for mode in ("tempfile", "memory"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", mode,
+             "--files", str(args.files), "--pages", str(args.pages), "--rounds", str(args.rounds)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Corpus: {args.files} files, {results[0]['corpus_mb']:.1f} MB, parsed {args.rounds}x")
+    print(f"{'mode':<10} {'seconds':>9} {'docs':>7} {'peak RSS MB':>12}")
+    for result in results:
+        print(f"{result['mode']:<10} {result['seconds']:>9.2f} {result['documents']:>7} {result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measures the memory held by the conversation session store under churn.
+
+Simulates many users each having a multi-turn conversation with long answers,
+then reports the store's own byte accounting (text payload) next to the Python
+heap actually allocated for it (tracemalloc), plus the time per append/lookup
+for the in-memory store and for the SQLite store shared by the workers.
+
+Usage (from the backend directory):
+    python benchmarks/bench_sessions.py --sessions 20000 --turns 12
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bounded session store.")
+    parser.add_argument("--sessions", type=int, default=20000, help="Distinct conversations")
+    parser.add_argument("--turns", type=int, default=12, help="Turns per conversation")
+    parser.add_argument("--max-sessions", type=int, default=5000)
+    parser.add_argument("--max-turns", type=int, default=6)
+    parser.add_argument("--max-bytes", type=int, default=8192)
+    parser.add_argument("--sqlite-sessions", type=int, default=2000, help="Conversations for the SQLite store timing")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from sessions import SessionStore, SQLiteSessionStore
+
+    answer = "The hostel fee is payable per semester and covers accommodation and mess charges. " * 20
+
+    def simulate(store, sessions=args.sessions):
+        """Interleaves the conversations, as many concurrent users would; returns the number of turns."""
+        rng = random.Random(args.seed)
+        active = [f"anon:{i}" for i in range(sessions)]
+        remaining = dict.fromkeys(active, args.turns)
+        turns = 0
+        while active:
+            slot = rng.randrange(len(active))
+            key = active[slot]
+            store.history(key)
+            store.append(key, f"Question {remaining[key]} about fees for course CS{rng.randint(100, 499)}?", answer)
+            turns += 1
+            remaining[key] -= 1
+            if not remaining[key]:
+                active[slot] = active[-1]
+                active.pop()
+        return turns
+
+    def new_store():
+        return SessionStore(max_sessions=args.max_sessions, max_turns=args.max_turns, max_bytes=args.max_bytes)
+
+    started = time.perf_counter()
+    turns = simulate(new_store())
+    elapsed = time.perf_counter() - started
+
+    # Second run under tracemalloc, which is too slow to time
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    store = new_store()
+    simulate(store)
+    heap = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    stats = store.stats()
+    print(f"{args.sessions} conversations x {args.turns} turns, caps: {args.max_sessions} sessions, "
+          f"{args.max_turns} turns, {args.max_bytes} bytes per session")
+    print(f"Sessions held:        {stats['sessions']} ({stats['evictions']} evicted, {stats['turns_dropped']} turns dropped)")
+    print(f"Text bytes (store):   {stats['bytes'] / 1024 / 1024:.2f} MiB, "
+          f"max {stats['max_session_bytes']} / mean {stats['mean_session_bytes']:.0f} bytes per session")
+    print(f"Python heap (traced): {heap / 1024 / 1024:.2f} MiB ({heap / max(stats['sessions'], 1):.0f} bytes per session)")
+    print(f"Time per lookup + append: {elapsed / turns * 1e6:.1f} us")
+
+    # The store the workers share by default: the same caps, in a SQLite file
+    with tempfile.TemporaryDirectory() as workdir:
+        store = SQLiteSessionStore(os.path.join(workdir, "sessions.db"), max_sessions=args.max_sessions,
+                                   max_turns=args.max_turns, max_bytes=args.max_bytes)
+        started = time.perf_counter()
+        turns = simulate(store, args.sqlite_sessions)
+        elapsed = time.perf_counter() - started
+        stats = store.stats()
+        store._conn.close()
+    print(f"SQLite store ({args.sqlite_sessions} conversations): {stats['sessions']} sessions, "
+          f"{stats['bytes'] / 1024 / 1024:.2f} MiB, {elapsed / turns * 1e6:.1f} us per lookup + append")
+
+
+if __name__ == "__main__":
+    main()
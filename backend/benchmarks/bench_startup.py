@@ -0,0 +1,122 @@
+"""
+Measures API cold start: the time to `import main` and, with uvicorn, the time
+until the first request is answered and until the service reports ready.
+
+Each measurement runs in a fresh subprocess. Pass --git-ref to measure an older
+revision of the backend (exported with `git archive`) for a before/after comparison.
+
+Usage (from the backend directory):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --git-ref HEAD~1 --runs 3
+"""
+import argparse
+import io
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import BACKEND_DIR
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def offline_env():
+    """Dummy credentials so startup follows the production path without real services."""
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "offline-benchmark-key")
+    env.setdefault("ENVIRONMENT", "development")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    return env
+
+
+def export_backend(ref, target):
+    """Extracts backend/ at a git revision into `target` and returns its path."""
+    archive = subprocess.run(
+        ["git", "archive", "--format=tar", ref, "backend"],
+        cwd=os.path.dirname(BACKEND_DIR), check=True, capture_output=True,
+    ).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target)
+    return os.path.join(target, "backend")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, deadline, status=200):
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == status:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def measure_import(backend_dir):
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=backend_dir, env=offline_env(),
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def measure_server(backend_dir, timeout):
+    """Returns (seconds until /health answered, seconds until /health/ready answered or None)."""
+    port = free_port()
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir, env=offline_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + timeout
+        first_request = time.monotonic() - started if wait_for(f"http://127.0.0.1:{port}/health", deadline) else None
+        ready = None
+        if wait_for(f"http://127.0.0.1:{port}/health/ready", min(deadline, time.monotonic() + 5)):
+            ready = time.monotonic() - started
+        return first_request, ready
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def fmt(value):
+    return f"{value:.2f}s" if value is not None else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API import time and time to first request.")
+    parser.add_argument("--git-ref", help="Measure this git revision of backend/ instead of the working tree")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--timeout", type=float, default=300, help="Give up on the server after this many seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backend_dir = export_backend(args.git_ref, workdir) if args.git_ref else BACKEND_DIR
+        imports = [measure_import(backend_dir) for _ in range(args.runs)]
+        servers = [measure_server(backend_dir, args.timeout) for _ in range(args.runs)]
+
+    first_requests = [first for first, _ in servers if first is not None]
+    readies = [ready for _, ready in servers if ready is not None]
+    print(f"Revision: {args.git_ref or 'working tree'} ({args.runs} runs, median)")
+    print(f"  import main:           {fmt(statistics.median(imports))}")
+    print(f"  first request served:  {fmt(statistics.median(first_requests) if first_requests else None)}")
+    print(f"  /health/ready = 200:   {fmt(statistics.median(readies) if readies else None)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Runs the API under gunicorn (gunicorn.conf.py) with 1 and more uvicorn workers
+on the local vector index and the BM25 index, against stubbed Gemini.
+
+Reported per worker count:
+- chat throughput and latency over real HTTP (scales with the cores available)
+- memory: summed RSS counts the memory-mapped index pages once per worker,
+  summed PSS splits shared pages between the workers, so the gap is what
+  sharing the indexes saves
+- reload propagation: the index is rebuilt and the shared generation bumped
+  (as `python ingest.py` does); the time until every worker serves the new index
+
+Linux only (memory figures come from /proc).
+
+Usage (from the backend directory):
+    python benchmarks/bench_workers.py --workers 1 2 4 --courses 20000 --requests 400
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import httpx
+
+from bench_hybrid import make_catalogue, questions
+from fakes import BACKEND_DIR, FakeEmbeddings, ScriptedChatModel, install_offline_stubs
+from loadtest import percentile
+
+
+def create_app():
+    """App factory for the gunicorn workers: the real app with fake Gemini clients."""
+    install_offline_stubs()
+    import cached_embeddings
+
+    cached_embeddings._shared_embeddings = cached_embeddings.CachedEmbeddings(FakeEmbeddings(size=768))
+    import main
+
+    latency = float(os.environ.get("BENCH_LLM_LATENCY", "0"))
+    main.build_llm = lambda: ScriptedChatModel(first_token_latency=latency, token_latency=0.0)
+    return main.app
+
+
+def build_indexes(workdir, courses, seed):
+    install_offline_stubs()
+    from lexical_index import build_lexical_index
+    from local_index import build_local_index
+
+    documents, facts = make_catalogue(courses, seed)
+    ids = [f"course-{i}" for i in range(len(documents))]
+    build_local_index(documents, ids, FakeEmbeddings(size=768), os.path.join(workdir, "vectors"))
+    build_lexical_index(documents, ids, os.path.join(workdir, "lexical"))
+    return facts
+
+
+def memory_kib(pid):
+    """(RSS, PSS) of a process in KiB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1])
+    return values["Rss:"], values["Pss:"]
+
+
+async def worker_health(client, workers, attempts=2000):
+    """Polls /health until every worker answered; returns {pid: health}."""
+    seen = {}
+    for _ in range(attempts):
+        responses = await asyncio.gather(*(client.get("/health") for _ in range(workers * 2)), return_exceptions=True)
+        for response in responses:
+            if isinstance(response, httpx.Response) and response.status_code == 200:
+                health = response.json()
+                seen[health["shared_state"]["pid"]] = health
+        if len(seen) >= workers:
+            return seen
+        await asyncio.sleep(0.05)
+    raise RuntimeError(f"Only {len(seen)} of {workers} workers answered")
+
+
+async def wait_until(client, workers, predicate, timeout=120):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            seen = await worker_health(client, workers, attempts=1)
+            if all(predicate(health) for health in seen.values()):
+                return time.perf_counter() - started
+        except (RuntimeError, httpx.TransportError):
+            pass
+        await asyncio.sleep(0.02)
+    raise RuntimeError("Timed out waiting for the workers")
+
+
+async def chat_load(client, asked, concurrency, total):
+    latencies = []
+    counter = iter(range(total))
+
+    async def user():
+        for i in counter:
+            started = time.perf_counter()
+            response = await client.post("/api/chat", json={"question": asked[i % len(asked)][0]})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def measure(args, workers, workdir, port, asked):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        LOG_LEVEL="warning",
+        RETRIEVAL_BACKEND="local",
+        LOCAL_INDEX_DIR=os.path.join(workdir, "vectors"),
+        LEXICAL_INDEX_DIR=os.path.join(workdir, "lexical"),
+        SHARED_STATE_DIR=os.path.join(workdir, f"shared_state_{workers}"),
+        SHARED_STATE_POLL_SECONDS=str(args.poll),
+        EMBEDDING_CACHE_PATH="",
+        ANSWER_CACHE_ENABLED="false",
+        BENCH_LLM_LATENCY=str(args.llm_latency),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND_DIR, "gunicorn.conf.py"),
+         "--pythonpath", f"{BACKEND_DIR},{BENCH_DIR}", "--access-logfile", "/dev/null", "bench_workers:create_app()"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        # Health probes use a new connection each, so they reach every worker rather than the one holding a keep-alive connection
+        async with httpx.AsyncClient(base_url=base_url, timeout=60,
+                                     limits=httpx.Limits(max_keepalive_connections=0)) as probe, \
+                httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            await wait_until(probe, workers, lambda health: health["ready"])
+            await chat_load(client, asked, args.concurrency, args.concurrency * 4)
+            latencies, wall = await chat_load(client, asked, args.concurrency, args.requests)
+
+            pids = list(await worker_health(probe, workers))
+            rss, pss = zip(*(memory_kib(pid) for pid in pids))
+
+            # Publish a bigger index as `python ingest.py` would, then wait for every worker to serve it
+            await asyncio.to_thread(build_indexes, workdir, args.courses + 100, args.seed)
+            from shared_state import SharedState
+
+            generation = SharedState(env["SHARED_STATE_DIR"]).bump("bench")
+            reload_seconds = await wait_until(
+                probe, workers,
+                lambda health: health["shared_state"]["seen_generation"] == generation
+                and health["lexical_index"] == args.courses + 100,
+            )
+        # Leave the original index for the next worker count
+        await asyncio.to_thread(build_indexes, workdir, args.courses, args.seed)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    print(f"{workers:>7} {len(latencies) / wall:>8.1f} {percentile(latencies, 50) * 1000:>7.1f} "
+          f"{percentile(latencies, 95) * 1000:>7.1f} {sum(rss) / 1024:>8.0f} {sum(pss) / 1024:>8.0f} "
+          f"{reload_seconds:>9.2f}")
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        facts = build_indexes(workdir, args.courses, args.seed)
+        asked = questions(facts, 200, args.seed)
+        index_bytes = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(workdir) for name in names
+        )
+        print(f"{args.courses} chunks, indexes {index_bytes / 2 ** 20:.0f} MiB on disk, {os.cpu_count()} CPUs, "
+              f"LLM {args.llm_latency * 1000:.0f} ms, {args.concurrency} concurrent clients, "
+              f"polling every {args.poll:g}s")
+        print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>7} {'p95 ms':>7} {'RSS MiB':>8} {'PSS MiB':>8} {'reload s':>9}")
+        for workers in args.workers:
+            await measure(args, workers, workdir, args.port, asked)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API with several gunicorn workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--courses", type=int, default=20000, help="Chunks in the indexes")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per answer")
+    parser.add_argument("--poll", type=float, default=1.0, help="SHARED_STATE_POLL_SECONDS for the workers")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+Deterministic local stand-ins for the external services used by the API,
+so the request path can be exercised without Gemini, Astra DB, Clerk or Azure.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForLLMRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.retrievers import BaseRetriever
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_ANSWER = (
+    "The central library is open from 8 AM to 10 PM on weekdays and from "
+    "10 AM to 6 PM on weekends. During exams it stays open until midnight."
+)
+
+
+def make_corpus(size: int = 20) -> List[Document]:
+    """Builds a small synthetic corpus of college documents."""
+    topics = ["library hours", "exam schedule", "hostel rules", "fee structure", "course catalogue"]
+    return [
+        Document(
+            page_content=f"Document {i} about {topics[i % len(topics)]}. " * 10,
+            metadata={"source": f"doc_{i}.txt"},
+        )
+        for i in range(size)
+    ]
+
+
+# --- SYNTHETIC BLOBS ---
+
+BLOB_LINE = "Admission to the B.Tech programme requires a valid entrance score and transcripts. "
+
+
+def make_pdf(pages: int, lines_per_page: int = 40) -> bytes:
+    """Builds a minimal multi-page PDF with real text content streams."""
+    objects = []
+    page_ids = [4 + 2 * i for i in range(pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i in range(pages):
+        lines = "".join(f"({BLOB_LINE[:70]} p{i} l{j}) Tj 0 -14 Td " for j in range(lines_per_page))
+        stream = f"BT /F1 10 Tf 40 800 Td {lines}ET".encode()
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def make_pptx(slides: int) -> bytes:
+    import io
+    from pptx import Presentation
+
+    presentation = Presentation()
+    for i in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {i}"
+        slide.placeholders[1].text = BLOB_LINE * 5
+    buffer = io.BytesIO()
+    presentation.save(buffer)
+    return buffer.getvalue()
+
+
+def make_blob_corpus(files: int, pages: int) -> List[Tuple[str, bytes]]:
+    """Builds (name, bytes) pairs cycling through text, PDF and PowerPoint files."""
+    corpus = []
+    for i in range(files):
+        kind = i % 3
+        if kind == 0:
+            corpus.append((f"notes_{i}.txt", (BLOB_LINE * 40 * pages).encode("utf-8")))
+        elif kind == 1:
+            corpus.append((f"handbook_{i}.pdf", make_pdf(pages)))
+        else:
+            corpus.append((f"lecture_{i}.pptx", make_pptx(pages)))
+    return corpus
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words hashing embeddings: texts sharing most of their
+    words get a high cosine similarity, like a real embedding model would give.
+    """
+
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        self.latency = latency
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.size] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeRetriever(BaseRetriever):
+    """Returns the first `k` documents of a fixed corpus after a simulated network delay."""
+
+    documents: List[Document]
+    k: int = 5
+    latency: float = 0.05
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        time.sleep(self.latency)
+        return self.documents[: self.k]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        await asyncio.sleep(self.latency)
+        return self.documents[: self.k]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Chat model that always answers with `answer`, waiting `first_token_latency`
+    before the first token and `token_latency` between word tokens.
+    """
+
+    answer: str = DEFAULT_ANSWER
+    first_token_latency: float = 0.2
+    token_latency: float = 0.01
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def _tokens(self) -> List[str]:
+        words = self.answer.split(" ")
+        return [word + " " for word in words[:-1]] + words[-1:]
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.answer))])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens():
+            await asyncio.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class LocalJWKSServer:
+    """
+    Serves a freshly generated RSA key as a JWKS document on localhost and signs
+    tokens with it, standing in for Clerk's https://api.clerk.dev/v1/jwks.
+    """
+
+    def __init__(self, kid: str = "bench-key", audience: str = "bench-secret"):
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        import jwt
+
+        self.kid = kid
+        self.audience = audience
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({"kid": kid, "use": "sig", "alg": "RS256"})
+        self.jwks = {"keys": [jwk]}
+        self.requests = 0
+        # TCP connections accepted, to show keep-alive reuse
+        self.connections = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like Clerk's API
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, Nagle + delayed ACK add 40 ms
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                server.connections += 1
+                super().setup()
+
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.jwks).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/v1/jwks"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def make_token(self, sub: str = "user_bench", ttl: int = 3600) -> str:
+        import jwt
+
+        now = int(time.time())
+        claims = {"sub": sub, "aud": self.audience, "iat": now, "exp": now + ttl, "given_name": "Bench"}
+        return jwt.encode(claims, self.private_key, algorithm="RS256", headers={"kid": self.kid})
+
+
+class LocalBlob:
+    """The subset of Azure's BlobProperties used by ingestion."""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.size = len(data)
+        self.etag = hashlib.md5(data).hexdigest()
+        self.last_modified = datetime.now(timezone.utc)
+
+
+class _LocalDownload:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def readall(self) -> bytes:
+        return self._data
+
+
+class LocalBlobStore:
+    """
+    In-memory stand-in for both BlobServiceClient and ContainerClient, serving
+    the given (name, bytes) files with a simulated per-download latency.
+    """
+
+    def __init__(self, files: List[Tuple[str, bytes]], latency: float = 0.0):
+        self.files = dict(files)
+        self.latency = latency
+        self.downloads = 0
+
+    def get_container_client(self, container_name: str) -> "LocalBlobStore":
+        return self
+
+    def list_blobs(self) -> List[LocalBlob]:
+        return [LocalBlob(name, data) for name, data in self.files.items()]
+
+    def download_blob(self, name: str, **kwargs) -> _LocalDownload:
+        self.downloads += 1
+        time.sleep(self.latency)
+        return _LocalDownload(self.files[name])
+
+
+class InMemoryVectorStore:
+    """Stands in for AstraDBVectorStore during ingestion: upserts and deletes by ID."""
+
+    def __init__(self, embeddings: Optional[Embeddings] = None, latency: float = 0.0):
+        self.embeddings = embeddings or FakeEmbeddings()
+        self.latency = latency
+        self.documents = {}
+        self.vectors = {}
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        ids = ids or [hashlib.md5(doc.page_content.encode("utf-8")).hexdigest() for doc in documents]
+        vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        time.sleep(self.latency)
+        for doc_id, doc, vector in zip(ids, documents, vectors):
+            self.documents[doc_id] = doc
+            self.vectors[doc_id] = vector
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None) -> bool:
+        for doc_id in ids or []:
+            self.documents.pop(doc_id, None)
+            self.vectors.pop(doc_id, None)
+        return True
+
+
+class _OfflineVectorStore:
+    """Replaces AstraDBVectorStore at import time so main.py does not try to connect."""
+
+    def __init__(self, *args, **kwargs):
+        raise RuntimeError("Astra DB is disabled in offline mode")
+
+
+def install_offline_stubs():
+    """
+    Prepares the environment so `import main` works without credentials or network:
+    dummy API keys, development auth and an Astra DB class that fails fast.
+    """
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark-key")
+    os.environ.setdefault("ENVIRONMENT", "development")
+    # Per-request log lines would dominate the benchmark output
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Every benchmark request comes from the same client
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    import langchain_astradb
+    langchain_astradb.AstraDBVectorStore = _OfflineVectorStore
+
+
+def load_app(retriever: BaseRetriever, llm: BaseChatModel, embeddings: Optional[Embeddings] = None):
+    """Imports the FastAPI app and swaps its retriever, LLM and embeddings for the given fakes."""
+    install_offline_stubs()
+    import main
+    from cached_embeddings import CachedEmbeddings
+    from langchain_core.runnables import RunnablePassthrough
+
+    if not isinstance(embeddings, CachedEmbeddings):
+        embeddings = CachedEmbeddings(embeddings or FakeEmbeddings())
+    main.embeddings = embeddings
+    main.llm = llm
+    main.answer_chain = main.build_answer_chain(llm)
+    chain = {"context": retriever, "question": RunnablePassthrough()} | main.answer_chain
+    main.rag = main.RagState(retriever=retriever, chain=chain)
+    return main.app
@@ -0,0 +1,127 @@
+"""
+Load-test harness for the chat endpoints against stubbed backends.
+
+Runs N concurrent clients against the in-process FastAPI app (no network,
+no credentials) and reports requests/sec and latency percentiles.
+
+Usage (from the backend directory):
+    python benchmarks/loadtest.py --concurrency 1 8 32 --requests 200
+    python benchmarks/loadtest.py --endpoint /api/chat/stream --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from fakes import FakeRetriever, ScriptedChatModel, load_app, make_corpus
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_load(app, endpoint, concurrency, total_requests, question="What are the library hours?", tokens=None):
+    """
+    Sends `total_requests` requests using `concurrency` concurrent clients.
+    Request i carries `tokens[i % len(tokens)]` as a bearer token when tokens are given.
+    Time to first byte is reported separately, which matters for the streaming endpoint.
+    """
+    latencies = []
+    first_bytes = []
+    errors = 0
+    rejected = 0
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(i)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+
+        async def worker():
+            nonlocal errors, rejected
+            while True:
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"} if tokens else {}
+                started = time.perf_counter()
+                first_byte = None
+                body = b""
+                async with client.stream("POST", endpoint, json={"question": question}, headers=headers) as response:
+                    async for chunk in response.aiter_bytes():
+                        if first_byte is None:
+                            first_byte = time.perf_counter() - started
+                        body += chunk
+                latencies.append(time.perf_counter() - started)
+                first_bytes.append(first_byte if first_byte is not None else latencies[-1])
+                if response.status_code == 429:
+                    rejected += 1
+                elif response.status_code != 200 or b'"error"' in body:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "rejected": rejected,
+        "rps": total_requests / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "ttfb_p50_ms": percentile(first_bytes, 50) * 1000,
+        "ttfb_p95_ms": percentile(first_bytes, 95) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the chat API against stubbed backends.")
+    parser.add_argument("--endpoint", default="/api/chat", help="Endpoint to call (/api/chat or /api/chat/stream)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent client counts to test")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--retrieval-latency", type=float, default=0.05, help="Simulated retrieval latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Simulated time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Simulated per-token latency (s)")
+    parser.add_argument("--cache", action="store_true", help="Keep the answer cache enabled (off by default so every request hits the chain)")
+    args = parser.parse_args()
+
+    if not args.cache:
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+
+    app = load_app(
+        FakeRetriever(documents=make_corpus(), latency=args.retrieval_latency),
+        ScriptedChatModel(first_token_latency=args.llm_latency, token_latency=args.token_latency),
+    )
+
+    async def run_levels():
+        # All levels share one event loop, like a single uvicorn worker
+        print(f"Endpoint: {args.endpoint}")
+        print(f"{'clients':>8} {'reqs':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for concurrency in args.concurrency:
+            result = await run_load(app, args.endpoint, concurrency, args.requests)
+            print(
+                f"{result['concurrency']:>8} {result['requests']:>6} {result['errors']:>6} "
+                f"{result['rps']:>9.1f} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}"
+            )
+
+    asyncio.run(run_levels())
+
+
+if __name__ == "__main__":
+    main()
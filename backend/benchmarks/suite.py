@@ -0,0 +1,275 @@
+"""
+Offline benchmark suite for the RAG API and the ingestion pipeline.
+
+Every external service is replaced by a deterministic local stand-in from
+fakes.py: hashing embeddings with a simulated latency, the local vector index
+(in a temp directory) as the vector store, a scripted LLM, a local JWKS server
+for Clerk tokens and an in-memory blob store for Azure. The suite drives
+/api/chat, /api/chat/stream and authenticated chat at several concurrency levels
+and corpus sizes, runs a full and an incremental ingestion, and reports
+p50/p95/p99 latency, requests/sec, throughput and memory.
+
+Results are compared with benchmarks/baselines.json; metrics that got worse by
+more than --tolerance are flagged. Baselines depend on the machine, so record
+them on the machine you compare on.
+
+Usage (from the backend directory):
+    python benchmarks/suite.py                   # run and compare with the baselines
+    python benchmarks/suite.py --quick           # smaller run for a quick check
+    python benchmarks/suite.py --save-baseline   # run and store the results as the new baselines
+    python benchmarks/suite.py --only chat ingest --check   # exit 1 on regressions
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Every request should run the full chain; the answer cache has its own benchmark in loadtest.py --cache
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "false")
+
+from fakes import (
+    FakeEmbeddings,
+    InMemoryVectorStore,
+    LocalBlobStore,
+    LocalJWKSServer,
+    ScriptedChatModel,
+    install_offline_stubs,
+    load_app,
+    make_blob_corpus,
+    make_corpus,
+)
+from loadtest import run_load
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SCENARIOS = ("chat", "stream", "auth", "ingest")
+
+# Direction of each compared metric; anything else is informational
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "ttfb_p95_ms")
+HIGHER_IS_BETTER = ("rps", "chunks_per_second")
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), falling back to the peak elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1024
+
+
+def build_retriever(corpus_size, embedding_latency, directory):
+    """Indexes a synthetic corpus in a local vector index and returns its retriever and embeddings."""
+    install_offline_stubs()
+    from batching import BatchedEmbeddings
+    from cached_embeddings import CachedEmbeddings
+    from local_index import LocalIndexRetriever, build_local_index
+
+    documents = make_corpus(corpus_size)
+    index = build_local_index(documents, [f"chunk-{i}" for i in range(corpus_size)], FakeEmbeddings(), directory)
+    # Same layering as production: cache, then micro-batcher, then the (fake) model
+    embeddings = CachedEmbeddings(BatchedEmbeddings(FakeEmbeddings(latency=embedding_latency)))
+    retriever = LocalIndexRetriever(index=index, embeddings=embeddings, k=5, score_threshold=0.5)
+    return retriever, embeddings
+
+
+async def bench_chat(args, results, workdir):
+    llm = ScriptedChatModel(first_token_latency=args.llm_latency, token_latency=args.token_latency)
+    for corpus_size in args.corpus_sizes:
+        retriever, embeddings = build_retriever(corpus_size, args.embedding_latency, os.path.join(workdir, f"index-{corpus_size}"))
+        app = load_app(retriever, llm, embeddings)
+        for name, endpoint in (("chat", "/api/chat"), ("stream", "/api/chat/stream")):
+            if name not in args.only:
+                continue
+            for concurrency in args.concurrency:
+                result = await run_load(app, endpoint, concurrency, args.requests)
+                result.update(rss_mb=rss_mb(), peak_rss_mb=peak_rss_mb())
+                results[f"{name} c={concurrency} corpus={corpus_size}"] = result
+
+
+async def bench_auth(args, results, workdir):
+    install_offline_stubs()
+    import clerk_auth
+
+    retriever, embeddings = build_retriever(args.corpus_sizes[0], args.embedding_latency, os.path.join(workdir, "index-auth"))
+    llm = ScriptedChatModel(first_token_latency=args.llm_latency, token_latency=args.token_latency)
+    app = load_app(retriever, llm, embeddings)
+
+    auth = clerk_auth.clerk_auth
+    saved = (auth.development_mode, auth.clerk_secret_key, auth.jwks_cache, auth.token_cache)
+    with LocalJWKSServer() as server:
+        # Verify real RS256 tokens against the local JWKS, as in production
+        auth.development_mode = False
+        auth.clerk_secret_key = server.audience
+        auth.jwks_cache = clerk_auth.JWKSCache(url=server.url)
+        auth.token_cache = clerk_auth.VerifiedTokenCache()
+        tokens = [server.make_token(sub=f"user_{i}") for i in range(args.users)]
+        try:
+            for concurrency in args.concurrency:
+                result = await run_load(app, "/api/chat", concurrency, args.requests, tokens=tokens)
+                result.update(rss_mb=rss_mb(), peak_rss_mb=peak_rss_mb(), jwks_fetches=server.requests)
+                results[f"chat+auth c={concurrency} users={args.users}"] = result
+        finally:
+            auth.development_mode, auth.clerk_secret_key, auth.jwks_cache, auth.token_cache = saved
+
+
+def bench_ingest(args, results, workdir):
+    install_offline_stubs()
+    import ingest
+
+    store = LocalBlobStore(make_blob_corpus(args.files, args.pages), latency=args.blob_latency)
+    vstore = InMemoryVectorStore(FakeEmbeddings(latency=args.embedding_latency))
+    manifest_path = os.path.join(workdir, "ingest_manifest.json")
+    saved = (ingest.get_blob_service_client, ingest.AZURE_STORAGE_CONNECTION_STRING)
+    ingest.get_blob_service_client = lambda: store
+    ingest.AZURE_STORAGE_CONNECTION_STRING = "local-blob-store"
+    try:
+        for name, full in (("ingest", True), ("ingest-incremental", False)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = ingest.sync_from_azure(manifest_path=manifest_path, full=full, vstore=vstore)
+            results[f"{name} files={args.files} pages={args.pages}"] = {
+                "blobs": stats["blobs_seen"],
+                "chunks": stats["chunks_upserted"],
+                "errors": stats["blobs_failed"],
+                "elapsed_seconds": stats["elapsed_seconds"],
+                "blobs_per_second": stats["blobs_seen"] / max(stats["elapsed_seconds"], 1e-9),
+                "chunks_per_second": stats["chunks_per_second"],
+                "megabytes_per_second": stats["megabytes_per_second"],
+                "rss_mb": rss_mb(),
+                "peak_rss_mb": peak_rss_mb(),
+            }
+    finally:
+        ingest.get_blob_service_client, ingest.AZURE_STORAGE_CONNECTION_STRING = saved
+
+
+def compare(results, baselines, tolerance):
+    """Returns (scenario, metric, baseline, current, change) for every metric that regressed."""
+    regressions = []
+    for scenario, metrics in results.items():
+        baseline = baselines.get(scenario)
+        if not baseline:
+            continue
+        for metric, current in metrics.items():
+            before = baseline.get(metric)
+            if not isinstance(before, (int, float)) or not before:
+                continue
+            change = (current - before) / before
+            if (metric in LOWER_IS_BETTER and change > tolerance) or (metric in HIGHER_IS_BETTER and change < -tolerance):
+                regressions.append((scenario, metric, before, current, change))
+    return regressions
+
+
+def print_results(results, baselines):
+    print(f"{'scenario':<34} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>7}  vs baseline")
+    for scenario, metrics in results.items():
+        baseline = baselines.get(scenario, {})
+        if "rps" in metrics:
+            delta = ""
+            if baseline.get("p95_ms"):
+                delta = f"p95 {100 * (metrics['p95_ms'] - baseline['p95_ms']) / baseline['p95_ms']:+.0f}%"
+            print(
+                f"{scenario:<34} {metrics['rps']:>8.1f} {metrics['p50_ms']:>8.1f} {metrics['p95_ms']:>8.1f} "
+                f"{metrics['p99_ms']:>8.1f} {metrics['rss_mb']:>7.0f}  {delta}"
+            )
+        else:
+            delta = ""
+            if baseline.get("chunks_per_second"):
+                before = baseline["chunks_per_second"]
+                delta = f"chunks/s {100 * (metrics['chunks_per_second'] - before) / before:+.0f}%"
+            print(
+                f"{scenario:<34} {metrics['blobs_per_second']:>8.1f} blobs/s, {metrics['chunks_per_second']:.0f} chunks/s, "
+                f"{metrics['elapsed_seconds']:.2f}s {metrics['rss_mb']:>7.0f}  {delta}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the RAG API and ingestion.")
+    parser.add_argument("--only", nargs="+", choices=SCENARIOS, default=list(SCENARIOS), help="Scenarios to run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Concurrent clients")
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[200, 5000], help="Chunks in the vector index")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per concurrency level")
+    parser.add_argument("--users", type=int, default=20, help="Distinct signed-in users in the auth scenario")
+    parser.add_argument("--files", type=int, default=24, help="Blobs in the ingestion corpus")
+    parser.add_argument("--pages", type=int, default=10, help="Pages/slides per blob")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="Simulated embedding call latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Simulated time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Simulated per-token latency (s)")
+    parser.add_argument("--blob-latency", type=float, default=0.01, help="Simulated blob download latency (s)")
+    parser.add_argument("--quick", action="store_true", help="Fewer requests and smaller corpora")
+    parser.add_argument("--baselines", default=BASELINES_PATH, help="Baselines JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression before flagging")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a metric regressed")
+    parser.add_argument("--output", help="Also write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.concurrency = [1, 8]
+        args.corpus_sizes = [200]
+        args.requests = 30
+        args.files = 9
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, "r", encoding="utf-8") as f:
+            baselines = json.load(f).get("results", {})
+
+    results = {}
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workdir:
+
+        async def run_api_scenarios():
+            # One event loop for every API scenario, like a single uvicorn worker
+            if "chat" in args.only or "stream" in args.only:
+                await bench_chat(args, results, workdir)
+            if "auth" in args.only:
+                await bench_auth(args, results, workdir)
+
+        asyncio.run(run_api_scenarios())
+        if "ingest" in args.only:
+            bench_ingest(args, results, workdir)
+
+    print_results(results, baselines)
+    print(f"\nSuite finished in {time.perf_counter() - started:.1f}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump({
+                "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "results": {**baselines, **results},
+            }, f, indent=2, sort_keys=True)
+        print(f"Baselines written to {args.baselines}")
+        return
+
+    regressions = compare(results, baselines, args.tolerance)
+    if regressions:
+        print(f"\nRegressions (more than {args.tolerance:.0%} worse than baseline):")
+        for scenario, metric, before, current, change in regressions:
+            print(f"  {scenario}: {metric} {before:.2f} -> {current:.2f} ({change:+.0%})")
+        if args.check:
+            sys.exit(1)
+    elif baselines:
+        print("No regressions against the baselines.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from batching import EMBED_BATCHING_ENABLED, BatchedEmbeddings
+from metrics import cache_lookups_total, stage
+
+# --- CONFIGURATION ---
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+# Number of vectors kept in memory per process
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+# Optional SQLite file that keeps vectors across restarts and re-ingestion runs
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+
+def embedding_key(model: str, kind: str, text: str) -> str:
+    """
+    Content hash used as the cache key. Query and document embeddings are kept
+    apart because the Gemini model embeds them with different task types.
+    """
+    return hashlib.sha256(f"{model}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    """On-disk embedding store: one row per content hash with the vector as float32 bytes."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters, so look keys up in slices
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        rows = [(key, model, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings implementation with an in-memory LRU and an optional
+    on-disk store, keyed by content hash and model name. Only texts missing from
+    both caches are sent to the underlying model, in a single batched call.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model: str = EMBEDDING_MODEL,
+        max_size: int = EMBEDDING_CACHE_SIZE,
+        store: Optional[SQLiteEmbeddingStore] = None,
+    ):
+        self.underlying = underlying
+        self.model = model
+        self.max_size = max_size
+        self.store = store
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: List[float]):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Returns the vectors found in memory or on disk for the given keys."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+        self.memory_hits += len(found)
+        cache_lookups_total.inc(len(found), cache="embedding", result="memory_hit")
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.store is not None:
+            from_disk = self.store.get_many(missing)
+            self.disk_hits += len(from_disk)
+            cache_lookups_total.inc(len(from_disk), cache="embedding", result="disk_hit")
+            for key, vector in from_disk.items():
+                self._remember(key, vector)
+            found.update(from_disk)
+        return found
+
+    def _store(self, computed: Dict[str, List[float]]):
+        self.misses += len(computed)
+        cache_lookups_total.inc(len(computed), cache="embedding", result="miss")
+        for key, vector in computed.items():
+            self._remember(key, vector)
+        if self.store is not None and computed:
+            self.store.put_many(self.model, computed)
+
+    def _plan(self, kind: str, texts: List[str]):
+        keys = [embedding_key(self.model, kind, text) for text in texts]
+        # De-duplicate unique keys while keeping order, so repeated chunks are embedded once
+        unique = list(dict.fromkeys(keys))
+        found = self._lookup(unique)
+        pending = {key: text for key, text in zip(keys, texts) if key not in found}
+        return keys, found, pending
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._plan("document", texts)
+        if pending:
+            with stage("embedding"):
+                vectors = self.underlying.embed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, pending = self._plan("query", [text])
+        if pending:
+            with stage("embedding"):
+                vector = self.underlying.embed_query(text)
+            self._store({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._plan("document", texts)
+        if pending:
+            with stage("embedding"):
+                vectors = await self.underlying.aembed_documents(list(pending.values()))
+            computed = dict(zip(pending.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[key] for key in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, pending = self._plan("query", [text])
+        if pending:
+            with stage("embedding"):
+                vector = await self.underlying.aembed_query(text)
+            self._store({keys[0]: vector})
+            return vector
+        return found[keys[0]]
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model": self.model,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "disk_store": self.store.path if self.store is not None else None,
+        }
+
+
+_shared_embeddings: Optional[CachedEmbeddings] = None
+
+
+def get_embeddings() -> CachedEmbeddings:
+    """
+    Returns the process-wide cached Gemini embeddings, shared by the API
+    retriever, the answer cache and the ingestion pipeline. Cache misses for
+    questions go through the micro-batcher.
+    """
+    global _shared_embeddings
+    if _shared_embeddings is None:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+        # Gemini embedding model - uses GOOGLE_API_KEY from environment
+        underlying = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+        if EMBED_BATCHING_ENABLED:
+            # Concurrent questions that miss the cache share one embedding request
+            underlying = BatchedEmbeddings(underlying)
+        store = SQLiteEmbeddingStore(EMBEDDING_CACHE_PATH) if EMBEDDING_CACHE_PATH else None
+        _shared_embeddings = CachedEmbeddings(underlying, model=EMBEDDING_MODEL, store=store)
+    return _shared_embeddings
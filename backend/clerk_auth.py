@@ -1,11 +1,159 @@
 import jwt
-import requests
+import logging
 import os
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
+from typing import Awaitable, Callable, Dict, Optional
+from clients import clients
+from metrics import cache_lookups_total, stage
+
+logger = logging.getLogger("collegegpt.auth")
 
 security = HTTPBearer()
+# Same scheme, but lets requests without an Authorization header through as anonymous
+optional_security = HTTPBearer(auto_error=False)
+
+# Upper bound for the JWKS fetch so a slow Clerk response cannot stall a request
+AUTH_TIMEOUT_SECONDS = float(os.getenv("AUTH_TIMEOUT_SECONDS", "5"))
+
+# JWKS cache settings
+CLERK_JWKS_URL = os.getenv("CLERK_JWKS_URL", "https://api.clerk.dev/v1/jwks")
+JWKS_CACHE_TTL_SECONDS = float(os.getenv("JWKS_CACHE_TTL_SECONDS", "3600"))
+# Minimum gap between refetches triggered by tokens signed with an unknown key id
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = float(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "30"))
+# Number of verified tokens kept so repeat requests skip signature verification
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+
+
+async def fetch_jwks(url: str = CLERK_JWKS_URL) -> dict:
+    """
+    Downloads a JWKS document with the shared async client (see clients.py), so the
+    event loop keeps serving other requests and refetches reuse the open connection.
+    """
+    response = await clients.async_http_client().get(url, timeout=AUTH_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()
+
+
+class JWKSCache:
+    """
+    In-process cache of signing keys keyed by `kid`.
+
+    Keys are refreshed in the background once they are older than 3/4 of the TTL,
+    so requests only wait on Clerk for the very first fetch, after the TTL has fully
+    expired, or when a token references a key id we have not seen (rate limited).
+    If a refresh fails, the previously fetched keys keep being served.
+    """
+
+    def __init__(
+        self,
+        url: str = CLERK_JWKS_URL,
+        ttl: float = JWKS_CACHE_TTL_SECONDS,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL_SECONDS,
+        fetcher: Optional[Callable[[str], Awaitable[dict]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.fetcher = fetcher or fetch_jwks
+        self.clock = clock
+        self.keys: Dict[str, jwt.PyJWK] = {}
+        self.fetched_at = 0.0
+        self.last_attempt = 0.0
+        self.fetch_count = 0
+        self._lock = asyncio.Lock()
+        self._background_refresh: Optional[asyncio.Task] = None
+
+    def _age(self) -> float:
+        return self.clock() - self.fetched_at
+
+    async def refresh(self, min_interval: float = 0.0):
+        """Refetches the key set unless another refresh happened within `min_interval` seconds."""
+        async with self._lock:
+            if self.last_attempt and self.clock() - self.last_attempt < min_interval:
+                return
+            self.last_attempt = self.clock()
+            self.fetch_count += 1
+            with stage("jwks_fetch"):
+                jwks = await self.fetcher(self.url)
+            key_set = jwt.PyJWKSet.from_dict(jwks)
+            self.keys = {key.key_id: key for key in key_set.keys if key.key_id}
+            self.fetched_at = self.clock()
+
+    def _schedule_background_refresh(self):
+        if self._background_refresh and not self._background_refresh.done():
+            return
+        self._background_refresh = asyncio.get_running_loop().create_task(self._refresh_quietly())
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh(min_interval=self.min_refresh_interval)
+        except Exception as e:
+            logger.warning("Background JWKS refresh failed: %s", e)
+
+    async def get_key(self, kid: Optional[str]) -> jwt.PyJWK:
+        """Returns the signing key for `kid`, fetching the key set only when necessary."""
+        if not self.keys:
+            await self.refresh()
+        elif self._age() > self.ttl:
+            try:
+                await self.refresh(min_interval=self.min_refresh_interval)
+            except Exception as e:
+                # Serve the stale keys rather than failing every request while Clerk is down
+                logger.warning("JWKS refresh failed, using cached keys: %s", e)
+        elif self._age() > self.ttl * 0.75:
+            self._schedule_background_refresh()
+
+        if kid not in self.keys:
+            # Keys may have been rotated; refetch, but not more than once per interval
+            await self.refresh(min_interval=self.min_refresh_interval)
+        if kid not in self.keys:
+            raise jwt.InvalidTokenError(f"Unknown signing key: {kid}")
+        return self.keys[kid]
+
+
+class VerifiedTokenCache:
+    """LRU cache of decoded token claims keyed by the token's SHA-256, valid until the token's `exp`."""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, clock: Callable[[], float] = time.time):
+        self.max_size = max_size
+        # Wall-clock time, since `exp` is a Unix timestamp
+        self.clock = clock
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        claims = self._entries.get(key)
+        if claims is None:
+            self.misses += 1
+            return None
+        exp = claims.get("exp")
+        if exp is not None and exp <= self.clock():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        if self.max_size <= 0:
+            return
+        self._entries[self._key(token)] = claims
+        self._entries.move_to_end(self._key(token))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
 
 class ClerkAuth:
     def __init__(self):
@@ -16,6 +164,9 @@ class ClerkAuth:
         # Only require secret key in production
         if not self.development_mode and not self.clerk_secret_key:
             raise ValueError("CLERK_SECRET_KEY environment variable is required in production mode")
+
+        self.jwks_cache = JWKSCache()
+        self.token_cache = VerifiedTokenCache()
     
     async def verify_token(self, credentials: HTTPAuthorizationCredentials = Depends(security)) -> Optional[dict]:
         """
@@ -40,19 +191,26 @@ class ClerkAuth:
             if not self.clerk_secret_key:
                 raise HTTPException(status_code=500, detail="Clerk configuration missing")
                 
-            # Get Clerk's JWKS (JSON Web Key Set)
-            jwks_url = f"https://api.clerk.dev/v1/jwks"
-            jwks_response = requests.get(jwks_url)
-            jwks = jwks_response.json()
-            
-            # Verify and decode the token
-            decoded = jwt.decode(
-                token,
-                key=jwks,
-                algorithms=["RS256"],
-                audience=self.clerk_secret_key
-            )
-            
+            with stage("auth"):
+                # Tokens verified earlier are served from cache until they expire
+                cached = self.token_cache.get(token)
+                cache_lookups_total.inc(cache="token", result="hit" if cached is not None else "miss")
+                if cached is not None:
+                    return cached
+
+                # Look up the signing key in the cached JWKS (JSON Web Key Set)
+                kid = jwt.get_unverified_header(token).get("kid")
+                signing_key = await self.jwks_cache.get_key(kid)
+
+                # Verify and decode the token
+                decoded = jwt.decode(
+                    token,
+                    key=signing_key.key,
+                    algorithms=["RS256"],
+                    audience=self.clerk_secret_key
+                )
+
+            self.token_cache.put(token, decoded)
             return decoded
             
         except jwt.ExpiredSignatureError:
@@ -69,7 +227,7 @@ class ClerkAuth:
 clerk_auth = ClerkAuth()
 
 # Dependency to get current user (optional - allows anonymous access)
-async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[dict]:
+async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)) -> Optional[dict]:
     """
     Get current user if authenticated, None otherwise
     """
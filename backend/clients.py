@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, Type, TypeVar
+
+T = TypeVar("T")
+
+logger = logging.getLogger("collegegpt.clients")
+
+# --- CONFIGURATION ---
+# Keep-alive connections kept open per host (Azure Blob Storage, Clerk JWKS)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+# Distinct hosts with their own connection pool in the shared requests session
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+# Idle keep-alive connections are closed after this many seconds
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+# Retries after the first attempt, with exponential backoff and full jitter
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF_SECONDS = float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5"))
+HTTP_BACKOFF_MAX_SECONDS = float(os.getenv("HTTP_BACKOFF_MAX_SECONDS", "10"))
+
+
+def backoff_delay(attempt: int, base: float = HTTP_BACKOFF_SECONDS, cap: float = HTTP_BACKOFF_MAX_SECONDS) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based): uniformly random up to
+    base * 2**attempt, capped ("full jitter"), so clients that failed together do
+    not retry together.
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_call(
+    func: Callable[[], T],
+    description: str,
+    retries: int = HTTP_RETRIES,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+) -> T:
+    """Calls `func`, retrying up to `retries` times with jittered backoff; re-raises the last error."""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except retry_on as e:
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning("%s failed (%s), retrying in %.2fs", description, e, delay)
+            time.sleep(delay)
+
+
+class ClientRegistry:
+    """
+    Process-wide cache of network clients, so repeated operations (every blob of an
+    ingestion, every data refresh, every JWKS refetch) reuse warm keep-alive
+    connections instead of paying DNS, TCP and TLS setup again.
+
+    - `blob_service_client()`: one Azure client per connection string, on a shared
+      pooled requests session; Azure's own retry policy with jittered backoff.
+    - `vector_store()`: one AstraDBVectorStore per collection and options; creating
+      one costs several round trips to Astra DB, so it is done once and retried.
+    - `async_http_client()`: one httpx.AsyncClient per event loop (connections are
+      bound to the loop that opened them), used for the Clerk JWKS.
+
+    Clients are thread-safe to share; creation is serialized by a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._blob_clients: Dict[tuple, object] = {}
+        self._vector_stores: Dict[tuple, object] = {}
+        self._async_clients: Dict[asyncio.AbstractEventLoop, object] = {}
+        self.created: Dict[str, int] = {"blob_service": 0, "vector_store": 0, "async_http": 0}
+        self.reused: Dict[str, int] = {"blob_service": 0, "vector_store": 0, "async_http": 0}
+
+    def http_session(self):
+        """
+        The shared requests session behind the Azure SDK. Retries are left to the
+        SDK's retry policy so failed requests are not retried twice.
+        """
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def blob_service_client(self, connection_string: str, **options):
+        """Returns the shared BlobServiceClient for `connection_string`, created with `options` on first use."""
+        key = (connection_string, tuple(sorted(options.items())))
+        client = self._blob_clients.get(key)
+        if client is not None:
+            self.reused["blob_service"] += 1
+            return client
+        session = self.http_session()
+        with self._lock:
+            if key not in self._blob_clients:
+                from azure.core.pipeline.transport import RequestsTransport
+                from azure.storage.blob import BlobServiceClient, ExponentialRetry
+
+                self._blob_clients[key] = BlobServiceClient.from_connection_string(
+                    connection_string,
+                    transport=RequestsTransport(session=session, session_owner=False),
+                    retry_policy=ExponentialRetry(
+                        initial_backoff=HTTP_BACKOFF_SECONDS,
+                        increment_base=2,
+                        retry_total=HTTP_RETRIES,
+                        random_jitter_range=HTTP_BACKOFF_SECONDS,
+                    ),
+                    **options,
+                )
+                self.created["blob_service"] += 1
+            return self._blob_clients[key]
+
+    def vector_store(self, embedding, collection_name: str, api_endpoint: Optional[str], token: Optional[str], **options):
+        """Returns the shared AstraDBVectorStore for the collection, embedding model and options."""
+        key = (collection_name, api_endpoint, token, id(embedding), tuple(sorted(options.items())))
+        store = self._vector_stores.get(key)
+        if store is not None:
+            self.reused["vector_store"] += 1
+            return store
+        with self._lock:
+            if key not in self._vector_stores:
+                from langchain_astradb import AstraDBVectorStore
+
+                self._vector_stores[key] = retry_call(
+                    lambda: AstraDBVectorStore(
+                        embedding=embedding,
+                        collection_name=collection_name,
+                        api_endpoint=api_endpoint,
+                        token=token,
+                        **options,
+                    ),
+                    f"Connecting to Astra DB collection {collection_name}",
+                )
+                self.created["vector_store"] += 1
+            return self._vector_stores[key]
+
+    def async_http_client(self):
+        """Returns the pooled httpx.AsyncClient for the running event loop."""
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is not None:
+            self.reused["async_http"] += 1
+            return client
+        with self._lock:
+            # Clients of loops that have been closed (e.g. between benchmark runs) cannot be reused
+            for stale in [other for other in self._async_clients if other.is_closed()]:
+                del self._async_clients[stale]
+            client = self._async_clients[loop] = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_MAXSIZE,
+                    max_keepalive_connections=HTTP_POOL_MAXSIZE,
+                    keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+                ),
+                # Retries failed connection attempts; responses are never retried here
+                transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES),
+            )
+            self.created["async_http"] += 1
+        return client
+
+    async def aclose(self):
+        """Closes the async client of the running loop (call on shutdown)."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        """Closes the Azure clients and the shared session; later calls create new ones."""
+        with self._lock:
+            for client in self._blob_clients.values():
+                client.close()
+            self._blob_clients.clear()
+            self._vector_stores.clear()
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "blob_service_clients": len(self._blob_clients),
+            "vector_stores": len(self._vector_stores),
+            "async_http_clients": len(self._async_clients),
+            "created": dict(self.created),
+            "reused": dict(self.reused),
+        }
+
+
+# Shared registry for the process (API workers and the ingestion CLI)
+clients = ClientRegistry()
@@ -0,0 +1,144 @@
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# --- CONFIGURATION ---
+# Maximum number of chat requests doing retrieval/generation at the same time on this worker
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", "16"))
+# Requests allowed to wait for a slot; beyond this they are rejected at once with 429
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "32"))
+# Longest a queued request waits for a slot before it is rejected with 429
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "5"))
+# Per-stage timeouts (seconds) for the chat path
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "15"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "90"))
+
+
+class StageTimeout(Exception):
+    """Raised when one stage of the chat path takes longer than its budget."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} timed out after {timeout:g}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+async def run_stage(stage: str, awaitable: Awaitable[T], timeout: Optional[float]) -> T:
+    """Awaits one stage of the chat path, raising StageTimeout if it exceeds `timeout`."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        raise StageTimeout(stage, timeout)
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted; `retry_after` is a hint in whole seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server is busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps the requests doing expensive work at once, with a short bounded queue.
+
+    Up to `max_in_flight` requests run; up to `max_queue` more wait at most
+    `queue_timeout` seconds for a slot. Anything beyond that is rejected at once
+    with Overloaded, so an overloaded worker answers 429 quickly instead of
+    letting latency grow for everyone. Use as `async with controller.slot():`.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long an admitted request holds its slot, for Retry-After
+        self._service_seconds = 1.0
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current backlog has drained."""
+        backlog = (self.queued + 1) / max(self.max_in_flight, 1)
+        return max(1, math.ceil(self._service_seconds * backlog))
+
+    def check(self):
+        """Raises Overloaded if a new request would be rejected right now, without taking a slot."""
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+
+    async def acquire(self):
+        self.check()
+        if self._semaphore.locked():
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise Overloaded(self.retry_after())
+            finally:
+                self.queued -= 1
+        else:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self, held_seconds: Optional[float] = None):
+        self.in_flight -= 1
+        self._semaphore.release()
+        if held_seconds is not None:
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * held_seconds
+
+    @asynccontextmanager
+    async def slot(self):
+        """Holds a slot for the duration of the block; raises Overloaded if none is available in time."""
+        await self.acquire()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "retry_after": self.retry_after(),
+        }
+
+
+async def limit_stream(limiter: AdmissionController, events: AsyncIterator[dict]) -> AsyncIterator[dict]:
+    """
+    Holds a limiter slot for the whole lifetime of a streaming response,
+    since the work happens after the endpoint function has returned. If no slot
+    frees up in time, a single "error" frame is yielded instead.
+    """
+    try:
+        await limiter.acquire()
+    except Overloaded as e:
+        yield {"type": "error", "stage": "admission", "error": str(e), "retry_after": e.retry_after}
+        return
+    started = time.perf_counter()
+    try:
+        async for event in events:
+            yield event
+    finally:
+        limiter.release(time.perf_counter() - started)
+
+
+# Shared admission control for the chat endpoints
+chat_limiter = AdmissionController(CHAT_MAX_CONCURRENCY, CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT_SECONDS)
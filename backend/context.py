@@ -0,0 +1,137 @@
+import math
+import os
+import re
+from typing import List, Optional
+
+# --- CONFIGURATION ---
+# Approximate token budget for the retrieved context in the prompt; 0 disables the limit
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Rough characters-per-token ratio used to estimate prompt size without a tokenizer
+CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "4"))
+# Shortest suffix/prefix match treated as splitter overlap between two chunks
+MIN_OVERLAP_CHARS = 20
+# Longest overlap searched for; the splitter uses chunk_overlap=150
+MAX_OVERLAP_CHARS = 400
+
+# --- CONTEXT ASSEMBLY ---
+# The retriever returns up to five 1000-character chunks that overlap by 150
+# characters. Instead of passing the Document reprs to the prompt, the chunks
+# are de-duplicated, neighbouring chunks of the same source are stitched back
+# together, and the result is formatted compactly and cut to a token budget.
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    longest = min(len(left), len(right), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class _Passage:
+    """One or more adjacent chunks of a source, stitched together."""
+
+    def __init__(self, rank: int, text: str, source: Optional[str], page, chunk_index):
+        self.rank = rank
+        self.text = text
+        self.source = source
+        self.pages = [page] if page is not None else []
+        self.first_index = chunk_index
+        self.last_index = chunk_index
+
+    def position(self):
+        return (self.pages[0] if self.pages else -1, self.first_index if self.first_index is not None else -1)
+
+    def try_append(self, other: "_Passage") -> bool:
+        """Merges `other` onto the end of this passage if they are adjacent or overlap."""
+        consecutive = (
+            self.last_index is not None and other.first_index is not None
+            and other.first_index == self.last_index + 1
+        )
+        overlap = _overlap(self.text, other.text)
+        if not consecutive and not overlap:
+            return False
+        self.text = self.text + ("" if overlap else " ") + other.text[overlap:]
+        self.rank = min(self.rank, other.rank)
+        self.pages.extend(page for page in other.pages if page not in self.pages)
+        self.last_index = other.last_index if other.last_index is not None else self.last_index
+        return True
+
+    def header(self, number: int) -> str:
+        label = self.source or "unknown source"
+        if self.pages:
+            first, last = self.pages[0], self.pages[-1]
+            # PyPDF page numbers are zero-based
+            label += f", p. {first + 1}" if first == last else f", pp. {first + 1}-{last + 1}"
+        return f"[{number}] {label}"
+
+
+def _rank_key(doc, position: int):
+    """Best first: by `score` metadata when the retriever provides it, else retriever order."""
+    score = (getattr(doc, "metadata", None) or {}).get("score")
+    return (-score if isinstance(score, (int, float)) else 0.0, position)
+
+
+def build_passages(docs: List) -> List[_Passage]:
+    """De-duplicates chunks and merges neighbouring chunks of the same source, best first."""
+    ordered = sorted(enumerate(docs), key=lambda item: _rank_key(item[1], item[0]))
+
+    passages: List[_Passage] = []
+    seen: List[str] = []
+    for rank, (_, doc) in enumerate(ordered):
+        text = _normalize(doc.page_content)
+        # Skip exact repeats and chunks contained in a better-ranked chunk
+        if not text or any(text in other for other in seen):
+            continue
+        seen.append(text)
+        metadata = doc.metadata or {}
+        passages.append(_Passage(rank, text, metadata.get("source"), metadata.get("page"), metadata.get("chunk_index")))
+
+    by_source = {}
+    for passage in passages:
+        by_source.setdefault(passage.source, []).append(passage)
+
+    merged = []
+    for group in by_source.values():
+        group.sort(key=_Passage.position)
+        current = group[0]
+        for passage in group[1:]:
+            if not current.try_append(passage):
+                merged.append(current)
+                current = passage
+        merged.append(current)
+    return sorted(merged, key=lambda passage: passage.rank)
+
+
+def assemble_context(docs: List, token_budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Formats retrieved documents as compact numbered passages within `token_budget`.
+    Passages are added best first, skipping any that no longer fit; the first passage is truncated rather than dropped
+    if it alone exceeds the budget, so the prompt never ends up without context.
+    """
+    if isinstance(docs, str):
+        return docs
+
+    sections = []
+    used = 0
+    for number, passage in enumerate(build_passages(docs), start=1):
+        section = f"{passage.header(number)}\n{passage.text}"
+        cost = estimate_tokens(section) + 1
+        if token_budget and used + cost > token_budget:
+            if not sections:
+                sections.append(section[:int(token_budget * CHARS_PER_TOKEN)])
+                used = token_budget
+            # A shorter, lower-ranked passage may still fit
+            continue
+        sections.append(section)
+        used += cost
+    return "\n\n".join(sections)
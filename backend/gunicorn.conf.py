@@ -0,0 +1,27 @@
+# Gunicorn settings for running the API with several uvicorn workers:
+#   gunicorn -c gunicorn.conf.py main:app
+# Each worker is a separate process with its own event loop, clients and caches;
+# they share the indexes (memory-mapped), the embedding cache (SQLite) and
+# reload coordination (shared_state.py) through files on local disk.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# One worker per core is a good start; each worker holds its own LLM clients and caches (~150 MB)
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Streaming answers can take a while; the app enforces its own per-stage timeouts
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Gemini and httpx clients are bound to the event loop that created them, so the app
+# is imported in each worker after the fork rather than once in the master
+preload_app = False
+
+# Client IPs for rate limiting come from X-Forwarded-For when the proxy is trusted
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
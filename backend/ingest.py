@@ -1,16 +1,18 @@
 import os
-import tempfile
+import json
+import hashlib
+import argparse
+import io
+import uuid
 from dotenv import load_dotenv
-from azure.storage.blob import BlobServiceClient
-from langchain_community.document_loaders import (
-    PyPDFLoader,
-    TextLoader,
-    UnstructuredPowerPointLoader,
-)
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_astradb import AstraDBVectorStore
-import pytesseract
+from cached_embeddings import EMBEDDING_MODEL, get_embeddings
+from clients import clients
+from batch_writer import BatchWriter
+from ingest_pipeline import ChunkWriter, ThroughputReport, run_pipeline
+from shared_state import shared_state
+
+# Azure, Astra DB, the text splitter, pytesseract and the PDF/PowerPoint parsers are
+# imported where they are used, so importing this module (e.g. from the API) stays cheap.
 
 # You may need to install the tesseract OCR engine on your system
 # For macOS: brew install tesseract
@@ -27,159 +29,575 @@ AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_CONTAINER_NAME = os.getenv("AZURE_CONTAINER_NAME", "college-data")
 # Name for the collection in Astra DB
 ASTRA_DB_COLLECTION_NAME = os.getenv("ASTRA_DB_COLLECTION_NAME", "rag_chatbot_collection")
+# Manifest of ingested blobs, used to only re-process new or changed files
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", ".cache/ingest_manifest.json")
+
+SUPPORTED_EXTENSIONS = (".pdf", ".pptx", ".txt", ".png", ".jpg", ".jpeg")
+
+# Blobs above this size are downloaded as parallel ranged requests
+INGEST_RANGE_THRESHOLD_BYTES = int(os.getenv("INGEST_RANGE_THRESHOLD_BYTES", str(8 * 1024 * 1024)))
+INGEST_RANGE_CHUNK_BYTES = int(os.getenv("INGEST_RANGE_CHUNK_BYTES", str(4 * 1024 * 1024)))
+INGEST_RANGE_CONCURRENCY = int(os.getenv("INGEST_RANGE_CONCURRENCY", "4"))
 
 # --- DOCUMENT PROCESSING ---
 
-def load_documents_from_azure():
+def is_supported_blob(blob_name):
+    """Returns True for the file types the pipeline knows how to parse."""
+    return blob_name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+def parse_pdf(blob_name, blob_data):
+    """Parses a PDF from memory into one document per page, like PyPDFLoader."""
+    from langchain_core.documents.base import Blob
+    from langchain_community.document_loaders.parsers.pdf import PyPDFParser
+
+    return list(PyPDFParser().lazy_parse(Blob.from_data(bytes(blob_data), path=blob_name)))
+
+def parse_pptx(blob_name, blob_data):
+    """Extracts the text of every slide of a PowerPoint file from memory into one document."""
+    from langchain_core.documents import Document
+    from pptx import Presentation
+
+    presentation = Presentation(io.BytesIO(blob_data))
+    slides = []
+    for slide in presentation.slides:
+        texts = [shape.text_frame.text for shape in slide.shapes if shape.has_text_frame and shape.text_frame.text.strip()]
+        if texts:
+            slides.append("\n".join(texts))
+    if not slides:
+        return []
+    return [Document(page_content="\n\n".join(slides), metadata={})]
+
+def parse_text(blob_name, blob_data):
+    """Decodes a UTF-8 text file from memory."""
+    from langchain_core.documents import Document
+
+    return [Document(page_content=bytes(blob_data).decode("utf-8"), metadata={})]
+
+def parse_image(blob_name, blob_data):
+    """Runs OCR on an image held in memory."""
+    import pytesseract
+    from langchain_core.documents import Document
+    from PIL import Image
+
+    with Image.open(io.BytesIO(blob_data)) as image:
+        text = pytesseract.image_to_string(image)
+    if not text.strip():  # Only add if OCR found text
+        return []
+    return [Document(page_content=text, metadata={})]
+
+def parse_blob(blob_name, blob_data):
+    """
+    Parses the raw bytes (or a memoryview) of one blob into LangChain documents based
+    on the file extension, directly from memory without a temporary file.
+    Every document's `source` metadata is set to the blob name.
+    """
+    name = blob_name.lower()
+
+    # Process based on file extension
+    if name.endswith(".pdf"):
+        documents = parse_pdf(blob_name, blob_data)
+        print(f"  - Loaded {blob_name} (PDF)")
+    elif name.endswith(".pptx"):
+        documents = parse_pptx(blob_name, blob_data)
+        print(f"  - Loaded {blob_name} (PowerPoint)")
+    elif name.endswith(".txt"):
+        documents = parse_text(blob_name, blob_data)
+        print(f"  - Loaded {blob_name} (Text)")
+    elif name.endswith(('.png', '.jpg', '.jpeg')):
+        documents = parse_image(blob_name, blob_data)
+        if documents:
+            print(f"  - Loaded and OCR'd {blob_name} (Image)")
+    else:
+        documents = []
+
+    for doc in documents:
+        doc.metadata["source"] = blob_name
+    return documents
+
+def download_blob_bytes(container_client, blob):
+    """
+    Downloads a blob into memory. Blobs larger than INGEST_RANGE_THRESHOLD_BYTES are
+    fetched as parallel ranged GETs (INGEST_RANGE_CHUNK_BYTES each) straight into one buffer.
+    """
+    size = getattr(blob, "size", None) or 0
+    concurrency = INGEST_RANGE_CONCURRENCY if size > INGEST_RANGE_THRESHOLD_BYTES else 1
+    return container_client.download_blob(blob.name, max_concurrency=concurrency).readall()
+
+def get_blob_service_client():
+    """
+    Returns the shared Azure client (pooled keep-alive connections, see clients.py)
+    with range sizes tuned for in-memory downloads.
+    """
+    return clients.blob_service_client(
+        AZURE_STORAGE_CONNECTION_STRING,
+        max_single_get_size=INGEST_RANGE_THRESHOLD_BYTES,
+        max_chunk_get_size=INGEST_RANGE_CHUNK_BYTES,
+    )
+
+def load_documents_from_azure(hashes=None):
     """
     Loads documents from Azure Blob Storage, processing different file types.
     Currently supports .pdf, .pptx, .txt, and image files for OCR.
+    If `hashes` is given, it is filled with the content hash of every loaded blob.
     """
     documents = []
     print(f"Loading documents from Azure Blob Storage container: {AZURE_CONTAINER_NAME}...")
-    
+
     try:
         # Initialize the Azure Blob Service Client
         if not AZURE_STORAGE_CONNECTION_STRING:
             raise ValueError("Azure Storage connection string not provided")
-            
-        blob_service_client = BlobServiceClient.from_connection_string(AZURE_STORAGE_CONNECTION_STRING)
+
+        blob_service_client = get_blob_service_client()
         container_client = blob_service_client.get_container_client(AZURE_CONTAINER_NAME)
-        
+
         # List all blobs in the container
-        blob_list = container_client.list_blobs()
-        
-        for blob in blob_list:
-            try:
-                print(f"Processing: {blob.name}")
-                
-                # Download blob content
-                blob_client = blob_service_client.get_blob_client(
-                    container=AZURE_CONTAINER_NAME, 
-                    blob=blob.name
-                )
-                blob_data = blob_client.download_blob().readall()
-                
-                # Create a temporary file to process the blob
-                with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(blob.name)[1]) as temp_file:
-                    temp_file.write(blob_data)
-                    temp_file_path = temp_file.name
-                
-                try:
-                    # Process based on file extension
-                    if blob.name.endswith(".pdf"):
-                        loader = PyPDFLoader(temp_file_path)
-                        documents.extend(loader.load())
-                        print(f"  - Loaded {blob.name} (PDF)")
-                    elif blob.name.endswith(".pptx"):
-                        loader = UnstructuredPowerPointLoader(temp_file_path)
-                        documents.extend(loader.load())
-                        print(f"  - Loaded {blob.name} (PowerPoint)")
-                    elif blob.name.endswith(".txt"):
-                        loader = TextLoader(temp_file_path, encoding='utf-8')
-                        documents.extend(loader.load())
-                        print(f"  - Loaded {blob.name} (Text)")
-                    elif blob.name.lower().endswith(('.png', '.jpg', '.jpeg')):
-                        from PIL import Image
-                        from langchain_core.documents import Document
-
-                        text = pytesseract.image_to_string(Image.open(temp_file_path))
-                        if text.strip():  # Only add if OCR found text
-                            doc = Document(page_content=text, metadata={"source": blob.name})
-                            documents.append(doc)
-                            print(f"  - Loaded and OCR'd {blob.name} (Image)")
-                
-                finally:
-                    # Clean up temporary file
-                    os.unlink(temp_file_path)
-                    
-            except Exception as e:
-                print(f"Error processing {blob.name}: {e}")
-                continue
-        
+        blob_list = [blob for blob in container_client.list_blobs() if is_supported_blob(blob.name)]
+        report = ThroughputReport()
+
+        def download(blob):
+            print(f"Processing: {blob.name}")
+            return download_blob_bytes(container_client, blob)
+
+        def on_parsed(blob, blob_data, blob_documents):
+            report.blobs += 1
+            report.bytes += len(blob_data)
+            report.documents += len(blob_documents)
+            documents.extend(blob_documents)
+            if hashes is not None:
+                hashes[blob.name] = content_hash(blob_data)
+
+        def on_error(blob, e):
+            print(f"Error processing {blob.name}: {e}")
+
+        # Downloads run concurrently and parsing/OCR runs in a process pool
+        run_pipeline(blob_list, download, parse_blob, on_parsed, on_error)
+        report.print_summary()
+
     except Exception as e:
         print(f"Error connecting to Azure Blob Storage: {e}")
         return []
-    
+
     print(f"\nTotal documents loaded: {len(documents)}")
     return documents
 
-def split_text(documents):
+def split_text(documents, verbose=True):
     """
     Splits the loaded documents into smaller chunks for processing.
     """
-    print("\nSplitting documents into chunks...")
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    if verbose:
+        print("\nSplitting documents into chunks...")
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, 
+        chunk_size=1000,
         chunk_overlap=150
     )
     chunks = text_splitter.split_documents(documents)
-    print(f"Total chunks created: {len(chunks)}")
+    if verbose:
+        print(f"Total chunks created: {len(chunks)}")
     return chunks
 
-# --- VECTORIZATION AND STORAGE ---
+# --- INCREMENTAL INGESTION ---
+
+def content_hash(data):
+    """SHA-256 of a blob's bytes."""
+    return hashlib.sha256(data).hexdigest()
 
-def create_vector_store(chunks):
+def chunk_id(blob_name, blob_hash, index):
     """
-    Embeds the text chunks and stores them in a cloud-based Astra DB vector store.
+    Deterministic ID for the `index`-th chunk of a blob version, so re-ingesting
+    the same content upserts the same Astra DB documents instead of duplicating them.
     """
-    print("\nCreating and storing in Astra DB vector store...")
-    
-    # Initialize the Google Generative AI embedding model
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001"  # Gemini embedding model - uses GOOGLE_API_KEY from environment
+    return hashlib.sha256(f"{blob_name}\0{blob_hash}\0{index}".encode("utf-8")).hexdigest()[:32]
+
+def assign_chunk_ids(blob_name, blob_hash, chunks):
+    """
+    Stamps chunk metadata with its blob version and position and returns the deterministic IDs.
+    The content hash is stored with the chunks so the manifest can be rebuilt from the collection.
+    """
+    ids = []
+    for index, chunk in enumerate(chunks):
+        chunk.metadata["source"] = blob_name
+        chunk.metadata["content_hash"] = blob_hash
+        chunk.metadata["chunk_index"] = index
+        ids.append(chunk_id(blob_name, blob_hash, index))
+    return ids
+
+def load_manifest(path=INGEST_MANIFEST_PATH):
+    """
+    Loads the ingestion manifest: for each blob its etag, last-modified time,
+    content hash and the IDs of the chunks stored for it.
+    """
+    if not os.path.exists(path):
+        return {"version": 1, "collection": ASTRA_DB_COLLECTION_NAME, "blobs": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, path=INGEST_MANIFEST_PATH):
+    """Writes the manifest atomically so an interrupted run never leaves it half-written."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+def rebuild_manifest(vstore):
+    """
+    Rebuilds the manifest from the `source`, `content_hash` and `chunk_index` metadata of
+    the chunks in the Astra DB collection, for when the manifest file was lost (e.g. the
+    ephemeral disk of a redeployed container). Etags are unknown, so every blob is downloaded
+    once more, but blobs whose content hash matches are not re-embedded. Chunks stored
+    without a content hash are still tracked, so a re-ingest cleans them up.
+    """
+    codec = vstore.document_codec
+    chunks = {}
+    for record in vstore.astra_env.collection.find({}, projection=codec.base_projection):
+        document = codec.decode(record)
+        if document is None or not document.metadata.get("source"):
+            continue
+        chunks.setdefault(document.metadata["source"], []).append((codec.get_id(record), document.metadata))
+    blobs = {}
+    for source, stored in chunks.items():
+        stored.sort(key=lambda item: item[1].get("chunk_index", 0))
+        hashes = {metadata.get("content_hash") for _, metadata in stored}
+        blobs[source] = {
+            "etag": None,
+            "last_modified": None,
+            # Only trust the hash if every chunk belongs to the same version of the blob
+            "content_hash": hashes.pop() if len(hashes) == 1 else None,
+            "chunk_ids": [stored_id for stored_id, _ in stored],
+        }
+    print(f"Rebuilt the manifest from Astra DB: {len(blobs)} blobs, {sum(map(len, chunks.values()))} chunks.")
+    return {"version": 1, "collection": ASTRA_DB_COLLECTION_NAME, "blobs": blobs}
+
+def load_or_rebuild_manifest(path, vstore):
+    """Loads the manifest, or rebuilds and saves it from the collection if the file is missing."""
+    if os.path.exists(path) or not hasattr(vstore, "astra_env"):
+        return load_manifest(path)
+    manifest = rebuild_manifest(vstore)
+    save_manifest(manifest, path)
+    return manifest
+
+def _no_progress(phase=None, **counts):
+    pass
+
+def sync_from_azure(manifest_path=INGEST_MANIFEST_PATH, full=False, vstore=None, progress=None):
+    """
+    Incrementally syncs the Azure container into Astra DB using the manifest.
+
+    - Blobs whose etag (or, failing that, content hash) is unchanged are skipped.
+    - New or changed blobs are downloaded, split and upserted with deterministic chunk IDs;
+      chunks left over from the previous version are deleted.
+    - Blobs that disappeared from the container have their chunks deleted.
+
+    Blobs stream through a staged pipeline: concurrent downloads, parsing/OCR in a
+    process pool, then splitting and batched upserts, with a bounded number of blobs
+    in flight. With `full=True` every blob is re-processed, which is still idempotent.
+    `progress(phase, blobs_total=..., blobs_processed=..., chunks_embedded=..., error=...)`
+    is called as work completes (counts are increments).
+    Returns a dict of counters and throughput figures describing what was done.
+    """
+    progress = progress or _no_progress
+    if not AZURE_STORAGE_CONNECTION_STRING:
+        raise ValueError("Azure Storage connection string not provided")
+
+    stats = {
+        "blobs_seen": 0,
+        "blobs_unchanged": 0,
+        "blobs_changed": 0,
+        "blobs_deleted": 0,
+        "blobs_failed": 0,
+        "documents_loaded": 0,
+        "chunks_upserted": 0,
+        "chunks_deleted": 0,
+    }
+    report = ThroughputReport()
+
+    progress("listing")
+    blob_service_client = get_blob_service_client()
+    container_client = blob_service_client.get_container_client(AZURE_CONTAINER_NAME)
+    vstore = vstore or get_vector_store()
+
+    stored = load_or_rebuild_manifest(manifest_path, vstore)
+    manifest = {"version": 1, "collection": ASTRA_DB_COLLECTION_NAME, "blobs": {}} if full else stored
+    previous = dict(stored["blobs"])
+
+    seen = set()
+    to_process = []
+    for blob in container_client.list_blobs():
+        if not is_supported_blob(blob.name):
+            continue
+        seen.add(blob.name)
+        stats["blobs_seen"] += 1
+        entry = previous.get(blob.name)
+        if entry and entry.get("etag") == blob.etag and not full:
+            stats["blobs_unchanged"] += 1
+            continue
+        to_process.append(blob)
+    progress("processing", blobs_total=len(to_process))
+
+    hashes = {}
+    pending_ids = {}
+
+    def last_modified_of(blob):
+        return blob.last_modified.isoformat() if blob.last_modified else None
+
+    def download(blob):
+        print(f"Processing: {blob.name}")
+        return download_blob_bytes(container_client, blob)
+
+    def should_parse(blob, blob_data):
+        report.blobs += 1
+        report.bytes += len(blob_data)
+        blob_hash = content_hash(blob_data)
+        hashes[blob.name] = blob_hash
+        entry = previous.get(blob.name)
+        if entry and entry.get("content_hash") == blob_hash and not full:
+            # Metadata changed but the bytes did not; just record the new etag
+            manifest["blobs"][blob.name] = dict(entry, etag=blob.etag, last_modified=last_modified_of(blob))
+            stats["blobs_unchanged"] += 1
+            save_manifest(manifest, manifest_path)
+            progress(blobs_processed=1)
+            return False
+        return True
+
+    def on_parsed(blob, blob_data, documents):
+        chunks = split_text(documents, verbose=False) if documents else []
+        ids = assign_chunk_ids(blob.name, hashes[blob.name], chunks)
+        pending_ids[blob.name] = ids
+        report.documents += len(documents)
+        report.chunks += len(chunks)
+        stats["documents_loaded"] += len(documents)
+        writer.add(blob, chunks, ids)
+
+    def on_committed(blob):
+        ids = pending_ids.pop(blob.name)
+        entry = previous.get(blob.name)
+        stale_ids = sorted(set(entry.get("chunk_ids", [])) - set(ids)) if entry else []
+        if stale_ids:
+            vstore.delete(ids=stale_ids)
+            stats["chunks_deleted"] += len(stale_ids)
+        manifest["blobs"][blob.name] = {
+            "etag": blob.etag,
+            "last_modified": last_modified_of(blob),
+            "content_hash": hashes[blob.name],
+            "chunk_ids": ids,
+        }
+        stats["blobs_changed"] += 1
+        stats["chunks_upserted"] += len(ids)
+        print(f"  ✓ Upserted {len(ids)} chunks from {blob.name}")
+        progress(blobs_processed=1, chunks_embedded=len(ids))
+        # Persist after every blob so an interrupted run resumes where it stopped
+        save_manifest(manifest, manifest_path)
+
+    def on_error(blob, e):
+        print(f"Error processing {blob.name}: {e}")
+        stats["blobs_failed"] += 1
+        ids = pending_ids.pop(blob.name, None)
+        progress(blobs_processed=1, error=f"{blob.name}: {e}")
+        entry = previous.get(blob.name)
+        if ids:
+            # Writing failed part-way, so some of this version's chunks may be stored. Track
+            # them with the old version's chunks, and without an etag or hash so the next sync
+            # retries the blob and deletes whatever it no longer produces.
+            known = entry.get("chunk_ids", []) if entry else []
+            manifest["blobs"][blob.name] = {
+                "etag": None,
+                "last_modified": last_modified_of(blob),
+                "content_hash": None,
+                "chunk_ids": known + sorted(set(ids) - set(known)),
+                "partial": True,
+            }
+            save_manifest(manifest, manifest_path)
+        elif entry and blob.name not in manifest["blobs"]:
+            # Keep the old entry so its chunks can still be cleaned up later
+            manifest["blobs"][blob.name] = entry
+
+    writer = ChunkWriter(
+        lambda chunks, ids: vstore.add_documents(chunks, ids=ids),
+        on_committed,
+        on_error,
     )
-    
-    # Initialize the Astra DB vector store
-    vstore = AstraDBVectorStore(
+    run_pipeline(to_process, download, parse_blob, on_parsed, on_error, should_parse=should_parse)
+    writer.flush()
+    writer.batch_writer.print_summary()
+
+    # Remove chunks of blobs that no longer exist in the container
+    progress("cleanup")
+    for blob_name in sorted(set(previous) - seen):
+        stale_ids = previous[blob_name].get("chunk_ids", [])
+        print(f"Removing deleted blob: {blob_name} ({len(stale_ids)} chunks)")
+        try:
+            if stale_ids:
+                vstore.delete(ids=stale_ids)
+            manifest["blobs"].pop(blob_name, None)
+            stats["blobs_deleted"] += 1
+            stats["chunks_deleted"] += len(stale_ids)
+        except Exception as e:
+            print(f"Error removing {blob_name}: {e}")
+            manifest["blobs"][blob_name] = previous[blob_name]
+            stats["blobs_failed"] += 1
+            progress(error=f"{blob_name}: {e}")
+
+    save_manifest(manifest, manifest_path)
+    report.print_summary()
+    stats.update(report.as_dict())
+    stats["chunks_dead_lettered"] = writer.batch_writer.dead_lettered
+    stats["insert"] = writer.batch_writer.stats()
+    print(f"\nSync complete: {stats}")
+    return stats
+
+# --- VECTORIZATION AND STORAGE ---
+
+def get_vector_store():
+    """Returns the Astra DB vector store used for ingestion, created once per process."""
+    # The Google Generative AI embedding model behind the embedding cache,
+    # so unchanged chunks are not re-embedded (set EMBEDDING_CACHE_PATH to persist across runs)
+    embeddings = get_embeddings()
+
+    # The same store is reused by every sync and refresh (see clients.py)
+    return clients.vector_store(
         embedding=embeddings,
         collection_name=ASTRA_DB_COLLECTION_NAME,
         api_endpoint=os.getenv("ASTRA_DB_API_ENDPOINT"),
         token=os.getenv("ASTRA_DB_APPLICATION_TOKEN"),
         batch_size=50,  # Smaller batch size to avoid timeouts
     )
-    
-    # Process documents in smaller batches to avoid timeouts
-    batch_size = 100  # Process 100 chunks at a time
-    total_inserted = 0
-    
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i:i + batch_size]
-        try:
-            print(f"Processing batch {i//batch_size + 1}/{(len(chunks) + batch_size - 1)//batch_size} ({len(batch)} chunks)...")
-            inserted_ids = vstore.add_documents(batch)
-            total_inserted += len(inserted_ids)
-            print(f"  ✓ Successfully inserted {len(inserted_ids)} documents")
-        except Exception as e:
-            print(f"  ✗ Error processing batch: {e}")
-            continue
-    
-    print(f"\nSuccessfully inserted {total_inserted} out of {len(chunks)} documents into Astra DB.")
-    
+
+def create_vector_store(chunks, ids=None, vstore=None):
+    """
+    Embeds the text chunks and stores them in a cloud-based Astra DB vector store.
+    When `ids` are given, documents with the same ID are replaced (upsert).
+    Batches are sized adaptively, written concurrently and retried (see batch_writer.py);
+    chunks that still fail are written to the dead-letter file instead of being dropped.
+    """
+    print("\nCreating and storing in Astra DB vector store...")
+
+    vstore = vstore or get_vector_store()
+
+    # IDs are fixed up front so a retried batch overwrites, rather than duplicates, a partial insert
+    ids = ids or [uuid.uuid4().hex for _ in chunks]
+    writer = BatchWriter(lambda batch, batch_ids: vstore.add_documents(batch, ids=batch_ids))
+    failed = writer.write_all(chunks, ids)
+    writer.print_summary()
+
+    print(f"\nSuccessfully inserted {len(chunks) - len(failed)} out of {len(chunks)} documents into Astra DB.")
+
     return vstore
 
 
+# --- LOCAL VECTOR INDEX ---
+
+def build_local_index_from_azure(directory=None):
+    """
+    Builds the local vector index (RETRIEVAL_BACKEND=local) straight from the Azure
+    container without Astra DB: every blob is loaded, split and embedded through the
+    embedding cache.
+    """
+    from local_index import LOCAL_INDEX_DIR, build_local_index
+
+    hashes = {}
+    documents = load_documents_from_azure(hashes)
+    # Chunks are numbered per blob, as in the Astra DB sync, so the IDs and `chunk_index`
+    # match what `sync_from_azure` stores and adjacent chunks of a document can be found
+    by_source = {}
+    for chunk in split_text(documents):
+        by_source.setdefault(chunk.metadata["source"], []).append(chunk)
+    chunks, ids = [], []
+    for source, blob_chunks in by_source.items():
+        ids.extend(assign_chunk_ids(source, hashes[source], blob_chunks))
+        chunks.extend(blob_chunks)
+    print(f"\nEmbedding {len(chunks)} chunks into the local vector index...")
+    local_index = build_local_index(chunks, ids, get_embeddings(), directory or LOCAL_INDEX_DIR, model=EMBEDDING_MODEL)
+    print(f"Local vector index written to {local_index.directory} ({local_index.count} chunks).")
+    build_lexical_index_from_documents(local_index.documents)
+    return local_index
+
+def sync_local_index(directory=None, vstore=None):
+    """Copies the Astra DB collection, vectors included, into the local vector index and the lexical index."""
+    from local_index import LOCAL_INDEX_DIR, sync_local_index_from_astra
+
+    local_index = sync_local_index_from_astra(vstore or get_vector_store(), directory or LOCAL_INDEX_DIR, model=EMBEDDING_MODEL)
+    print(f"Local vector index written to {local_index.directory} ({local_index.count} chunks).")
+    build_lexical_index_from_documents(local_index.documents)
+    return local_index
+
+
+# --- LEXICAL INDEX ---
+
+def build_lexical_index_from_documents(documents, directory=None):
+    """Builds the BM25 index from the chunk records of the local vector index, without another scan."""
+    from lexical_index import LEXICAL_INDEX_DIR, LexicalIndex
+
+    lexical = LexicalIndex.build(
+        directory or LEXICAL_INDEX_DIR,
+        [document["id"] for document in documents],
+        [document["content"] for document in documents],
+        [document["metadata"] for document in documents],
+    )
+    print(f"Lexical index written to {lexical.directory} ({lexical.count} chunks, {lexical.info['terms']} terms).")
+    return lexical
+
+def sync_lexical_index(directory=None, vstore=None):
+    """Rebuilds the BM25 index used for hybrid retrieval from the Astra DB collection."""
+    from lexical_index import LEXICAL_INDEX_DIR, sync_lexical_index_from_astra
+
+    lexical = sync_lexical_index_from_astra(vstore or get_vector_store(), directory or LEXICAL_INDEX_DIR)
+    print(f"Lexical index written to {lexical.directory} ({lexical.count} chunks, {lexical.info['terms']} terms).")
+    return lexical
+
+
 # --- MAIN EXECUTION ---
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest documents from Azure Blob Storage into Astra DB.")
+    parser.add_argument("--full", action="store_true", help="Re-process every blob, ignoring the manifest")
+    parser.add_argument("--manifest", default=INGEST_MANIFEST_PATH, help="Path of the ingestion manifest")
+    parser.add_argument("--local-index", action="store_true", help="After syncing, copy the collection into the local vector index")
+    parser.add_argument("--local-only", action="store_true", help="Build the local vector index from Azure without Astra DB")
+    parser.add_argument("--no-lexical-index", action="store_true", help="Skip rebuilding the BM25 index used for hybrid retrieval")
+    args = parser.parse_args()
+
+    # Index and batch-writer messages (e.g. dead-lettered chunks) go through logging
+    from logging_config import configure_logging
+    configure_logging()
+
     print("--- Starting Data Ingestion Pipeline ---")
-    
+
     # Check if Azure connection string is configured
     if not AZURE_STORAGE_CONNECTION_STRING:
         print("Error: AZURE_STORAGE_CONNECTION_STRING not found in environment variables.")
         print("Please set this in your .env file.")
         exit(1)
-    
-    # 1. Load documents from Azure Blob Storage
-    docs = load_documents_from_azure()
-    
-    if not docs:
+
+    # One sync at a time on this host: /api/refresh-data holds the same lock while it runs.
+    # The lock is released when this process exits.
+    refresh_lock = shared_state.acquire("refresh-data")
+    if refresh_lock is None:
+        print("A data refresh is already running (API or another ingest run); waiting for it to finish...")
+        refresh_lock = shared_state.acquire("refresh-data", blocking=True)
+    shared_state.set_owner("refresh-data", None)
+
+    if args.local_only:
+        build_local_index_from_azure()
+        # Running API workers on this host reload the new index
+        shared_state.bump("ingest --local-only")
+        print("\n--- Data Ingestion Pipeline Complete ---")
+        exit(0)
+
+    # Load, split and store only new or changed blobs; remove deleted ones
+    stats = sync_from_azure(manifest_path=args.manifest, full=args.full)
+
+    if not stats["blobs_seen"]:
         print("No documents found in Azure Blob Storage. Exiting.")
     else:
-        # 2. Split documents into manageable chunks
-        doc_chunks = split_text(docs)
-        
-        # 3. Create and save the vector store in the cloud
-        create_vector_store(doc_chunks)
-        
+        if args.local_index:
+            sync_local_index()
+        elif not args.no_lexical_index:
+            sync_lexical_index()
+        # Running API workers on this host reload their retrievers and clear their answer caches
+        shared_state.bump("ingest")
         print("\n--- Data Ingestion Pipeline Complete ---")
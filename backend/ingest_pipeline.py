@@ -0,0 +1,178 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from batch_writer import BatchWriter
+
+# --- CONFIGURATION ---
+# Concurrent blob downloads (network bound)
+INGEST_DOWNLOAD_WORKERS = int(os.getenv("INGEST_DOWNLOAD_WORKERS", "8"))
+# Processes used for PDF/PPTX parsing and OCR (CPU bound); 0 parses in the download threads
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Blobs allowed between "download started" and "chunks written"; bounds memory use
+INGEST_MAX_IN_FLIGHT = int(os.getenv("INGEST_MAX_IN_FLIGHT", "16"))
+# Chunks buffered before they are flushed to the vector store (as concurrent insert batches)
+INGEST_WRITE_BATCH_SIZE = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "400"))
+
+
+class ThroughputReport:
+    """Counts work done by the pipeline and reports rates at the end."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.blobs = 0
+        self.bytes = 0
+        self.documents = 0
+        self.chunks = 0
+
+    def as_dict(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "blobs_per_second": round(self.blobs / elapsed, 2),
+            "docs_per_second": round(self.documents / elapsed, 2),
+            "chunks_per_second": round(self.chunks / elapsed, 2),
+            "megabytes_per_second": round(self.bytes / elapsed / 1e6, 3),
+        }
+
+    def print_summary(self):
+        rates = self.as_dict()
+        print(
+            f"\nThroughput: {self.blobs} blobs, {self.documents} docs, {self.chunks} chunks "
+            f"in {rates['elapsed_seconds']}s "
+            f"({rates['docs_per_second']} docs/s, {rates['chunks_per_second']} chunks/s, "
+            f"{rates['megabytes_per_second']} MB/s)"
+        )
+
+
+class _InlineExecutor:
+    """Runs parse jobs synchronously when no process pool is wanted."""
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def run_pipeline(
+    items: Iterable[Any],
+    download: Callable[[Any], bytes],
+    parse: Callable[[str, bytes], list],
+    on_parsed: Callable[[Any, bytes, list], None],
+    on_error: Callable[[Any, Exception], None],
+    should_parse: Optional[Callable[[Any, bytes], bool]] = None,
+    name_of: Callable[[Any], str] = lambda item: item.name,
+    download_workers: int = INGEST_DOWNLOAD_WORKERS,
+    parse_workers: int = INGEST_PARSE_WORKERS,
+    max_in_flight: int = INGEST_MAX_IN_FLIGHT,
+):
+    """
+    Streams items through download (thread pool) -> parse (process pool) -> `on_parsed`.
+
+    At most `max_in_flight` items are downloading or parsing at any time, and new
+    downloads only start when earlier items have been handed to `on_parsed`, so
+    memory stays bounded regardless of corpus size. `on_parsed` and `on_error` run
+    in the calling thread in completion order. `should_parse` may skip an item
+    after download (e.g. when its content hash is unchanged).
+    `parse` must be a picklable top-level function when `parse_workers` > 0.
+    """
+    pending = iter(items)
+    downloads: Dict[Future, Any] = {}
+    parses: Dict[Future, Tuple[Any, bytes]] = {}
+    # Parser processes start from a fresh interpreter ("spawn"): in the API this runs in a
+    # thread of a multithreaded worker, and forked children can deadlock on locks held by
+    # other threads at fork time (logging, httpx, the Azure SDK)
+    parse_pool = (
+        ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn"))
+        if parse_workers > 0 else _InlineExecutor()
+    )
+
+    with ThreadPoolExecutor(max_workers=max(1, download_workers)) as download_pool, parse_pool:
+
+        def fill():
+            while len(downloads) + len(parses) < max_in_flight:
+                item = next(pending, None)
+                if item is None:
+                    return
+                downloads[download_pool.submit(download, item)] = item
+
+        fill()
+        while downloads or parses:
+            done, _ = wait(list(downloads) + list(parses), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in downloads:
+                    item = downloads.pop(future)
+                    try:
+                        data = future.result()
+                        if should_parse is not None and not should_parse(item, data):
+                            continue
+                        parses[parse_pool.submit(parse, name_of(item), data)] = (item, data)
+                    except Exception as e:
+                        on_error(item, e)
+                else:
+                    item, data = parses.pop(future)
+                    try:
+                        on_parsed(item, data, future.result())
+                    except Exception as e:
+                        on_error(item, e)
+            fill()
+
+
+class ChunkWriter:
+    """
+    Buffers chunks from several blobs and writes them to the vector store through
+    a BatchWriter (concurrent, adaptive, retried batches). A blob is reported as
+    committed only once all of its chunks were written, or as failed if any of
+    its chunks could not be written.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List, List[str]], Any],
+        on_committed: Callable[[Any], None],
+        on_failed: Callable[[Any, Exception], None],
+        batch_size: int = INGEST_WRITE_BATCH_SIZE,
+        batch_writer: Optional[BatchWriter] = None,
+    ):
+        self.batch_writer = batch_writer or BatchWriter(write)
+        self.on_committed = on_committed
+        self.on_failed = on_failed
+        self.batch_size = batch_size
+        self._blobs: List[Tuple[Any, List, List[str]]] = []
+        self._buffered = 0
+
+    def add(self, blob: Any, chunks: List, ids: List[str]):
+        self._blobs.append((blob, chunks, ids))
+        self._buffered += len(chunks)
+        if self._buffered >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._blobs:
+            return
+        blobs, self._blobs, self._buffered = self._blobs, [], 0
+
+        chunks = [chunk for _, blob_chunks, _ in blobs for chunk in blob_chunks]
+        ids = [chunk_id for _, _, blob_ids in blobs for chunk_id in blob_ids]
+        owners = [index for index, (_, blob_chunks, _) in enumerate(blobs) for _ in blob_chunks]
+
+        errors: Dict[int, Exception] = {}
+        for index, error in sorted(self.batch_writer.write_all(chunks, ids).items()):
+            errors.setdefault(owners[index], error)
+
+        for index, (blob, _, _) in enumerate(blobs):
+            if index in errors:
+                self.on_failed(blob, errors[index])
+            else:
+                self.on_committed(blob)
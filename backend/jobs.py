@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from shared_state import SharedState, shared_state
+
+# --- BACKGROUND JOBS ---
+# Long-running work (data refresh) runs as a job on a worker thread. Clients get
+# a job ID back immediately and poll for progress instead of holding a request
+# open for minutes.
+
+ACTIVE_STATUSES = ("queued", "running")
+
+logger = logging.getLogger("collegegpt.jobs")
+
+
+class Job:
+    """State and progress of one background job, updated from the worker thread."""
+
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.phase = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.blobs_total: Optional[int] = None
+        self.blobs_processed = 0
+        self.chunks_embedded = 0
+        self.errors: List[str] = []
+        self.result: Optional[dict] = None
+        # Called after every update, e.g. to publish the job to other workers
+        self.on_change: Optional[Callable[["Job"], None]] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Job":
+        """A read-only snapshot of a job published by another worker."""
+        job = cls(data["kind"])
+        job.id = data["job_id"]
+        for field in ("status", "phase", "created_at", "started_at", "finished_at", "blobs_total",
+                      "blobs_processed", "chunks_embedded", "errors", "result"):
+            setattr(job, field, data.get(field))
+        return job
+
+    def changed(self):
+        if self.on_change is not None:
+            try:
+                self.on_change(self)
+            except Exception as e:
+                logger.warning("Could not publish job %s: %s", self.id, e)
+
+    def progress(self, phase: Optional[str] = None, blobs_total: Optional[int] = None,
+                 blobs_processed: int = 0, chunks_embedded: int = 0, error: Optional[str] = None):
+        """Progress callback handed to the work function; counts are increments."""
+        if phase:
+            self.phase = phase
+        if blobs_total is not None:
+            self.blobs_total = blobs_total
+        self.blobs_processed += blobs_processed
+        self.chunks_embedded += chunks_embedded
+        if error:
+            self.errors.append(error)
+        self.changed()
+
+    def eta_seconds(self) -> Optional[float]:
+        """Linear estimate of the remaining time from the blobs processed so far."""
+        if self.status != "running" or not self.blobs_total or not self.blobs_processed or not self.started_at:
+            return None
+        elapsed = time.time() - self.started_at
+        remaining = max(self.blobs_total - self.blobs_processed, 0)
+        return round(elapsed / self.blobs_processed * remaining, 1)
+
+    def as_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "phase": self.phase,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "blobs_total": self.blobs_total,
+            "blobs_processed": self.blobs_processed,
+            "chunks_embedded": self.chunks_embedded,
+            "errors": self.errors[-20:],
+            "error_count": len(self.errors),
+            "eta_seconds": self.eta_seconds(),
+            "result": self.result,
+        }
+
+
+class JobBusy(Exception):
+    """Raised by submit() when another process (e.g. `python ingest.py`) holds the lock without a job to report."""
+
+
+class JobRunner:
+    """
+    Runs jobs one at a time per kind (single flight): submitting while a job of the
+    same kind is queued or running returns the existing job instead of starting
+    another. The blocking `work` function runs in a thread; the optional async
+    `on_success` runs afterwards on the event loop, e.g. to swap in new state.
+
+    With `shared`, single flight extends to every worker on the host: a job holds
+    the kind's lock while it runs, and its progress is published so `get()` on
+    any worker can report it.
+    """
+
+    def __init__(self, max_history: int = 20, shared: Optional[SharedState] = None):
+        self.max_history = max_history
+        self.shared = shared
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks = set()
+
+    def _publish(self, job: Job):
+        self.shared.publish_job(job.as_dict())
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None and self.shared is not None:
+            data = self.shared.load_job(job_id)
+            job = Job.from_dict(data) if data else None
+        return job
+
+    def active(self, kind: str) -> Optional[Job]:
+        for job in self._jobs.values():
+            if job.kind == kind and job.status in ACTIVE_STATUSES:
+                return job
+        return None
+
+    def submit(
+        self,
+        kind: str,
+        work: Callable[[Job], dict],
+        on_success: Optional[Callable[[Job, dict], Awaitable[None]]] = None,
+    ) -> Tuple[Job, bool]:
+        """Returns (job, created). `created` is False when an active job was reused."""
+        existing = self.active(kind)
+        if existing:
+            return existing, False
+
+        lock = None
+        if self.shared is not None:
+            lock = self.shared.acquire(kind)
+            if lock is None:
+                # Another worker is running this kind of job
+                owner = self.shared.owner(kind)
+                remote = self.get(owner) if owner else None
+                if remote is not None and remote.status in ACTIVE_STATUSES:
+                    return remote, False
+                raise JobBusy(f"A {kind} job is already running in another process")
+
+        job = Job(kind)
+        if self.shared is not None:
+            job.on_change = self._publish
+            if lock is not None:
+                self.shared.set_owner(kind, job.id)
+                self.shared.prune_jobs()
+            job.changed()
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status in ACTIVE_STATUSES:
+                break
+            del self._jobs[oldest_id]
+
+        task = asyncio.get_running_loop().create_task(self._run(job, work, on_success, lock))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job, True
+
+    async def _run(self, job: Job, work, on_success, lock=None):
+        job.status = "running"
+        job.phase = "starting"
+        job.started_at = time.time()
+        job.changed()
+        try:
+            result = await asyncio.to_thread(work, job)
+            if on_success:
+                job.phase = "activating"
+                await on_success(job, result)
+            job.result = result
+            job.status = "succeeded"
+            job.phase = "done"
+        except Exception as e:
+            logger.error("Job failed: %s", e, extra={"job_id": job.id, "kind": job.kind})
+            job.errors.append(str(e))
+            job.status = "failed"
+            job.phase = "failed"
+        finally:
+            job.finished_at = time.time()
+            job.changed()
+            if lock is not None:
+                lock.release()
+
+
+# Shared runner for the API process; single flight across the host's workers
+job_runner = JobRunner(shared=shared_state)
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from collections import Counter
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from local_index import replace_directory
+from metrics import Counter as MetricCounter, REGISTRY, stage
+
+logger = logging.getLogger("collegegpt.lexical_index")
+
+# --- CONFIGURATION ---
+# Combine the vector retriever with the BM25 index below when one has been built
+HYBRID_RETRIEVAL_ENABLED = os.getenv("HYBRID_RETRIEVAL", "true").lower() == "true"
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", ".cache/lexical_index")
+# Reciprocal-rank fusion constant: a document at rank r contributes 1 / (LEXICAL_RRF_K + r)
+LEXICAL_RRF_K = int(os.getenv("LEXICAL_RRF_K", "60"))
+# The lexical result alone answers a question that names a code (e.g. "CS 101") when the best
+# chunk scores at least this many times the runner-up, at least LEXICAL_DECISIVE_MIN_SCORE in
+# BM25 terms, and matches at least LEXICAL_DECISIVE_COVERAGE of the query's term weight
+LEXICAL_DECISIVE_RATIO = float(os.getenv("LEXICAL_DECISIVE_RATIO", "2.0"))
+LEXICAL_DECISIVE_COVERAGE = float(os.getenv("LEXICAL_DECISIVE_COVERAGE", "0.8"))
+LEXICAL_DECISIVE_MIN_SCORE = float(os.getenv("LEXICAL_DECISIVE_MIN_SCORE", "5.0"))
+# Lexical hits scoring below this fraction of the best hit are left out of the fusion
+LEXICAL_MIN_RELATIVE_SCORE = 0.5
+
+# Indexes written with another version are not read; they are rebuilt (see StaleIndexError)
+INDEX_VERSION = 2
+# Postings arrays, one uncompressed .npy file each so every worker can memory-map them
+POSTINGS_ARRAYS = ("offsets", "doc_ids", "term_freqs", "lengths")
+TERMS_FILE = "terms.txt"
+DOCUMENTS_FILE = "documents.jsonl"
+INFO_FILE = "index.json"
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from has have how i in is it its me my of on or
+please should tell than that the their there these this to was what when where which who whom
+why will with would you your
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+# "CS 101", "CS-101" and "CS101" all index as "cs101"
+_CODE = re.compile(r"\b([a-z]{2,})[\s\-_/](\d{2,}[a-z]?)\b")
+# A token that is a code once joined: "cs101", "ee210a"
+_CODE_TOKEN = re.compile(r"[a-z]{2,}\d{2,}[a-z]?")
+
+hybrid_retrievals_total = REGISTRY.register(MetricCounter(
+    "rag_hybrid_retrievals_total", "Hybrid retrievals by how they were answered.", ["result"]))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words and numbers without stopwords, plus joined course/room codes."""
+    text = text.lower()
+    tokens = [token for token in _WORD.findall(text) if token not in STOPWORDS]
+    tokens.extend(letters + digits for letters, digits in _CODE.findall(text))
+    return tokens
+
+
+def has_code(query: str) -> bool:
+    """Whether the query names a course/room code, the only kind of query exact enough to skip vector search."""
+    return any(_CODE_TOKEN.fullmatch(token) for token in tokenize(query))
+
+
+class StaleIndexError(ValueError):
+    """Raised when the index on disk was written with another INDEX_VERSION and has to be rebuilt."""
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the ingested chunks, kept on local disk.
+
+    Postings are stored as flat arrays (one .npy file each, memory-mapped on load
+    so API workers share one copy in the page cache): per-term offsets into
+    `doc_ids`/`term_freqs` and each chunk's length in tokens, next to the sorted
+    vocabulary. Chunk text and metadata live in a JSON-lines sidecar, in the same
+    format as the local vector index.
+    """
+
+    def __init__(self, directory: str, documents: List[dict], info: dict, terms: List[str],
+                 offsets: np.ndarray, doc_ids: np.ndarray, term_freqs: np.ndarray, lengths: np.ndarray):
+        self.directory = directory
+        self.documents = documents
+        self.info = info
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.lengths = lengths
+        count = len(documents)
+        doc_freqs = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((count - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        average = float(lengths.mean()) if count else 1.0
+        # Per-chunk BM25 length normalization, precomputed once
+        self.norms = (BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(average, 1.0))).astype(np.float32)
+
+    @property
+    def count(self) -> int:
+        return len(self.documents)
+
+    @classmethod
+    def build(cls, directory: str, ids: List[str], texts: List[str], metadatas: List[dict]) -> "LexicalIndex":
+        """Tokenizes the chunks and writes a new index to `directory`, replacing any existing one."""
+        postings = {}
+        lengths = np.zeros(len(texts), dtype=np.uint32)
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[row] = sum(counts.values())
+            for term, freq in counts.items():
+                postings.setdefault(term, []).append((row, freq))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        doc_ids = np.empty(int(offsets[-1]), dtype=np.uint32)
+        term_freqs = np.empty(int(offsets[-1]), dtype=np.uint16)
+        for i, term in enumerate(terms):
+            rows, freqs = zip(*postings[term])
+            doc_ids[offsets[i]:offsets[i + 1]] = rows
+            term_freqs[offsets[i]:offsets[i + 1]] = np.minimum(freqs, np.iinfo(np.uint16).max)
+
+        staging = f"{directory.rstrip(os.sep)}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        with open(os.path.join(staging, TERMS_FILE), "w", encoding="utf-8") as f:
+            f.write("\n".join(terms))
+        arrays = {"offsets": offsets, "doc_ids": doc_ids, "term_freqs": term_freqs, "lengths": lengths}
+        for name in POSTINGS_ARRAYS:
+            np.save(os.path.join(staging, f"{name}.npy"), arrays[name])
+        with open(os.path.join(staging, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                f.write(json.dumps({"id": doc_id, "content": text, "metadata": metadata or {}}, ensure_ascii=False) + "\n")
+        info = {
+            "version": INDEX_VERSION,
+            "count": len(texts),
+            "terms": len(terms),
+            "postings": int(offsets[-1]),
+            "built_at": time.time(),
+        }
+        with open(os.path.join(staging, INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+
+        replace_directory(staging, directory)
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory: str = LEXICAL_INDEX_DIR) -> "LexicalIndex":
+        info_path = os.path.join(directory, INFO_FILE)
+        if not os.path.exists(info_path):
+            raise FileNotFoundError(f"No lexical index found in {directory}")
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("version") != INDEX_VERSION:
+            raise StaleIndexError(f"Lexical index in {directory} has version {info.get('version')}, expected {INDEX_VERSION}")
+        with open(os.path.join(directory, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            documents = [json.loads(line) for line in f if line.strip()]
+        with open(os.path.join(directory, TERMS_FILE), "r", encoding="utf-8") as f:
+            vocabulary = f.read()
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in POSTINGS_ARRAYS]
+        terms = vocabulary.split("\n") if vocabulary else []
+        return cls(directory, documents, info, terms, *arrays)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[Document, float, float]]:
+        """
+        Returns up to `k` (document, BM25 score, coverage) triples, best first, where
+        coverage is the share of the query's IDF weight the chunk matches. Words missing
+        from the vocabulary count with the IDF of a term no chunk contains, so a query
+        that is mostly unknown words never looks fully covered.
+        """
+        tokens = set(tokenize(query))
+        term_ids = sorted(self.term_ids[token] for token in tokens if token in self.term_ids)
+        if not term_ids or not self.documents or k <= 0:
+            return []
+        unknown = len(tokens) - len(term_ids)
+
+        scores = np.zeros(self.count, dtype=np.float32)
+        matched = np.zeros(self.count, dtype=np.float32)
+        for term in term_ids:
+            start, end = self.offsets[term], self.offsets[term + 1]
+            rows = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            scores[rows] += self.idf[term] * freqs * (BM25_K1 + 1) / (freqs + self.norms[rows])
+            matched[rows] += self.idf[term]
+        unknown_idf = float(np.log1p((self.count + 0.5) / 0.5))
+        total_weight = float(self.idf[term_ids].sum()) + unknown * unknown_idf or 1.0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        results = []
+        for row in candidates:
+            document = self.documents[row]
+            results.append((
+                Document(id=document["id"], page_content=document["content"], metadata=dict(document["metadata"])),
+                float(scores[row]),
+                float(matched[row]) / total_weight,
+            ))
+        return results
+
+
+def _document_key(doc: Document):
+    return doc.id or (doc.metadata.get("source"), doc.metadata.get("chunk_index"), doc.page_content)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Runs the vector retriever and the BM25 index side by side and fuses the two
+    rankings with reciprocal-rank fusion. When the lexical result is decisive (the
+    question names a course code that one chunk matches strongly and far better
+    than any other) it is returned at once and the vector search is cancelled.
+    """
+
+    vector_retriever: Any
+    lexical: Any
+    k: int = 5
+    rrf_k: int = LEXICAL_RRF_K
+    decisive_ratio: float = LEXICAL_DECISIVE_RATIO
+    decisive_coverage: float = LEXICAL_DECISIVE_COVERAGE
+    decisive_min_score: float = LEXICAL_DECISIVE_MIN_SCORE
+
+    def _lexical_search(self, query: str) -> List[Tuple[Document, float, float]]:
+        with stage("lexical"):
+            # One extra hit to compare the best score against
+            return self.lexical.search(query, self.k + 1)
+
+    def _is_decisive(self, query: str, hits: List[Tuple[Document, float, float]]) -> bool:
+        if not hits or not has_code(query):
+            return False
+        _, score, coverage = hits[0]
+        if coverage < self.decisive_coverage or score < self.decisive_min_score:
+            return False
+        # A single hit has nothing to be compared with; the absolute score above has to do
+        return len(hits) == 1 or score >= self.decisive_ratio * hits[1][1]
+
+    def _fuse(self, vector_docs: List[Document], hits: List[Tuple[Document, float, float]]) -> List[Document]:
+        fused = {}
+        lexical_docs = [doc for doc, score, _ in hits[:self.k] if score >= LEXICAL_MIN_RELATIVE_SCORE * hits[0][1]]
+        for ranking in (vector_docs, lexical_docs):
+            for rank, doc in enumerate(ranking, start=1):
+                key = _document_key(doc)
+                entry = fused.setdefault(key, [doc, 0.0])
+                entry[1] += 1.0 / (self.rrf_k + rank)
+        ranked = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)
+        return [doc for doc, _ in ranked[:self.k]]
+
+    def _answer(self, hits, vector_docs: Optional[List[Document]]) -> List[Document]:
+        if vector_docs is None:
+            hybrid_retrievals_total.inc(result="lexical")
+            return [doc for doc, _, _ in hits[:self.k]]
+        hybrid_retrievals_total.inc(result="fused" if hits else "vector")
+        return self._fuse(vector_docs, hits) if hits else vector_docs
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        hits = self._lexical_search(query)
+        if self._is_decisive(query, hits):
+            return self._answer(hits, None)
+        return self._answer(hits, self.vector_retriever.invoke(query))
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # The vector search (embedding + Astra DB round trip) starts first; the BM25
+        # lookup finishes in about a millisecond while it is in flight.
+        # Callbacks are not passed down, so "retrieval" is timed once for both searches.
+        vector_task = asyncio.ensure_future(self.vector_retriever.ainvoke(query))
+        try:
+            hits = self._lexical_search(query)
+            if self._is_decisive(query, hits):
+                return self._answer(hits, None)
+            return self._answer(hits, await vector_task)
+        finally:
+            if not vector_task.done():
+                vector_task.cancel()
+
+
+def build_lexical_index(documents: Iterable[Document], ids: List[str],
+                        directory: str = LEXICAL_INDEX_DIR) -> LexicalIndex:
+    documents = list(documents)
+    return LexicalIndex.build(directory, ids, [doc.page_content for doc in documents],
+                              [doc.metadata for doc in documents])
+
+
+def sync_lexical_index_from_astra(vstore, directory: str = LEXICAL_INDEX_DIR) -> LexicalIndex:
+    """Rebuilds the lexical index from every chunk of an AstraDBVectorStore collection (vectors are not fetched)."""
+    codec = vstore.document_codec
+    ids, texts, metadatas = [], [], []
+    for record in vstore.astra_env.collection.find({}, projection=codec.base_projection):
+        document = codec.decode(record)
+        if document is None:
+            continue
+        ids.append(codec.get_id(record))
+        texts.append(document.page_content)
+        metadatas.append(document.metadata)
+    logger.info("Fetched chunks from Astra DB for the lexical index", extra={"chunks": len(ids)})
+    return LexicalIndex.build(directory, ids, texts, metadatas)
+
+
+def lexical_index_exists(directory: str = LEXICAL_INDEX_DIR) -> bool:
+    return os.path.exists(os.path.join(directory, INFO_FILE))
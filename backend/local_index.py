@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+logger = logging.getLogger("collegegpt.local_index")
+
+# --- CONFIGURATION ---
+# "astra" queries Astra DB for every question; "local" searches the on-disk index below
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "astra").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", ".cache/local_index")
+# Indexes with at least this many chunks also get IVF clusters for approximate search
+LOCAL_INDEX_IVF_MIN_ROWS = int(os.getenv("LOCAL_INDEX_IVF_MIN_ROWS", "20000"))
+# Clusters scanned per query in approximate mode; higher is slower but more accurate
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+# "auto" uses IVF when the index has clusters, "exact" always scans every vector
+LOCAL_INDEX_SEARCH = os.getenv("LOCAL_INDEX_SEARCH", "auto").lower()
+
+INDEX_VERSION = 1
+VECTORS_FILE = "vectors.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+IVF_FILE = "ivf.npz"
+INFO_FILE = "index.json"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def replace_directory(staging: str, directory: str):
+    """Swaps a fully written staging directory into place, so readers never see a half-written index."""
+    previous = f"{directory.rstrip(os.sep)}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, previous)
+    os.replace(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+    """Spherical k-means on a sample of the (normalized) vectors; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > sample_size:
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(nlist):
+            members = sample[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class LocalVectorIndex:
+    """
+    Vector index kept on local disk: a memory-mapped float32 matrix of normalized
+    embeddings plus a JSON-lines sidecar with each chunk's ID, text and metadata.
+
+    Scores use the same scale as Astra DB's cosine metric, (1 + cos) / 2, so the
+    retriever's `score_threshold` means the same thing with either backend. Large
+    indexes are clustered (IVF): rows are stored grouped by cluster, and an
+    approximate search only scans the `nprobe` clusters nearest to the query.
+    """
+
+    def __init__(self, directory: str, vectors: np.ndarray, documents: List[dict], info: dict,
+                 centroids: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self.directory = directory
+        self.vectors = vectors
+        self.documents = documents
+        self.info = info
+        self.centroids = centroids
+        self.offsets = offsets
+
+    @property
+    def count(self) -> int:
+        return len(self.documents)
+
+    @property
+    def dim(self) -> int:
+        return int(self.info["dim"])
+
+    @property
+    def has_ivf(self) -> bool:
+        return self.centroids is not None
+
+    @classmethod
+    def build(cls, directory: str, ids: List[str], texts: List[str], metadatas: List[dict],
+              vectors, model: str = "", nlist: Optional[int] = None) -> "LocalVectorIndex":
+        """
+        Writes a new index to `directory`, replacing any existing one only once the
+        new files are complete. `nlist` sets the number of IVF clusters; by default
+        indexes of LOCAL_INDEX_IVF_MIN_ROWS chunks or more get about sqrt(n) clusters.
+        """
+        matrix = np.asarray(vectors, dtype=np.float32) if ids else np.zeros((0, 0), dtype=np.float32)
+        matrix = _normalize(matrix)
+        documents = [
+            {"id": doc_id, "content": text, "metadata": metadata or {}}
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+
+        if nlist is None:
+            nlist = int(np.sqrt(len(documents))) if len(documents) >= LOCAL_INDEX_IVF_MIN_ROWS else 0
+        nlist = min(nlist, len(documents))
+
+        centroids = offsets = None
+        if nlist > 1:
+            centroids = _kmeans(matrix, nlist)
+            assignment = np.argmax(matrix @ centroids.T, axis=1)
+            # Group rows by cluster so each probed cluster is one contiguous slice on disk
+            order = np.argsort(assignment, kind="stable")
+            matrix = matrix[order]
+            documents = [documents[i] for i in order]
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))])
+
+        staging = f"{directory.rstrip(os.sep)}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        matrix.tofile(os.path.join(staging, VECTORS_FILE))
+        with open(os.path.join(staging, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            for document in documents:
+                f.write(json.dumps(document, ensure_ascii=False) + "\n")
+        if centroids is not None:
+            np.savez(os.path.join(staging, IVF_FILE), centroids=centroids, offsets=offsets)
+        info = {
+            "version": INDEX_VERSION,
+            "dim": int(matrix.shape[1]) if len(documents) else 0,
+            "count": len(documents),
+            "model": model,
+            "nlist": int(nlist) if centroids is not None else 0,
+            "built_at": time.time(),
+        }
+        with open(os.path.join(staging, INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+
+        replace_directory(staging, directory)
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory: str = LOCAL_INDEX_DIR) -> "LocalVectorIndex":
+        """Opens an index written by `build`; the vectors stay on disk and are paged in on demand."""
+        info_path = os.path.join(directory, INFO_FILE)
+        if not os.path.exists(info_path):
+            raise FileNotFoundError(f"No local vector index found in {directory}")
+        with open(info_path, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        with open(os.path.join(directory, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            documents = [json.loads(line) for line in f if line.strip()]
+
+        if documents:
+            vectors = np.memmap(os.path.join(directory, VECTORS_FILE), dtype=np.float32, mode="r",
+                                shape=(len(documents), info["dim"]))
+        else:
+            vectors = np.zeros((0, info["dim"]), dtype=np.float32)
+
+        centroids = offsets = None
+        if info.get("nlist"):
+            with np.load(os.path.join(directory, IVF_FILE)) as ivf:
+                centroids, offsets = ivf["centroids"], ivf["offsets"]
+        return cls(directory, vectors, documents, info, centroids, offsets)
+
+    def _candidate_rows(self, query: np.ndarray, nprobe: int) -> List[Tuple[int, int]]:
+        """Row ranges of the `nprobe` clusters closest to the query."""
+        nearest = np.argsort(-(self.centroids @ query))[:nprobe]
+        return [(int(self.offsets[c]), int(self.offsets[c + 1])) for c in sorted(nearest)]
+
+    def search(self, embedding: List[float], k: int = 5, score_threshold: Optional[float] = None,
+               exact: Optional[bool] = None, nprobe: int = LOCAL_INDEX_NPROBE) -> List[Tuple[Document, float]]:
+        """
+        Returns up to `k` (document, score) pairs, best first. Exact search scans every
+        vector; approximate search scans the nearest IVF clusters only.
+        """
+        if not self.documents or k <= 0:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        if exact is None:
+            exact = LOCAL_INDEX_SEARCH == "exact" or not self.has_ivf
+
+        if exact:
+            rows = np.arange(self.count)
+            cosine = self.vectors @ query
+        else:
+            ranges = self._candidate_rows(query, nprobe)
+            rows = np.concatenate([np.arange(start, end) for start, end in ranges])
+            cosine = np.concatenate([self.vectors[start:end] @ query for start, end in ranges])
+
+        if len(cosine) > k:
+            top = np.argpartition(-cosine, k)[:k]
+        else:
+            top = np.arange(len(cosine))
+        top = top[np.argsort(-cosine[top])]
+
+        results = []
+        for position in top:
+            score = float((1.0 + cosine[position]) / 2.0)
+            if score_threshold is not None and score < score_threshold:
+                break
+            document = self.documents[rows[position]]
+            results.append((
+                Document(id=document["id"], page_content=document["content"], metadata=dict(document["metadata"])),
+                score,
+            ))
+        return results
+
+
+class LocalIndexRetriever(BaseRetriever):
+    """
+    Retriever over a LocalVectorIndex with the semantics of Astra DB's
+    "similarity_score_threshold" search: the top `k` chunks scoring at least `score_threshold`.
+    """
+
+    index: Any
+    embeddings: Any
+    k: int = 5
+    score_threshold: Optional[float] = None
+    exact: Optional[bool] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = self.embeddings.embed_query(query)
+        return [doc for doc, _ in self.index.search(embedding, self.k, self.score_threshold, self.exact)]
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        embedding = await self.embeddings.aembed_query(query)
+        return [doc for doc, _ in self.index.search(embedding, self.k, self.score_threshold, self.exact)]
+
+
+def build_local_index(documents: Iterable[Document], ids: List[str], embeddings, directory: str = LOCAL_INDEX_DIR,
+                      model: str = "", batch_size: int = 100) -> LocalVectorIndex:
+    """Embeds the chunks (through the embedding cache) and writes them as a local index."""
+    documents = list(documents)
+    texts = [doc.page_content for doc in documents]
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embeddings.embed_documents(texts[i:i + batch_size]))
+    return LocalVectorIndex.build(directory, ids, texts, [doc.metadata for doc in documents], vectors, model=model)
+
+
+def sync_local_index_from_astra(vstore, directory: str = LOCAL_INDEX_DIR, model: str = "") -> LocalVectorIndex:
+    """
+    Copies every chunk of an AstraDBVectorStore collection, with its stored vector,
+    into a new local index. Nothing is re-embedded.
+    """
+    codec = vstore.document_codec
+    ids, texts, metadatas, vectors = [], [], [], []
+    for record in vstore.astra_env.collection.find({}, projection=codec.full_projection):
+        document = codec.decode(record)
+        vector = codec.decode_vector(record)
+        if document is None or vector is None:
+            continue
+        ids.append(codec.get_id(record))
+        texts.append(document.page_content)
+        metadatas.append(document.metadata)
+        vectors.append(vector)
+    logger.info("Fetched chunks from Astra DB for the local index", extra={"chunks": len(ids)})
+    return LocalVectorIndex.build(directory, ids, texts, metadatas, vectors, model=model)
@@ -1,27 +1,105 @@
 import os
+import time
+
+# Measures how long importing the app takes (reported on /health)
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import logging
+import secrets
+from contextlib import AsyncExitStack, asynccontextmanager
 from dotenv import load_dotenv
 
 # Load environment variables FIRST before any other imports
 load_dotenv()
 
-from fastapi import FastAPI, Depends, HTTPException
+from logging_config import configure_logging
+
+configure_logging()
+
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_astradb import AstraDBVectorStore
 from clerk_auth import get_current_user_optional
+from streaming import stream_chat_events, cached_answer_events, ndjson_stream
+from answer_cache import ANSWER_CACHE_ENABLED, answer_cache
+from cached_embeddings import EMBEDDING_MODEL, get_embeddings
+from clients import clients
+from batching import BatchedEmbeddings
+from metrics import MetricsMiddleware, cache_lookups_total, context_tokens, langchain_config, render_metrics, stage
+from context import assemble_context, estimate_tokens
+from jobs import JobBusy, job_runner
+from shared_state import SHARED_STATE_POLL_SECONDS, shared_state
+from rate_limit import (
+    chat_anonymous_limiter,
+    chat_user_limiter,
+    client_key,
+    enforce,
+    rate_limited_total,
+    refresh_global_limiter,
+    refresh_limiter,
+)
+from sessions import (
+    SESSIONS_ENABLED,
+    condense_question,
+    condensed_questions_total,
+    session_store,
+    should_condense,
+    summarize_turns,
+)
+from local_index import LOCAL_INDEX_DIR, RETRIEVAL_BACKEND, LocalIndexRetriever, LocalVectorIndex
+from lexical_index import (
+    HYBRID_RETRIEVAL_ENABLED,
+    LEXICAL_INDEX_DIR,
+    HybridRetriever,
+    LexicalIndex,
+    StaleIndexError,
+    lexical_index_exists,
+)
+from concurrency import (
+    LLM_TIMEOUT_SECONDS,
+    RETRIEVAL_TIMEOUT_SECONDS,
+    Overloaded,
+    StageTimeout,
+    chat_limiter,
+    limit_stream,
+    run_stage,
+)
 from typing import Optional
 
+logger = logging.getLogger("collegegpt.api")
+
+# Seconds between initialization attempts while Astra DB or Gemini cannot be reached
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "30"))
+
 # --- ENVIRONMENT AND APP SETUP ---
 
+@asynccontextmanager
+async def lifespan(app):
+    """
+    Starts serving immediately and initializes the heavy clients in the background,
+    so a slow or unreachable Astra DB never stops the process from booting.
+    /health answers right away (liveness); /health/ready returns 503 until the
+    retriever and chain are ready. With several workers, each one also watches the
+    shared state generation and reloads when another process published new data.
+    """
+    tasks = [asyncio.create_task(initialize_in_background()), asyncio.create_task(watch_shared_state())]
+    yield
+    for task in tasks:
+        task.cancel()
+    await clients.aclose()
+    clients.close()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="RAG Chatbot API",
     description="An API for a Retrieval-Augmented Generation chatbot.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configure CORS (Cross-Origin Resource Sharing)
@@ -55,57 +133,44 @@ app.add_middleware(
         "Access-Control-Request-Method",
         "Access-Control-Request-Headers",
     ],
+    # The streaming endpoint returns the conversation's session ID as a header
+    expose_headers=["X-Session-Id"],
 )
 
+# Request counts, latency per route and per-stage timings (exposed on /metrics)
+app.add_middleware(MetricsMiddleware)
+
 # --- ASTRA DB AND LANGCHAIN SETUP ---
 
+# The embedding model, LLM and vector store are created by initialize_clients() and
+# build_rag_state() at startup (see lifespan), not at import time.
+# The Google Generative AI embedding model sits behind the embedding cache and is
+# shared by the vector store and the semantic answer cache, so a question is embedded once.
+embeddings = None
+llm = None
+# The generation half of the RAG chain (context + question -> answer).
+# The streaming endpoint runs it separately so sources can be sent before tokens.
+answer_chain = None
+
 def get_vector_store():
-    """Initializes and returns an AstraDBVectorStore instance."""
-    # Initialize the Google Generative AI embedding model
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001"  # Gemini embedding model - uses GOOGLE_API_KEY from environment
-    )
-    
-    # Initialize the Astra DB vector store
-    vstore = AstraDBVectorStore(
+    """Returns the shared AstraDBVectorStore; refreshes reuse it instead of reconnecting."""
+    return clients.vector_store(
         embedding=embeddings,
         collection_name=os.getenv("ASTRA_DB_COLLECTION_NAME", "rag_chatbot_collection"),
         api_endpoint=os.getenv("ASTRA_DB_API_ENDPOINT"),
         token=os.getenv("ASTRA_DB_APPLICATION_TOKEN"),
     )
-    return vstore
-
-# Initialize the vector store and retriever with better search parameters
-try:
-    vector_store = get_vector_store()
-    # Retrieve more documents for better context, with similarity threshold
-    retriever = vector_store.as_retriever(
-        search_type="similarity_score_threshold",
-        search_kwargs={
-            "k": 5,  # Get top 5 relevant documents instead of 3
-            "score_threshold": 0.5  # Only include reasonably relevant results
-        }
+
+def build_llm():
+    """Initializes the LLM with better settings for educational content."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-pro",
+        temperature=0.3,  # Slightly more creative while staying factual
+        max_tokens=1000,  # Allow longer responses
+        top_p=0.9,       # Better diversity in responses
     )
-    print("Astra DB connection successful.")
-except Exception as e:
-    print(f"Failed to connect to Astra DB: {e}")
-    # Fallback to basic retriever if similarity_score_threshold isn't supported
-    try:
-        vector_store = get_vector_store()
-        retriever = vector_store.as_retriever(search_kwargs={"k": 5})
-        print("Astra DB connection successful with basic retriever.")
-    except Exception as e2:
-        print(f"Failed to connect to Astra DB with fallback: {e2}")
-        vector_store = None
-        retriever = None
-
-# Initialize the LLM with better settings for educational content
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-pro", 
-    temperature=0.3,  # Slightly more creative while staying factual
-    max_tokens=1000,  # Allow longer responses
-    top_p=0.9,       # Better diversity in responses
-)
 
 # Define the prompt template for educational assistance
 prompt_template = """
@@ -129,16 +194,204 @@ Please provide a helpful, educational response:
 """
 prompt = ChatPromptTemplate.from_template(prompt_template)
 
-# Create the RAG chain using LangChain Expression Language (LCEL)
-# Only create the chain if retriever is available
-chain = None
-if retriever:
-    chain = (
+def compress_context(inputs: dict) -> str:
+    """De-duplicates, merges and budgets the retrieved chunks before they go into the prompt."""
+    with stage("context"):
+        context = assemble_context(inputs["context"])
+    context_tokens.observe(estimate_tokens(context))
+    return context
+
+def build_answer_chain(llm):
+    """Context assembly -> prompt -> LLM -> text; takes {"context": docs, "question": str}."""
+    return RunnablePassthrough.assign(context=RunnableLambda(compress_context)) | prompt | llm | StrOutputParser()
+
+class RagState:
+    """
+    The vector store, retriever and RAG chain used to answer questions.
+    A data refresh builds a complete new instance and swaps it in with a single
+    assignment, so a request never sees a new retriever paired with an old chain.
+    """
+
+    def __init__(self, vector_store=None, retriever=None, chain=None):
+        self.vector_store = vector_store
+        self.retriever = retriever
+        self.chain = chain
+
+    @property
+    def ready(self):
+        return self.retriever is not None and self.chain is not None
+
+def build_chain(retriever):
+    """Creates the RAG chain using LangChain Expression Language (LCEL)."""
+    return (
         {"context": retriever, "question": RunnablePassthrough()}
-        | prompt
-        | llm
-        | StrOutputParser()
+        | answer_chain
+    )
+
+def load_lexical_index(rebuild):
+    """
+    Opens the BM25 index. One written with another format version is rebuilt with
+    `rebuild()` first, by one worker at a time; the others then load its result.
+    """
+    try:
+        return LexicalIndex.load(LEXICAL_INDEX_DIR)
+    except StaleIndexError as e:
+        logger.warning("Rebuilding the lexical index: %s", e)
+    lock = shared_state.acquire("lexical-index", blocking=True)
+    try:
+        try:
+            return LexicalIndex.load(LEXICAL_INDEX_DIR)
+        except StaleIndexError:
+            return rebuild()
+    finally:
+        lock.release()
+
+def add_lexical_retrieval(retriever, rebuild):
+    """
+    Pairs the vector retriever with the BM25 index (HYBRID_RETRIEVAL) when one has been built.
+    `rebuild()` writes a current index from the vector store's chunks if the one on disk is stale.
+    """
+    if not HYBRID_RETRIEVAL_ENABLED or not lexical_index_exists(LEXICAL_INDEX_DIR):
+        return retriever
+    try:
+        lexical = load_lexical_index(rebuild)
+    except Exception as e:
+        logger.error("Failed to load the lexical index: %s", e)
+        return retriever
+    logger.info("Lexical index loaded", extra={"chunks": lexical.count, "terms": lexical.info.get("terms")})
+    return HybridRetriever(vector_retriever=retriever, lexical=lexical, k=5)
+
+def build_local_rag_state():
+    """Opens the local vector index (RETRIEVAL_BACKEND=local) and builds the retriever and RAG chain."""
+    try:
+        index = LocalVectorIndex.load(LOCAL_INDEX_DIR)
+    except Exception as e:
+        logger.error("Failed to load the local vector index: %s", e)
+        return RagState()
+    if index.info.get("model") and index.info["model"] != EMBEDDING_MODEL:
+        logger.warning("Local index was built with %s, queries use %s", index.info["model"], EMBEDDING_MODEL)
+    # Same search semantics as the Astra DB retriever below
+    def rebuild_lexical_index():
+        from ingest import build_lexical_index_from_documents
+
+        return build_lexical_index_from_documents(index.documents, LEXICAL_INDEX_DIR)
+
+    retriever = add_lexical_retrieval(
+        LocalIndexRetriever(index=index, embeddings=embeddings, k=5, score_threshold=0.5), rebuild_lexical_index
     )
+    logger.info("Local vector index loaded", extra={"chunks": index.count, "search": "ivf" if index.has_ivf else "exact"})
+    return RagState(index, retriever, build_chain(retriever))
+
+def build_rag_state():
+    """Connects to Astra DB (or opens the local index) and builds the retriever and RAG chain."""
+    if RETRIEVAL_BACKEND == "local":
+        return build_local_rag_state()
+
+    # Connect once; the fallback below only changes the search type
+    try:
+        vector_store = get_vector_store()
+        logger.info("Astra DB connection successful.")
+    except Exception as e:
+        logger.error("Failed to connect to Astra DB: %s", e)
+        return RagState()
+
+    # Initialize the retriever with better search parameters
+    try:
+        # Retrieve more documents for better context, with similarity threshold
+        retriever = vector_store.as_retriever(
+            search_type="similarity_score_threshold",
+            search_kwargs={
+                "k": 5,  # Get top 5 relevant documents instead of 3
+                "score_threshold": 0.5  # Only include reasonably relevant results
+            }
+        )
+    except Exception as e:
+        # Fallback to basic retriever if similarity_score_threshold isn't supported
+        logger.warning("Falling back to the basic retriever: %s", e)
+        retriever = vector_store.as_retriever(search_kwargs={"k": 5})
+
+    def rebuild_lexical_index():
+        from ingest import sync_lexical_index
+
+        return sync_lexical_index(LEXICAL_INDEX_DIR, vstore=vector_store)
+
+    retriever = add_lexical_retrieval(retriever, rebuild_lexical_index)
+    return RagState(vector_store, retriever, build_chain(retriever))
+
+# Replaced by the state built at startup (and after every data refresh)
+rag = RagState()
+
+# Startup progress, reported on /health
+startup_status = {"status": "starting", "attempts": 0, "error": None,
+                  "import_seconds": None, "init_seconds": None}
+
+def initialize_clients():
+    """Creates the embedding model, LLM and answer chain if they do not exist yet."""
+    global embeddings, llm, answer_chain
+    if embeddings is None:
+        embeddings = get_embeddings()
+    if answer_chain is None:
+        llm = build_llm()
+        answer_chain = build_answer_chain(llm)
+
+def initialize():
+    """Blocking part of startup: connects to the vector store and builds the chain. Returns readiness."""
+    global rag
+    if not rag.ready:
+        # Data published from here on is picked up by watch_shared_state()
+        shared_state.seen_generation = shared_state.generation()
+        rag = build_rag_state()
+    return rag.ready
+
+async def initialize_in_background():
+    """Runs initialize() off the event loop, retrying until the service is ready."""
+    started = time.perf_counter()
+    while True:
+        startup_status["attempts"] += 1
+        try:
+            # The Gemini clients set up their async transport on the event loop thread
+            initialize_clients()
+            ready = await asyncio.to_thread(initialize)
+            startup_status["error"] = None if ready else "Vector store or chain could not be initialized"
+        except Exception as e:
+            ready = False
+            startup_status["error"] = str(e)
+            logger.exception("Startup initialization failed")
+        if ready:
+            startup_status["status"] = "ready"
+            startup_status["init_seconds"] = round(time.perf_counter() - started, 3)
+            logger.info("Service ready", extra={"init_seconds": startup_status["init_seconds"]})
+            return
+        startup_status["status"] = "retrying"
+        await asyncio.sleep(STARTUP_RETRY_SECONDS)
+
+async def watch_shared_state():
+    """
+    Polls the shared generation counter (see shared_state.py). When another worker
+    finished a data refresh, or `python ingest.py` re-indexed, this worker rebuilds
+    its retriever from the new data (the local and lexical indexes are re-opened as
+    memory maps) and clears its answer cache, so all workers answer from the same data.
+    """
+    global rag
+    while True:
+        await asyncio.sleep(SHARED_STATE_POLL_SECONDS)
+        try:
+            generation = shared_state.changed()
+            # A worker that is still starting up loads the current data anyway
+            if generation is None or not rag.ready:
+                continue
+            logger.info("Reloading retriever for state generation %s", generation)
+            new_state = await asyncio.to_thread(build_rag_state)
+            if not new_state.ready:
+                logger.error("Could not rebuild the retriever for generation %s; keeping the old one and retrying", generation)
+                continue
+            rag = new_state
+            answer_cache.clear()
+            # Only now is the generation served; a failed rebuild is retried on the next poll
+            shared_state.seen_generation = generation
+            shared_state.reloads += 1
+        except Exception:
+            logger.exception("Shared state reload failed; retrying on the next poll")
 
 # --- API ENDPOINTS ---
 
@@ -147,121 +400,457 @@ class ChatRequest(BaseModel):
     question: str
     user_id: Optional[str] = None
     user_name: Optional[str] = None
+    # Conversation to continue; a new one is started (and its ID returned) when omitted
+    session_id: Optional[str] = Field(default=None, max_length=128)
 
 @app.get("/")
 def read_root():
     """A simple endpoint to check if the API is running."""
     return {"status": "API is running", "timestamp": "2025-08-06", "version": "1.0.1", "deployment": "fresh"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics for this worker: request/stage latency, tokens and cache hit rates."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health_check():
-    """Health check endpoint with more details."""
+    """
+    Liveness check with more details. Answers as soon as the process is up, even
+    while the clients are still initializing; see /health/ready for readiness.
+    """
+    active_refresh = job_runner.active("refresh-data")
     return {
         "status": "healthy",
-        "vector_store_initialized": vector_store is not None,
-        "retriever_initialized": retriever is not None,
-        "chain_initialized": chain is not None,
-        "embedding_model": "models/embedding-001"
+        "ready": rag.ready,
+        "startup": startup_status,
+        "vector_store_initialized": rag.vector_store is not None,
+        "retriever_initialized": rag.retriever is not None,
+        "chain_initialized": rag.chain is not None,
+        "retrieval_backend": RETRIEVAL_BACKEND,
+        "lexical_index": rag.retriever.lexical.count if isinstance(rag.retriever, HybridRetriever) else None,
+        "refresh_job": active_refresh.id if active_refresh else None,
+        "embedding_model": EMBEDDING_MODEL,
+        "answer_cache": answer_cache.stats(),
+        "sessions": session_store.stats(),
+        "admission": chat_limiter.stats(),
+        "rate_limits": {
+            "chat_user": chat_user_limiter.stats(),
+            "chat_anonymous": chat_anonymous_limiter.stats(),
+            "refresh": refresh_limiter.stats(),
+        },
+        "clients": clients.stats(),
+        "shared_state": shared_state.stats(),
+        "embedding_cache": embeddings.stats() if embeddings is not None else None,
+        "embedding_batches": (
+            embeddings.underlying.stats()
+            if embeddings is not None and isinstance(embeddings.underlying, BatchedEmbeddings) else None
+        ),
     }
 
+@app.get("/health/live")
+def liveness_check():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness probe: 200 once questions can be answered, 503 while starting up or degraded."""
+    if not rag.ready:
+        return JSONResponse(status_code=503, content={"status": startup_status["status"], "error": startup_status["error"]})
+    return {"status": "ready"}
+
+def build_user_context(request: ChatRequest, current_user: Optional[dict]) -> str:
+    """Returns the personalisation prefix for the prompt, or an empty string for anonymous users."""
+    if not current_user:
+        return ""
+    user_name = request.user_name or current_user.get('given_name', 'there')
+    logger.debug("Authenticated user", extra={"user_id": current_user.get("sub")})
+    return f"The user's name is {user_name}. Address them personally. "
+
+async def chat_rate_limit(http_request: Request, current_user: Optional[dict] = Depends(get_current_user_optional)):
+    """Per-client token bucket for the chat endpoints: by Clerk `sub` if signed in, else by IP."""
+    key = client_key(http_request, current_user)
+    if current_user:
+        enforce(chat_user_limiter, key, "chat_user")
+    else:
+        enforce(chat_anonymous_limiter, key, "chat_anonymous")
+
+async def refresh_rate_limit(http_request: Request, current_user: Optional[dict] = Depends(get_current_user_optional)):
+    """Separate, much lower limits for /api/refresh-data: per client and for the whole worker."""
+    key = client_key(http_request, current_user)
+    enforce(refresh_limiter, key, "refresh")
+    try:
+        enforce(refresh_global_limiter, "global", "refresh_global")
+    except HTTPException:
+        # The refresh did not run, so it should not use up the client's own allowance
+        refresh_limiter.refund(key)
+        raise
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    rate_limited_total.inc(limit="overload")
+    return JSONResponse(status_code=429, content={"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
+
+def resolve_session(request: ChatRequest, current_user: Optional[dict]):
+    """
+    Returns (history key, session ID) for the request, or (None, None) with sessions disabled.
+    Sessions of signed-in users are scoped to their Clerk `sub`, so a session ID alone
+    never gives access to another user's conversation.
+    """
+    if not SESSIONS_ENABLED:
+        return None, None
+    session_id = request.session_id or secrets.token_urlsafe(16)
+    if current_user and current_user.get("sub"):
+        return f"user:{current_user['sub']}:{session_id}", session_id
+    return f"anon:{session_id}", session_id
+
+async def needs_condensation(session_key: Optional[str], question: str) -> bool:
+    """Whether standalone_question() will call the LLM, so the caller must hold an admission slot first."""
+    if session_key is None:
+        return False
+    summary, turns = await session_store.ahistory(session_key)
+    return should_condense(question, turns, summary)
+
+async def standalone_question(session_key: Optional[str], question: str) -> str:
+    """
+    Rewrites a follow-up ("what about its fees?") into a standalone question using the
+    session history, so retrieval and the answer cache see what is actually asked.
+    Falls back to the original question if condensation fails. Callers hold a
+    chat_limiter slot when needs_condensation() is true.
+    """
+    if session_key is None:
+        return question
+    summary, turns = await session_store.ahistory(session_key)
+    if not (turns or summary):
+        return question
+    if not should_condense(question, turns, summary):
+        condensed_questions_total.inc(result="skipped")
+        return question
+    try:
+        with stage("condense"):
+            condensed = await run_stage("condense", condense_question(llm, question, turns, summary), LLM_TIMEOUT_SECONDS)
+        condensed_questions_total.inc(result="condensed")
+        logger.debug("Condensed follow-up question", extra={"question": question, "condensed": condensed})
+        return condensed
+    except Exception as e:
+        condensed_questions_total.inc(result="failed")
+        logger.warning("Question condensation failed: %s", e)
+        return question
+
+# Summaries run after the response; keep references so the tasks are not garbage collected
+summary_tasks = set()
+
+async def summarize_session(session_key: str):
+    """Folds the turns that left a session's window into its running summary."""
+    try:
+        while True:
+            # Summaries are LLM calls too, so they count against the chat admission cap. The
+            # slot is taken before the turns are, so a rejection leaves them queued.
+            async with chat_limiter.slot():
+                summary, turns = await session_store.atake_pending(session_key)
+                if not turns:
+                    return
+                summary = await summarize_turns(llm, summary, turns)
+            await session_store.aset_summary(session_key, summary)
+    except Overloaded as e:
+        logger.info("Session summary deferred: %s", e)
+        await session_store.adefer_summary(session_key)
+    except Exception as e:
+        logger.warning("Session summary failed: %s", e)
+        # Clears the in-progress flag; the turns taken above are dropped
+        while (await session_store.atake_pending(session_key))[1]:
+            pass
+
+async def remember_turn(session_key: Optional[str], question: str, answer: str):
+    """Adds a finished turn to the session, summarizing older turns in the background if enabled."""
+    if session_key is None or not answer:
+        return
+    if await session_store.aappend(session_key, question, answer):
+        task = asyncio.create_task(summarize_session(session_key))
+        summary_tasks.add(task)
+        task.add_done_callback(summary_tasks.discard)
+
+async def lookup_cached_answer(question: str, namespace: str):
+    """
+    Checks the exact and then the semantic answer cache.
+    Returns (answer or None, question embedding or None); the embedding is
+    reused when the freshly generated answer is stored.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+
+    answer = answer_cache.get_exact(namespace, question)
+    if answer is not None:
+        cache_lookups_total.inc(cache="answer", result="exact_hit")
+        return answer, None
+
+    embedding = None
+    if answer_cache.semantic_enabled:
+        try:
+            embedding = await run_stage(
+                "embedding", embeddings.aembed_query(question), RETRIEVAL_TIMEOUT_SECONDS
+            )
+            answer = answer_cache.get_semantic(namespace, embedding)
+            if answer is not None:
+                cache_lookups_total.inc(cache="answer", result="semantic_hit")
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+
+    if answer is None:
+        answer_cache.record_miss()
+        cache_lookups_total.inc(cache="answer", result="miss")
+    return answer, embedding
+
 @app.options("/api/chat")
 async def chat_options():
     """Handle OPTIONS preflight request for CORS"""
     return {"message": "OK"}
 
-@app.post("/api/chat")
+@app.post("/api/chat", dependencies=[Depends(chat_rate_limit)])
 async def chat(request: ChatRequest, current_user: Optional[dict] = Depends(get_current_user_optional)):
     """
     Handles chat requests. Receives a question, uses the RAG chain to generate an answer,
-    and returns the answer. Now supports authenticated users.
+    and returns the answer. Now supports authenticated users. Follow-up questions are
+    resolved against the conversation in `session_id`; the response carries the session
+    ID to send with the next question.
     """
-    print(f"Received chat request: {request.question}")  # Debug logging
-    
-    if not retriever or not chain:
+    logger.info("Chat request", extra={"question_chars": len(request.question), "authenticated": current_user is not None})
+
+    # Use one snapshot of the retrieval state for the whole request
+    state = rag
+    if not state.ready:
         error_msg = "Vector store or chain is not initialized. Please check your API keys and Astra DB connection."
-        print(f"Error: {error_msg}")
+        logger.error(error_msg)
         return {"error": error_msg}
     
     try:
         # Create a personalized prompt with better context
-        if current_user:
-            user_name = request.user_name or current_user.get('given_name', 'there')
-            user_context = f"The user's name is {user_name}. Address them personally. "
-            print(f"Authenticated user: {user_name}")
-        else:
-            user_context = ""
-        
-        # Enhanced question with user context
-        if user_context:
-            personalized_question = f"{user_context}Question: {request.question}"
-        else:
-            personalized_question = request.question
-            
-        print(f"Processing question: {personalized_question}")
-        
-        # Get the answer from the RAG chain
-        answer = chain.invoke(personalized_question)
-        
+        user_context = build_user_context(request, current_user)
+
+        session_key, session_id = resolve_session(request, current_user)
+
+        # Bound how many requests run the expensive stages at once on this worker. A
+        # follow-up that needs condensing takes its slot before that LLM call, so an
+        # overloaded worker rejects it before any model work; other requests only take
+        # one if the answer is not cached.
+        async with AsyncExitStack() as admission:
+            admitted = await needs_condensation(session_key, request.question)
+            if admitted:
+                await admission.enter_async_context(chat_limiter.slot())
+
+            # Follow-ups are rewritten into standalone questions from the session history
+            question = await standalone_question(session_key, request.question)
+
+            # Enhanced question with user context
+            if user_context:
+                personalized_question = f"{user_context}Question: {question}"
+            else:
+                personalized_question = question
+
+            # Answers are cached per personalisation so one user's name never leaks to another
+            answer, question_embedding = await lookup_cached_answer(question, user_context)
+            cached = answer is not None
+
+            if not cached:
+                if not admitted:
+                    await admission.enter_async_context(chat_limiter.slot())
+
+                # Retrieve with the bare question so the user's name does not skew the search
+                docs = await run_stage(
+                    "retrieval", state.retriever.ainvoke(question, config=langchain_config()), RETRIEVAL_TIMEOUT_SECONDS
+                )
+
+                # Generate the answer without blocking the event loop
+                answer = await run_stage(
+                    "generation",
+                    answer_chain.ainvoke({"context": docs, "question": personalized_question}, config=langchain_config()),
+                    LLM_TIMEOUT_SECONDS,
+                )
+
+        if not cached and ANSWER_CACHE_ENABLED:
+            answer_cache.put(user_context, question, answer, question_embedding)
+        await remember_turn(session_key, question, answer)
+
         # Clean up the answer and add personalization
         if current_user and request.user_name and not answer.startswith("Hello"):
             answer = f"Hello {request.user_name}! {answer}"
-        
+
         return {
             "answer": answer,
             "authenticated": current_user is not None,
-            "user_id": current_user.get('sub') if current_user else None
+            "user_id": current_user.get('sub') if current_user else None,
+            "cached": cached,
+            "session_id": session_id,
         }
+    except Overloaded as e:
+        logger.warning("Chat request rejected, worker overloaded", extra={"retry_after": e.retry_after})
+        return overloaded_response(e)
+    except StageTimeout as e:
+        logger.warning("Chat request timed out", extra={"stage": e.stage, "timeout": e.timeout})
+        return {"error": f"The request timed out: {e}"}
     except Exception as e:
+        logger.exception("Chat request failed")
         return {"error": f"An error occurred: {e}"}
 
-@app.post("/api/refresh-data")
-async def refresh_data_from_azure(current_user: Optional[dict] = Depends(get_current_user_optional)):
+@app.options("/api/chat/stream")
+async def chat_stream_options():
+    """Handle OPTIONS preflight request for CORS"""
+    return {"message": "OK"}
+
+async def answer_events(state, session_key: Optional[str], question: str, user_context: str):
+    """Stream events answering a standalone question from the answer cache or the RAG chain, and records the turn."""
+    personalized_question = f"{user_context}Question: {question}" if user_context else question
+
+    cached_answer, question_embedding = await lookup_cached_answer(question, user_context)
+    if cached_answer is not None:
+        await remember_turn(session_key, question, cached_answer)
+        async for event in cached_answer_events(cached_answer):
+            yield event
+        return
+
+    async def store_answer(answer: str):
+        if ANSWER_CACHE_ENABLED:
+            answer_cache.put(user_context, question, answer, question_embedding)
+        await remember_turn(session_key, question, answer)
+
+    # Retrieve with the bare question so the user's name does not skew the search
+    async for event in stream_chat_events(
+        state.retriever,
+        answer_chain,
+        personalized_question,
+        retrieval_query=question,
+        retrieval_timeout=RETRIEVAL_TIMEOUT_SECONDS,
+        generation_timeout=LLM_TIMEOUT_SECONDS,
+        on_complete=store_answer,
+    ):
+        yield event
+
+async def follow_up_events(state, session_key: str, original_question: str, user_context: str):
+    """Stream events for a follow-up: condenses it into a standalone question, then answers that."""
+    question = await standalone_question(session_key, original_question)
+    async for event in answer_events(state, session_key, question, user_context):
+        yield event
+
+@app.post("/api/chat/stream", dependencies=[Depends(chat_rate_limit)])
+async def chat_stream(request: ChatRequest, current_user: Optional[dict] = Depends(get_current_user_optional)):
     """
-    Endpoint to trigger data refresh from Azure Blob Storage.
-    This will re-ingest all documents from your Azure Blob Storage container.
-    Note: This is a time-consuming operation and should be used sparingly.
+    Streaming variant of /api/chat. Returns newline-delimited JSON frames:
+    a "sources" frame with the retrieved documents, "token" frames as Gemini
+    generates the answer, and a final "done" frame with timings. The conversation's
+    session ID is returned in the X-Session-Id header.
     """
+    logger.info("Streaming chat request", extra={"question_chars": len(request.question), "authenticated": current_user is not None})
+
+    state = rag
+    if not state.ready:
+        error_msg = "Vector store or chain is not initialized. Please check your API keys and Astra DB connection."
+        logger.error(error_msg)
+        return {"error": error_msg}
+
+    user_context = build_user_context(request, current_user)
+    session_key, session_id = resolve_session(request, current_user)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if session_id:
+        headers["X-Session-Id"] = session_id
+
+    if await needs_condensation(session_key, request.question):
+        # Condensing is an LLM call, so it runs in the stream below, inside its admission slot
+        events = follow_up_events(state, session_key, request.question, user_context)
+    else:
+        # No LLM call here: the question is used as it is
+        question = await standalone_question(session_key, request.question)
+        events = answer_events(state, session_key, question, user_context)
+
+    # Reject before the response starts if the queue is already full; the slot itself is
+    # taken inside the stream so it is always released
     try:
+        chat_limiter.check()
+    except Overloaded as e:
+        return overloaded_response(e)
+    return StreamingResponse(
+        ndjson_stream(limit_stream(chat_limiter, events)),
+        media_type="application/x-ndjson",
+        headers=headers,
+    )
+
+@app.post("/api/refresh-data", status_code=202, dependencies=[Depends(refresh_rate_limit)])
+async def refresh_data_from_azure(current_user: Optional[dict] = Depends(get_current_user_optional)):
+    """
+    Queues a data refresh from Azure Blob Storage as a background job and returns its ID.
+    The container is synced incrementally: only new or changed blobs are re-ingested
+    and chunks of deleted blobs are removed from Astra DB. While a refresh is queued or
+    running, further calls return the existing job. Poll GET /api/refresh-data/{job_id}
+    for progress. Once the sync finishes, the new retriever and chain are swapped in
+    atomically and the answer cache is cleared.
+    """
+    def run_refresh(job):
         # Import the ingestion functions
-        from ingest import load_documents_from_azure, split_text, create_vector_store
-        
-        # Load documents from Azure Blob Storage
-        print("Loading documents from Azure Blob Storage...")
-        docs = load_documents_from_azure()
-        
-        if not docs:
-            return {"error": "No documents found in Azure Blob Storage"}
-        
-        # Split documents into chunks
-        print("Splitting documents into chunks...")
-        doc_chunks = split_text(docs)
-        
-        # Update vector store
-        print("Updating vector store...")
-        create_vector_store(doc_chunks)
-        
-        # Reinitialize the retriever with updated data
-        global retriever, chain
-        vector_store = get_vector_store()
-        retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-        
-        # Recreate the chain with the new retriever
-        if retriever:
-            chain = (
-                {"context": retriever, "question": RunnablePassthrough()}
-                | prompt
-                | llm
-                | StrOutputParser()
-            )
-        
+        from ingest import sync_from_azure
+
+        # Only new or changed blobs are downloaded and embedded; deleted blobs are removed
+        logger.info("Syncing documents from Azure Blob Storage...")
+        stats = sync_from_azure(progress=job.progress)
+
+        if not stats["blobs_seen"]:
+            raise ValueError("No documents found in Azure Blob Storage")
+
+        if RETRIEVAL_BACKEND == "local":
+            # Copy the updated collection, vectors included, into the local index (and the lexical index)
+            from ingest import sync_local_index
+
+            job.progress("syncing local index")
+            sync_local_index()
+        elif HYBRID_RETRIEVAL_ENABLED:
+            from ingest import sync_lexical_index
+
+            job.progress("syncing lexical index")
+            sync_lexical_index()
+
+        # Build the new retriever and chain off the event loop before swapping them in
+        job.progress("building retriever")
+        new_state = build_rag_state()
+        if not new_state.ready:
+            raise RuntimeError("Could not rebuild the retriever after the refresh")
         return {
             "message": "Data refresh completed successfully",
-            "documents_processed": len(docs),
-            "chunks_created": len(doc_chunks)
+            "documents_processed": stats["documents_loaded"],
+            "chunks_created": stats["chunks_upserted"],
+            "sync": stats,
+            "state": new_state,
         }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Data refresh failed: {e}")
+
+    async def activate(job, result):
+        global rag
+        rag = result.pop("state")
+        # Cached answers may be based on documents that just changed
+        answer_cache.clear()
+        # The other workers reload their retrievers and clear their caches too
+        shared_state.bump("refresh-data")
+
+    # The retriever needs the embedding model and chain even if startup has not finished
+    initialize_clients()
+    try:
+        job, created = job_runner.submit("refresh-data", run_refresh, activate)
+    except JobBusy as e:
+        # `python ingest.py` is syncing on this host
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "deduplicated": not created,
+        "status_url": f"/api/refresh-data/{job.id}",
+    }
+
+@app.get("/api/refresh-data/{job_id}")
+async def refresh_data_status(job_id: str):
+    """Returns the phase, progress counters, errors and ETA of a refresh job."""
+    job = job_runner.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Refresh job not found")
+    return job.as_dict()
+
+startup_status["import_seconds"] = round(time.perf_counter() - IMPORT_STARTED, 3)
 
 # To run this app:
 # 1. Make sure your virtual environment is activated.
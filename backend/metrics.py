@@ -0,0 +1,308 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# --- CONFIGURATION ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Adds a Server-Timing header with the stages measured before the response started
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", "false").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# --- METRIC TYPES ---
+# A minimal Prometheus text-format implementation; values are per worker process.
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_number(value)}"
+
+    def render(self) -> List[str]:
+        with self._lock:
+            samples = list(self._samples())
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + samples
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self) -> Iterable[str]:
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, ("le", _format_number(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_number(total)}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- METRICS ---
+request_seconds = REGISTRY.register(Histogram(
+    "rag_request_duration_seconds", "HTTP request latency until the response body was sent.", ["endpoint", "method"]))
+requests_total = REGISTRY.register(Counter(
+    "rag_requests_total", "HTTP requests by endpoint and status code.", ["endpoint", "method", "status"]))
+in_flight_requests = REGISTRY.register(Gauge(
+    "rag_in_flight_requests", "HTTP requests currently being served."))
+stage_seconds = REGISTRY.register(Histogram(
+    "rag_stage_duration_seconds",
+    "Latency of hot-path stages: auth, jwks_fetch, condense, embedding, retrieval, lexical, context, prompt, generation.", ["stage"]))
+time_to_first_token_seconds = REGISTRY.register(Histogram(
+    "rag_llm_time_to_first_token_seconds", "Time from the LLM call to its first streamed token."))
+llm_tokens_total = REGISTRY.register(Counter(
+    "rag_llm_tokens_total", "Tokens reported by the LLM, by direction.", ["type"]))
+cache_lookups_total = REGISTRY.register(Counter(
+    "rag_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"]))
+context_tokens = REGISTRY.register(Histogram(
+    "rag_context_tokens", "Estimated tokens of retrieved context sent to the LLM.",
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000)))
+embedding_batch_size = REGISTRY.register(Histogram(
+    "rag_embedding_batch_size", "Questions per micro-batched embedding call.", buckets=SIZE_BUCKETS))
+embedding_batch_wait_seconds = REGISTRY.register(Histogram(
+    "rag_embedding_batch_wait_seconds", "Time a question waited in the embedding micro-batcher.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)))
+
+# --- PER-REQUEST TIMINGS ---
+# Stage durations of the current request, used for the Server-Timing header
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def record_stage(name: str, seconds: float):
+    """Records one stage duration in the histogram and in the current request's timings."""
+    stage_seconds.observe(seconds, stage=name)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    """Times the enclosed block as one hot-path stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that counts requests, tracks in-flight requests and latency per
+    route, and collects stage timings for the request in a context variable.
+    Being plain ASGI (not BaseHTTPMiddleware), it works with streaming responses.
+    """
+
+    def __init__(self, app, server_timing_header: bool = SERVER_TIMING_HEADER):
+        self.app = app
+        self.server_timing_header = server_timing_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings: Dict[str, float] = {}
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+        in_flight_requests.inc()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing_header and timings:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(timings).encode("latin-1")))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight_requests.dec()
+            # Label by route template (known once routing ran) so IDs in paths do not add series
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            request_seconds.observe(time.perf_counter() - started, endpoint=endpoint, method=method)
+            requests_total.inc(endpoint=endpoint, method=method, status=str(status))
+            _request_timings.reset(token)
+
+
+# --- LANGCHAIN INSTRUMENTATION ---
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Records retrieval, prompt-building and generation latency, time to first
+    token and token usage from LangChain callbacks, so the chain itself needs
+    no changes. Attach it with `langchain_config()`.
+    """
+
+    # Called directly on the event loop; the handlers only do bookkeeping
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[UUID, Tuple[str, float]] = {}
+        self._first_token: Dict[UUID, bool] = {}
+
+    def _start(self, run_id: UUID, name: str):
+        self._started[run_id] = (name, time.perf_counter())
+
+    def _end(self, run_id: UUID):
+        entry = self._started.pop(run_id, None)
+        self._first_token.pop(run_id, None)
+        if entry:
+            record_stage(entry[0], time.perf_counter() - entry[1])
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, **kwargs):
+        if kwargs.get("run_type") == "prompt":
+            self._start(run_id, "prompt")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id in self._started:
+            self._end(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "generation")
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "generation")
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if run_id in self._started and not self._first_token.get(run_id):
+            self._first_token[run_id] = True
+            time_to_first_token_seconds.observe(time.perf_counter() - self._started[run_id][1])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    llm_tokens_total.inc(usage.get("input_tokens", 0), type="input")
+                    llm_tokens_total.inc(usage.get("output_tokens", 0), type="output")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+
+_callback_handler = MetricsCallbackHandler()
+
+
+def langchain_config() -> dict:
+    """Runnable config that attaches the metrics callbacks (empty when metrics are disabled)."""
+    return {"callbacks": [_callback_handler]} if METRICS_ENABLED else {}
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,131 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+
+from metrics import Counter, REGISTRY
+
+# --- CONFIGURATION ---
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Chat requests per minute and burst size for signed-in users (keyed by Clerk `sub`)
+CHAT_RATE_PER_MINUTE = float(os.getenv("CHAT_RATE_PER_MINUTE", "30"))
+CHAT_RATE_BURST = float(os.getenv("CHAT_RATE_BURST", "10"))
+# The same for anonymous clients (keyed by client IP)
+ANON_CHAT_RATE_PER_MINUTE = float(os.getenv("ANON_CHAT_RATE_PER_MINUTE", "10"))
+ANON_CHAT_RATE_BURST = float(os.getenv("ANON_CHAT_RATE_BURST", "5"))
+# /api/refresh-data: per client, and for the whole worker
+REFRESH_RATE_PER_HOUR = float(os.getenv("REFRESH_RATE_PER_HOUR", "4"))
+REFRESH_RATE_BURST = float(os.getenv("REFRESH_RATE_BURST", "2"))
+REFRESH_GLOBAL_RATE_PER_HOUR = float(os.getenv("REFRESH_GLOBAL_RATE_PER_HOUR", "12"))
+# Proxies in front of the app that append the connecting address to X-Forwarded-For (1 on
+# Render). The client IP is read that many entries from the right, since everything further
+# left was sent by the client. 0 uses the peer address (set by uvicorn's proxy headers handling
+# when FORWARDED_ALLOW_IPS lists the proxy).
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "0"))
+# Buckets kept in memory; idle ones are refilled anyway, so the oldest are dropped beyond this
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+rate_limited_total = REGISTRY.register(Counter(
+    "rag_rate_limited_total", "Requests rejected with 429, by limit.", ["limit"]))
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by client: each key holds up to `burst` tokens and
+    refills at `rate` tokens per second; a request takes one token. Buckets
+    are kept in an LRU of `max_keys`, since a bucket that has been idle long
+    enough is full again and can be recreated on demand.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = RATE_LIMIT_MAX_KEYS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        self.clock = clock
+        # key -> [tokens, last refill time]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        """Takes `cost` tokens from the key's bucket. Returns 0 if allowed, else seconds until it would be."""
+        now = self.clock()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        self._buckets.move_to_end(key)
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return 0.0
+        self.limited += 1
+        return (cost - bucket[0]) / self.rate if self.rate > 0 else math.inf
+
+    def refund(self, key: str, cost: float = 1.0):
+        """Gives back tokens taken by `acquire`, for a request that a later check rejected."""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + cost)
+            self.allowed -= 1
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "keys": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+        }
+
+
+def client_ip(request: Request, trusted_hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """
+    The client's IP: the X-Forwarded-For entry added by the outermost of `trusted_hops`
+    proxies, or the peer address. The leftmost entries are never used, since a client can
+    send any X-Forwarded-For it likes and would get a new rate-limit bucket per request.
+    """
+    if trusted_hops > 0:
+        hops = [hop.strip() for value in request.headers.getlist("x-forwarded-for") for hop in value.split(",")]
+        hops = [hop for hop in hops if hop]
+        if len(hops) >= trusted_hops:
+            return hops[-trusted_hops]
+    return request.client.host if request.client else "unknown"
+
+
+def client_key(request: Request, current_user: Optional[dict]) -> str:
+    """Clerk `sub` for signed-in users, otherwise the client IP (see client_ip)."""
+    if current_user and current_user.get("sub"):
+        return f"user:{current_user['sub']}"
+    return f"ip:{client_ip(request)}"
+
+
+def enforce(limiter: RateLimiter, key: str, limit: str):
+    """Raises 429 with a Retry-After header when `key` is over `limiter`'s rate."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    wait = limiter.acquire(key)
+    if wait > 0:
+        rate_limited_total.inc(limit=limit)
+        retry_after = max(1, math.ceil(wait)) if math.isfinite(wait) else 3600
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests, retry after {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+# Shared limiters for the API process
+chat_user_limiter = RateLimiter(CHAT_RATE_PER_MINUTE / 60, CHAT_RATE_BURST)
+chat_anonymous_limiter = RateLimiter(ANON_CHAT_RATE_PER_MINUTE / 60, ANON_CHAT_RATE_BURST)
+refresh_limiter = RateLimiter(REFRESH_RATE_PER_HOUR / 3600, REFRESH_RATE_BURST)
+refresh_global_limiter = RateLimiter(REFRESH_GLOBAL_RATE_PER_HOUR / 3600, REFRESH_RATE_BURST)
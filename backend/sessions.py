@@ -0,0 +1,554 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from metrics import Counter, Gauge, REGISTRY
+from shared_state import SHARED_STATE_DIR
+
+# --- CONFIGURATION ---
+SESSIONS_ENABLED = os.getenv("SESSIONS_ENABLED", "true").lower() == "true"
+# SQLite file shared by all workers on the host, so a follow-up finds its history whichever
+# worker it lands on; "" keeps sessions in this worker's memory (fine with a single worker)
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", os.path.join(SHARED_STATE_DIR, "sessions.db"))
+# Sessions kept; the least recently used one is evicted beyond this
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "5000"))
+# Turns (question + answer) kept verbatim per session
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "6"))
+# Cap on the text stored per session (turns, turns waiting to be summarized and the summary)
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", "8192"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+# Answers are only kept as context for condensing follow-ups, so a prefix is enough
+SESSION_MAX_ANSWER_CHARS = int(os.getenv("SESSION_MAX_ANSWER_CHARS", "600"))
+# Fold turns that fall out of the window into a running LLM summary (one extra LLM call per eviction)
+SESSION_SUMMARY_ENABLED = os.getenv("SESSION_SUMMARY_ENABLED", "false").lower() == "true"
+SESSION_SUMMARY_MAX_CHARS = int(os.getenv("SESSION_SUMMARY_MAX_CHARS", "800"))
+# "auto" condenses only questions that look like follow-ups, "always" every question with history, "off" none
+SESSION_CONDENSE = os.getenv("SESSION_CONDENSE", "auto").lower()
+
+sessions_active = REGISTRY.register(Gauge("rag_sessions", "Conversation sessions held in the session store."))
+session_bytes = REGISTRY.register(Gauge("rag_session_bytes", "Bytes of conversation text held in the session store."))
+condensed_questions_total = REGISTRY.register(Counter(
+    "rag_condensed_questions_total", "Questions with session history by condensation result.", ["result"]))
+
+# --- PROMPTS ---
+
+CONDENSE_TEMPLATE = """Rewrite the follow-up question so it can be understood without the conversation.
+Keep course codes, names, dates and numbers exactly as written. Reply with the rewritten question only.
+
+Earlier conversation (summary):
+{summary}
+
+Recent conversation:
+{history}
+
+Follow-up question: {question}
+Standalone question:"""
+
+SUMMARY_TEMPLATE = """Update the summary of a student's conversation with a college assistant.
+Keep the topics, courses, names and facts the student asked about; drop greetings and filler.
+Reply with the updated summary only, in at most {max_chars} characters.
+
+Current summary:
+{summary}
+
+New turns:
+{history}
+
+Updated summary:"""
+
+# Words that usually point back at an earlier turn
+_REFERENCES = re.compile(
+    r"\b(it|its|they|them|their|that|this|those|these|he|she|him|his|her|there|same|above|"
+    r"previous|earlier|also|else|more|another|other|which one)\b",
+    re.IGNORECASE,
+)
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+class _Turn:
+    __slots__ = ("question", "answer", "size")
+
+    def __init__(self, question: str, answer: str):
+        self.question = question
+        self.answer = answer
+        self.size = _size(question) + _size(answer)
+
+
+class _Session:
+    __slots__ = ("turns", "pending", "summary", "size", "last_seen", "summarizing")
+
+    def __init__(self):
+        self.turns: "deque[_Turn]" = deque()
+        # Turns that left the window and have not been folded into the summary yet
+        self.pending: List[_Turn] = []
+        self.summary = ""
+        self.size = 0
+        self.last_seen = time.monotonic()
+        self.summarizing = False
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "turns": [(turn.question, turn.answer) for turn in self.turns],
+            "pending": [(turn.question, turn.answer) for turn in self.pending],
+            "summary": self.summary,
+            "summarizing": self.summarizing,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> "_Session":
+        values = json.loads(data)
+        session = cls()
+        session.turns.extend(_Turn(question, answer) for question, answer in values["turns"])
+        session.pending = [_Turn(question, answer) for question, answer in values["pending"]]
+        session.summary = values["summary"]
+        session.summarizing = values["summarizing"]
+        session.size = sum(turn.size for turn in session.turns) + sum(turn.size for turn in session.pending) + _size(session.summary)
+        return session
+
+
+class SessionStore:
+    """
+    Bounded conversation history for the chat endpoints.
+
+    Each session is a ring buffer of its last `max_turns` turns, capped at
+    `max_bytes` of text; sessions are evicted least recently used first beyond
+    `max_sessions` and expire after `ttl` seconds idle. Turns that fall out of
+    the window are either dropped or, with summaries enabled, queued for
+    `take_pending()` to fold into the session's running summary. Sizes are the
+    UTF-8 bytes of the stored text, so the store holds at most about
+    `max_sessions * max_bytes` bytes of text.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        max_turns: int = SESSION_MAX_TURNS,
+        max_bytes: int = SESSION_MAX_BYTES,
+        ttl: float = SESSION_TTL_SECONDS,
+        summaries: bool = SESSION_SUMMARY_ENABLED,
+    ):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.summaries = summaries
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.turns_dropped = 0
+
+    def _get(self, key: str) -> Optional[_Session]:
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_seen > self.ttl:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return session
+
+    def _remove(self, key: str):
+        session = self._sessions.pop(key)
+        self.total_bytes -= session.size
+        self._update_gauges()
+
+    def _update_gauges(self):
+        sessions_active.set(len(self._sessions))
+        session_bytes.set(self.total_bytes)
+
+    def _resize(self, session: _Session, delta: int):
+        session.size += delta
+        self.total_bytes += delta
+
+    def history(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """Returns (summary, [(question, answer), ...] oldest first); empty for unknown sessions."""
+        session = self._get(key)
+        if session is None:
+            return "", []
+        return session.summary, [(turn.question, turn.answer) for turn in session.turns]
+
+    def append(self, key: str, question: str, answer: str) -> bool:
+        """
+        Records a turn. Returns True when turns are waiting to be summarized and no
+        summary is in progress; the caller should then run the summarization.
+        """
+        if self.max_sessions <= 0 or self.max_turns <= 0:
+            return False
+        session = self._get(key)
+        if session is None:
+            session = self._sessions[key] = _Session()
+        self._sessions.move_to_end(key)
+        session.last_seen = time.monotonic()
+
+        self.total_bytes += self._add_turn(session, question, answer)
+        while len(self._sessions) > self.max_sessions:
+            self._remove(next(iter(self._sessions)))
+            self.evictions += 1
+        self._update_gauges()
+        return self._start_summary(session)
+
+    def _add_turn(self, session: _Session, question: str, answer: str) -> int:
+        """Appends a turn and applies the turn and byte caps; returns the change in the session's size."""
+        before = session.size
+        turn = _Turn(question, answer[:SESSION_MAX_ANSWER_CHARS])
+        session.turns.append(turn)
+        session.size += turn.size
+        # The verbatim turns get whatever the summary leaves of the byte cap
+        budget = self.max_bytes - _size(session.summary)
+        while session.turns and (
+            len(session.turns) > self.max_turns or sum(t.size for t in session.turns) > budget
+        ):
+            evicted = session.turns.popleft()
+            if self.summaries:
+                session.pending.append(evicted)
+            else:
+                session.size -= evicted.size
+                self.turns_dropped += 1
+        # Summaries and queued turns share the same cap; the oldest queued turns go first
+        while session.pending and session.size > self.max_bytes:
+            session.size -= session.pending.pop(0).size
+            self.turns_dropped += 1
+        return session.size - before
+
+    @staticmethod
+    def _start_summary(session: _Session) -> bool:
+        if session.pending and not session.summarizing:
+            session.summarizing = True
+            return True
+        return False
+
+    def take_pending(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        Returns (summary, turns to fold into it) and removes those turns from the queue.
+        An empty list means the summarization is finished.
+        """
+        session = self._sessions.get(key)
+        if session is None:
+            return "", []
+        if not session.pending:
+            session.summarizing = False
+            return session.summary, []
+        turns, session.pending = session.pending, []
+        self._resize(session, -sum(turn.size for turn in turns))
+        self._update_gauges()
+        return session.summary, [(turn.question, turn.answer) for turn in turns]
+
+    def defer_summary(self, key: str):
+        """Ends a summarization without taking its turns; the next recorded turn starts it again."""
+        session = self._sessions.get(key)
+        if session is not None:
+            session.summarizing = False
+
+    def set_summary(self, key: str, summary: str):
+        session = self._sessions.get(key)
+        if session is None:
+            return
+        summary = summary[:SESSION_SUMMARY_MAX_CHARS]
+        self._resize(session, _size(summary) - _size(session.summary))
+        session.summary = summary
+        self._update_gauges()
+
+    def clear(self):
+        self._sessions.clear()
+        self.total_bytes = 0
+        self._update_gauges()
+
+    def stats(self) -> dict:
+        sizes = [session.size for session in self._sessions.values()]
+        return {
+            "enabled": SESSIONS_ENABLED,
+            "store": "memory",
+            "sessions": len(self._sessions),
+            "bytes": self.total_bytes,
+            "max_session_bytes": max(sizes) if sizes else 0,
+            "mean_session_bytes": round(sum(sizes) / len(sizes), 1) if sizes else 0.0,
+            "byte_cap_per_session": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "turns_dropped": self.turns_dropped,
+            "summaries": self.summaries,
+        }
+
+    # Entry points for async handlers. The in-memory store answers inline; the SQLite
+    # store below runs them in a thread so waiting for its file lock never blocks the loop.
+
+    async def ahistory(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        return self.history(key)
+
+    async def aappend(self, key: str, question: str, answer: str) -> bool:
+        return self.append(key, question, answer)
+
+    async def atake_pending(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        return self.take_pending(key)
+
+    async def adefer_summary(self, key: str):
+        self.defer_summary(key)
+
+    async def aset_summary(self, key: str, summary: str):
+        self.set_summary(key, summary)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SessionStore kept in a SQLite file (WAL mode) that every worker on the host opens,
+    so a conversation continues whichever worker a follow-up is routed to. Each
+    session is one row with its turns as JSON; a turn is recorded in one write
+    transaction, so concurrent workers never lose each other's turns. The same
+    turn, byte, session-count and idle limits apply. The session count and total
+    bytes are kept in a one-row table updated in the same transactions, so the
+    gauges never scan the sessions. The a* methods run in a thread, since a write
+    can wait up to `timeout` seconds for another worker's transaction.
+    """
+
+    def __init__(self, path: str = SESSION_STORE_PATH, timeout: float = 10, **limits):
+        super().__init__(**limits)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Conversation context is not worth an fsync per turn; WAL keeps the file consistent
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_seen REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        # Covers expiry and LRU eviction without reading the session data
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen, size)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_totals ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), sessions INTEGER NOT NULL, bytes INTEGER NOT NULL)"
+        )
+        with self._transaction():
+            # Counted once for a file created before the totals table existed
+            self._conn.execute(
+                "INSERT OR IGNORE INTO session_totals (id, sessions, bytes) "
+                "SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM sessions"
+            )
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _load(self, key: str) -> Tuple[Optional[_Session], int]:
+        """The live session (None if missing or expired) and the size of its row (0 if none)."""
+        row = self._conn.execute("SELECT data, last_seen, size FROM sessions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None, 0
+        if time.time() - row[1] > self.ttl:
+            return None, row[2]
+        return _Session.from_json(row[0]), row[2]
+
+    def _save(self, key: str, session: _Session, touch: bool = True):
+        if touch:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, size, last_seen, data) VALUES (?, ?, ?, ?)",
+                (key, session.size, time.time(), session.to_json()),
+            )
+        else:
+            self._conn.execute("UPDATE sessions SET data = ?, size = ? WHERE key = ?",
+                               (session.to_json(), session.size, key))
+
+    def _delete(self, where: str, *params) -> int:
+        """Deletes the matching sessions and takes them off the totals; returns how many there were."""
+        sizes = self._conn.execute(f"DELETE FROM sessions WHERE {where} RETURNING size", params).fetchall()
+        if sizes:
+            self._add_to_totals(-len(sizes), -sum(size for (size,) in sizes))
+        return len(sizes)
+
+    def _add_to_totals(self, sessions: int, size: int):
+        self._conn.execute("UPDATE session_totals SET sessions = sessions + ?, bytes = bytes + ? WHERE id = 0",
+                           (sessions, size))
+
+    def _totals(self) -> Tuple[int, int]:
+        return self._conn.execute("SELECT sessions, bytes FROM session_totals WHERE id = 0").fetchone()
+
+    def _update_gauges(self):
+        count, total = self._totals()
+        self.total_bytes = total
+        sessions_active.set(count)
+        session_bytes.set(total)
+        return count
+
+    def history(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        with self._lock:
+            session, _ = self._load(key)
+        if session is None:
+            return "", []
+        return session.summary, [(turn.question, turn.answer) for turn in session.turns]
+
+    def append(self, key: str, question: str, answer: str) -> bool:
+        if self.max_sessions <= 0 or self.max_turns <= 0:
+            return False
+        with self._lock:
+            with self._transaction():
+                session, stored_size = self._load(key)
+                exists = session is not None or stored_size > 0
+                session = session or _Session()
+                self._add_turn(session, question, answer)
+                start_summary = self._start_summary(session)
+                self._save(key, session)
+                self._add_to_totals(0 if exists else 1, session.size - stored_size)
+                self.expirations += self._delete("last_seen < ?", time.time() - self.ttl)
+                excess = self._totals()[0] - self.max_sessions
+                if excess > 0:
+                    self.evictions += self._delete(
+                        "key IN (SELECT key FROM sessions INDEXED BY sessions_last_seen ORDER BY last_seen LIMIT ?)",
+                        excess,
+                    )
+            self._update_gauges()
+        return start_summary
+
+    def take_pending(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        with self._lock:
+            with self._transaction():
+                session, _ = self._load(key)
+                turns = []
+                if session is not None:
+                    turns, session.pending = session.pending, []
+                    session.summarizing = bool(turns)
+                    removed = sum(turn.size for turn in turns)
+                    session.size -= removed
+                    self._save(key, session, touch=False)
+                    self._add_to_totals(0, -removed)
+        if session is None:
+            return "", []
+        return session.summary, [(turn.question, turn.answer) for turn in turns]
+
+    def defer_summary(self, key: str):
+        with self._lock:
+            with self._transaction():
+                session, _ = self._load(key)
+                if session is not None and session.summarizing:
+                    session.summarizing = False
+                    self._save(key, session, touch=False)
+
+    def set_summary(self, key: str, summary: str):
+        with self._lock:
+            with self._transaction():
+                session, _ = self._load(key)
+                if session is not None:
+                    summary = summary[:SESSION_SUMMARY_MAX_CHARS]
+                    delta = _size(summary) - _size(session.summary)
+                    session.size += delta
+                    session.summary = summary
+                    self._save(key, session, touch=False)
+                    self._add_to_totals(0, delta)
+
+    def clear(self):
+        with self._lock:
+            with self._transaction():
+                self._conn.execute("DELETE FROM sessions")
+                self._conn.execute("UPDATE session_totals SET sessions = 0, bytes = 0 WHERE id = 0")
+            self._update_gauges()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = self._update_gauges()
+            # Only /health asks for the largest session; the index holds every size
+            largest = self._conn.execute(
+                "SELECT COALESCE(MAX(size), 0) FROM sessions INDEXED BY sessions_last_seen"
+            ).fetchone()[0]
+        return {
+            "enabled": SESSIONS_ENABLED,
+            "store": "sqlite",
+            "path": self.path,
+            "sessions": count,
+            "bytes": self.total_bytes,
+            "max_session_bytes": largest,
+            "mean_session_bytes": round(self.total_bytes / count, 1) if count else 0.0,
+            "byte_cap_per_session": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "turns_dropped": self.turns_dropped,
+            "summaries": self.summaries,
+        }
+
+    async def ahistory(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        return await asyncio.to_thread(self.history, key)
+
+    async def aappend(self, key: str, question: str, answer: str) -> bool:
+        return await asyncio.to_thread(self.append, key, question, answer)
+
+    async def atake_pending(self, key: str) -> Tuple[str, List[Tuple[str, str]]]:
+        return await asyncio.to_thread(self.take_pending, key)
+
+    async def adefer_summary(self, key: str):
+        await asyncio.to_thread(self.defer_summary, key)
+
+    async def aset_summary(self, key: str, summary: str):
+        await asyncio.to_thread(self.set_summary, key, summary)
+
+
+def create_session_store() -> SessionStore:
+    """The shared SQLite store when SESSION_STORE_PATH is set, otherwise an in-memory one."""
+    return SQLiteSessionStore(SESSION_STORE_PATH) if SESSION_STORE_PATH and SESSIONS_ENABLED else SessionStore()
+
+
+# --- CONDENSATION AND SUMMARIES ---
+
+
+def format_turns(turns: List[Tuple[str, str]]) -> str:
+    return "\n".join(f"Student: {question}\nAssistant: {answer}" for question, answer in turns)
+
+
+def should_condense(question: str, turns: List[Tuple[str, str]], summary: str = "") -> bool:
+    """
+    Whether a question needs rewriting before retrieval. In "auto" mode only short
+    questions or ones that refer back ("it", "that course", "more") are condensed,
+    so self-contained questions skip the extra LLM call.
+    """
+    if SESSION_CONDENSE == "off" or not (turns or summary):
+        return False
+    if SESSION_CONDENSE == "always":
+        return True
+    return len(question.split()) <= 4 or bool(_REFERENCES.search(question))
+
+
+async def condense_question(llm, question: str, turns: List[Tuple[str, str]], summary: str = "") -> str:
+    """Rewrites a follow-up into a standalone question; returns the original if the LLM reply is unusable."""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    chain = ChatPromptTemplate.from_template(CONDENSE_TEMPLATE) | llm | StrOutputParser()
+    reply = await chain.ainvoke({"summary": summary or "(none)", "history": format_turns(turns), "question": question})
+    lines = [line.strip().strip('"') for line in reply.strip().splitlines() if line.strip()]
+    if not lines or len(lines[0]) > 4 * len(question) + 200:
+        return question
+    return lines[0]
+
+
+async def summarize_turns(llm, summary: str, turns: List[Tuple[str, str]]) -> str:
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    chain = ChatPromptTemplate.from_template(SUMMARY_TEMPLATE) | llm | StrOutputParser()
+    reply = await chain.ainvoke({
+        "summary": summary or "(none)",
+        "history": format_turns(turns),
+        "max_chars": SESSION_SUMMARY_MAX_CHARS,
+    })
+    return reply.strip()
+
+
+# Session store for the API process (shared with the other workers on the host by default)
+session_store = create_session_store()
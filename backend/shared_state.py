@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, which is fine for a single worker
+    fcntl = None
+
+logger = logging.getLogger("collegegpt.shared_state")
+
+# --- CONFIGURATION ---
+# Directory shared by all workers on the host (generation counter, locks, job status)
+SHARED_STATE_DIR = os.getenv("SHARED_STATE_DIR", ".cache/shared_state")
+# How often each worker checks whether another process published new data
+SHARED_STATE_POLL_SECONDS = float(os.getenv("SHARED_STATE_POLL_SECONDS", "2"))
+
+GENERATION_FILE = "generation.json"
+
+
+def _write_json(path: str, data: dict):
+    """Writes `data` to a temporary file and renames it over `path`, so readers never see a partial file."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class ProcessLock:
+    """An exclusive flock() on a file, held until release() or until the process exits."""
+
+    def __init__(self, path: str, handle):
+        self.path = path
+        self._handle = handle
+
+    def release(self):
+        if self._handle is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+        self._handle.close()
+        self._handle = None
+
+
+class SharedState:
+    """
+    Coordinates the API workers (and the ingestion CLI) on one host through small
+    files in `directory`, so no extra service is needed:
+
+    - a generation counter, bumped after the documents or indexes change; every
+      worker polls it and rebuilds its retriever and clears its caches when it moves
+    - named locks (flock), so a data refresh runs in one process at a time
+    - job snapshots, so any worker can report the status of a refresh another
+      worker is running
+
+    The kernel releases a lock when its holder dies, so a crashed worker never
+    leaves a refresh locked.
+    """
+
+    def __init__(self, directory: str = SHARED_STATE_DIR):
+        self.directory = directory
+        self._generation_path = os.path.join(directory, GENERATION_FILE)
+        self._jobs_directory = os.path.join(directory, "jobs")
+        # Generation this process's state was built from
+        self.seen_generation = 0
+        self.reloads = 0
+
+    def _ensure_directories(self):
+        os.makedirs(self._jobs_directory, exist_ok=True)
+
+    # --- GENERATION COUNTER ---
+
+    def generation(self) -> int:
+        data = _read_json(self._generation_path)
+        return int(data["generation"]) if data else 0
+
+    def bump(self, reason: str) -> int:
+        """Increments the generation, telling every other worker to reload; returns the new value."""
+        self._ensure_directories()
+        lock = self.acquire("generation", blocking=True)
+        try:
+            generation = self.generation() + 1
+            _write_json(self._generation_path, {
+                "generation": generation,
+                "reason": reason,
+                "pid": os.getpid(),
+                "updated_at": time.time(),
+            })
+        finally:
+            lock.release()
+        # This process already has the new state
+        self.seen_generation = generation
+        logger.info("Published state generation %s (%s)", generation, reason)
+        return generation
+
+    def changed(self) -> Optional[int]:
+        """Returns the new generation if another process bumped it since it was last seen, else None."""
+        generation = self.generation()
+        return generation if generation != self.seen_generation else None
+
+    # --- LOCKS ---
+
+    def acquire(self, name: str, blocking: bool = False) -> Optional[ProcessLock]:
+        """Takes the named lock; returns None if it is held elsewhere and `blocking` is False."""
+        self._ensure_directories()
+        path = os.path.join(self.directory, f"{name}.lock")
+        handle = open(path, "a+")
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                handle.close()
+                return None
+        return ProcessLock(path, handle)
+
+    # --- JOBS ---
+
+    def publish_job(self, job: dict):
+        self._ensure_directories()
+        _write_json(os.path.join(self._jobs_directory, f"{job['job_id']}.json"), dict(job, pid=os.getpid()))
+
+    def load_job(self, job_id: str) -> Optional[dict]:
+        # Job IDs are hex UUIDs; anything else cannot name a job file
+        if not job_id.isalnum():
+            return None
+        return _read_json(os.path.join(self._jobs_directory, f"{job_id}.json"))
+
+    def set_owner(self, kind: str, job_id: Optional[str]):
+        """Records which job holds the `kind` lock, for workers that find it taken (None: not an API job)."""
+        self._ensure_directories()
+        _write_json(os.path.join(self.directory, f"{kind}.owner.json"), {"job_id": job_id, "pid": os.getpid()})
+
+    def owner(self, kind: str) -> Optional[str]:
+        data = _read_json(os.path.join(self.directory, f"{kind}.owner.json"))
+        return data.get("job_id") if data else None
+
+    def prune_jobs(self, max_age_seconds: float = 7 * 24 * 3600):
+        """Deletes job snapshots older than `max_age_seconds`."""
+        if not os.path.isdir(self._jobs_directory):
+            return
+        cutoff = time.time() - max_age_seconds
+        for name in os.listdir(self._jobs_directory):
+            path = os.path.join(self._jobs_directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "generation": self.generation(),
+            "seen_generation": self.seen_generation,
+            "reloads": self.reloads,
+            "cross_process_locks": fcntl is not None,
+        }
+
+
+# Shared coordinator for the process
+shared_state = SharedState()
@@ -7,5 +7,5 @@ echo "Python version: $(python --version)"
 # Install dependencies
 pip install -r requirements.txt
 
-# Start the application
-uvicorn main:app --host 0.0.0.0 --port $PORT
+# Start the application (WEB_CONCURRENCY worker processes, see gunicorn.conf.py)
+exec gunicorn -c gunicorn.conf.py main:app
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from concurrency import StageTimeout, run_stage
+from metrics import langchain_config
+
+# --- STREAMING CHAT ---
+# The streaming endpoint runs the same two stages as the regular RAG chain
+# (retrieve, then prompt | llm | parser) but yields frames as soon as they are
+# available. Only `ainvoke`/`astream` are used on the retriever and answer
+# chain, so any LangChain runnable (including fakes) can be plugged in.
+
+
+def describe_sources(docs: List) -> List[dict]:
+    """Returns a compact, JSON-serialisable description of the retrieved documents."""
+    sources = []
+    for doc in docs:
+        metadata = getattr(doc, "metadata", None) or {}
+        sources.append({
+            "source": metadata.get("source"),
+            "page": metadata.get("page"),
+            "snippet": doc.page_content[:200],
+        })
+    return sources
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+async def stream_chat_events(
+    retriever,
+    answer_chain,
+    question: str,
+    retrieval_query: Optional[str] = None,
+    retrieval_timeout: Optional[float] = None,
+    generation_timeout: Optional[float] = None,
+    on_complete: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> AsyncIterator[dict]:
+    """
+    Yields chat frames in order: one "sources" frame with the retrieved documents,
+    one "token" frame per generated chunk and a final "done" frame with timings.
+    If a stage fails or exceeds its timeout an "error" frame is yielded instead
+    of the remaining frames. `on_complete` is awaited with the full answer after the
+    last token, e.g. to populate the answer cache.
+    """
+    started = time.perf_counter()
+    timings = {}
+
+    try:
+        docs = await run_stage("retrieval", retriever.ainvoke(retrieval_query or question, config=langchain_config()), retrieval_timeout)
+    except Exception as e:
+        yield {"type": "error", "stage": "retrieval", "error": f"An error occurred: {e}"}
+        return
+    timings["retrieval_ms"] = _elapsed_ms(started)
+    yield {"type": "sources", "sources": describe_sources(docs)}
+
+    generation_started = time.perf_counter()
+    answer_parts = []
+    chunk_count = 0
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + generation_timeout if generation_timeout is not None else None
+    stream = answer_chain.astream({"context": docs, "question": question}, config=langchain_config()).__aiter__()
+    try:
+        while True:
+            remaining = max(deadline - loop.time(), 0) if deadline is not None else None
+            try:
+                chunk = await run_stage("generation", stream.__anext__(), remaining)
+            except StopAsyncIteration:
+                break
+            if not chunk:
+                continue
+            if chunk_count == 0:
+                timings["first_token_ms"] = _elapsed_ms(started)
+            chunk_count += 1
+            answer_parts.append(chunk)
+            yield {"type": "token", "text": chunk}
+    except StageTimeout as e:
+        yield {"type": "error", "stage": e.stage, "error": f"An error occurred: {e}"}
+        return
+    except Exception as e:
+        yield {"type": "error", "stage": "generation", "error": f"An error occurred: {e}"}
+        return
+    finally:
+        # Ends the upstream LLM request however the loop exits, including a client disconnecting
+        await stream.aclose()
+
+    timings["generation_ms"] = _elapsed_ms(generation_started)
+    timings["total_ms"] = _elapsed_ms(started)
+    answer = "".join(answer_parts)
+    if on_complete and answer:
+        await on_complete(answer)
+    yield {
+        "type": "done",
+        "chunks": chunk_count,
+        "answer_chars": len(answer),
+        "documents": len(docs),
+        "timings": timings,
+    }
+
+
+async def cached_answer_events(answer: str) -> AsyncIterator[dict]:
+    """Yields the same frame sequence as stream_chat_events for an answer served from cache."""
+    yield {"type": "sources", "sources": []}
+    yield {"type": "token", "text": answer}
+    yield {
+        "type": "done",
+        "chunks": 1,
+        "answer_chars": len(answer),
+        "documents": 0,
+        "cached": True,
+        "timings": {"retrieval_ms": 0.0, "first_token_ms": 0.0, "generation_ms": 0.0, "total_ms": 0.0},
+    }
+
+
+async def ndjson_stream(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Encodes chat frames as newline-delimited JSON for a StreamingResponse."""
+    async for event in events:
+        yield (json.dumps(event) + "\n").encode("utf-8")
@@ -0,0 +1,49 @@
+"""
+Shared fixtures: the real FastAPI app with the offline fakes from benchmarks/fakes.py
+(stubbed Gemini, retriever and embeddings, no Astra DB), and hermetic state directories.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+sys.path.insert(0, BACKEND_DIR)
+
+# Set before anything imports main, so no test touches the developer's caches or indexes
+_STATE_DIR = tempfile.mkdtemp(prefix="collegegpt-tests-")
+os.environ["SHARED_STATE_DIR"] = os.path.join(_STATE_DIR, "shared_state")
+os.environ["SESSION_STORE_PATH"] = ""
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["LOCAL_INDEX_DIR"] = os.path.join(_STATE_DIR, "local_index")
+os.environ["LEXICAL_INDEX_DIR"] = os.path.join(_STATE_DIR, "lexical_index")
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["INSERT_DEAD_LETTER_PATH"] = os.path.join(_STATE_DIR, "dead_letter.jsonl")
+# clerk_auth builds its module-level ClerkAuth on import; production mode needs a Clerk key
+os.environ.setdefault("ENVIRONMENT", "development")
+
+from fakes import FakeRetriever, ScriptedChatModel, load_app, make_corpus  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    retriever = FakeRetriever(documents=make_corpus(), latency=0.0)
+    return load_app(retriever, ScriptedChatModel(first_token_latency=0.0, token_latency=0.0))
+
+
+@pytest.fixture
+def main_module(app):
+    import main
+
+    main.answer_cache.clear()
+    return main
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    # Not used as a context manager, so the startup hooks (Astra DB, shared-state watcher) do not run
+    return TestClient(app)
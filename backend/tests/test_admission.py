@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from concurrency import AdmissionController, Overloaded
+
+
+def saturated_controller():
+    """A controller with one slot, already taken, and no queue."""
+    controller = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=0.05)
+    asyncio.run(controller.acquire())
+    return controller
+
+
+def test_rejects_at_once_when_slots_and_queue_are_full():
+    controller = saturated_controller()
+
+    with pytest.raises(Overloaded) as raised:
+        controller.check()
+
+    assert raised.value.retry_after >= 1
+    assert controller.stats()["rejected"] == 1
+
+
+def test_queued_request_is_rejected_after_the_queue_timeout():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        await controller.acquire()
+        with pytest.raises(Overloaded):
+            await controller.acquire()
+        controller.release()
+        async with controller.slot():
+            assert controller.in_flight == 1
+        return controller
+
+    controller = asyncio.run(scenario())
+
+    assert controller.stats()["in_flight"] == 0
+    assert controller.stats()["queued"] == 0
+    assert controller.admitted == 2
+    assert controller.rejected == 1
+
+
+def test_chat_answers_429_with_retry_after_when_saturated(client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "chat_limiter", saturated_controller())
+
+    response = client.post("/api/chat", json={"question": "When do exams start?"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_stream_answers_429_before_streaming_when_saturated(client, main_module, monkeypatch):
+    monkeypatch.setattr(main_module, "chat_limiter", saturated_controller())
+
+    response = client.post("/api/chat/stream", json={"question": "When do exams start?"})
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,66 @@
+import time
+
+from answer_cache import AnswerCache
+
+
+def test_exact_hit_ignores_case_whitespace_and_punctuation():
+    cache = AnswerCache(max_entries=8, ttl=60, threshold=0)
+    cache.put("", "When is the library open?", "8 AM to 10 PM")
+
+    assert cache.get_exact("", "  when is the LIBRARY   open ") == "8 AM to 10 PM"
+    assert cache.get_exact("", "When is the canteen open?") is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_namespaces_are_separate():
+    cache = AnswerCache(max_entries=8, ttl=60, threshold=0)
+    cache.put("User: Asha\n", "What is my fee?", "Hello Asha, ...")
+
+    assert cache.get_exact("", "What is my fee?") is None
+    assert cache.get_exact("User: Asha\n", "What is my fee?") == "Hello Asha, ..."
+
+
+def test_semantic_hit_above_the_threshold_only():
+    cache = AnswerCache(max_entries=8, ttl=60, threshold=0.95)
+    cache.put("", "library hours", "8 AM to 10 PM", embedding=[1.0, 0.0, 0.0])
+
+    assert cache.get_semantic("", [0.99, 0.05, 0.0]) == "8 AM to 10 PM"
+    assert cache.get_semantic("", [0.0, 1.0, 0.0]) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_clear_invalidates_every_entry():
+    cache = AnswerCache(max_entries=8, ttl=60, threshold=0.9)
+    cache.put("", "library hours", "8 AM to 10 PM", embedding=[1.0, 0.0])
+
+    cache.clear()
+
+    assert cache.get_exact("", "library hours") is None
+    assert cache.get_semantic("", [1.0, 0.0]) is None
+    assert cache.stats()["invalidations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_and_evicted_entries_miss():
+    cache = AnswerCache(max_entries=2, ttl=0.01, threshold=0)
+    cache.put("", "a", "1")
+    time.sleep(0.02)
+    assert cache.get_exact("", "a") is None
+
+    cache.ttl = 60
+    for question in ("a", "b", "c"):
+        cache.put("", question, question.upper())
+    assert cache.get_exact("", "a") is None
+    assert cache.get_exact("", "c") == "C"
+
+
+def test_chat_serves_a_repeated_question_from_the_cache(client, main_module):
+    first = client.post("/api/chat", json={"question": "What courses are offered?"}).json()
+    second = client.post("/api/chat", json={"question": "what courses are offered"}).json()
+
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["answer"] == first["answer"]
+
+    main_module.answer_cache.clear()
+    assert client.post("/api/chat", json={"question": "What courses are offered?"}).json()["cached"] is False
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+import batch_writer
+from batch_writer import BatchWriter
+from fakes import InMemoryVectorStore, make_corpus
+
+
+class RejectingStore(InMemoryVectorStore):
+    """Rejects any batch holding one of `poison`, and fails the first `transient` requests with a connection error."""
+
+    def __init__(self, poison=(), transient=0):
+        super().__init__()
+        self.poison = set(poison)
+        self.transient = transient
+        self.requests = 0
+
+    def add_documents(self, documents, ids=None):
+        self.requests += 1
+        if self.requests <= self.transient:
+            raise ConnectionError("connection reset by peer")
+        bad = [doc_id for doc_id in ids if doc_id in self.poison]
+        if bad:
+            raise ValueError(f"invalid document {bad[0]}")
+        return super().add_documents(documents, ids=ids)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(batch_writer, "backoff_delay", lambda attempt: 0.0)
+
+
+def corpus(size):
+    documents = make_corpus(size)
+    return documents, [f"chunk-{i}" for i in range(size)]
+
+
+def test_failing_batches_are_bisected_down_to_the_bad_documents(tmp_path, caplog):
+    documents, ids = corpus(40)
+    store = RejectingStore(poison={"chunk-7", "chunk-30"})
+    dead_letter_path = tmp_path / "dead_letter.jsonl"
+    writer = BatchWriter(store.add_documents, batch_size=16, concurrency=2, retries=2,
+                         dead_letter_path=str(dead_letter_path))
+
+    failed = writer.write_all(documents, ids)
+
+    assert sorted(failed) == [7, 30]
+    assert set(store.documents) == set(ids) - {"chunk-7", "chunk-30"}
+    assert writer.written == 38
+    assert writer.dead_lettered == 2
+    assert writer.splits > 0
+
+    records = [json.loads(line) for line in dead_letter_path.read_text().splitlines()]
+    assert sorted(record["id"] for record in records) == ["chunk-30", "chunk-7"]
+    assert records[0]["page_content"] == documents[int(records[0]["id"].split("-")[1])].page_content
+    assert records[0]["metadata"]["source"].startswith("doc_")
+    assert records[0]["error"].startswith("ValueError: invalid document")
+    logged = [record for record in caplog.records if record.name == "collegegpt.batch_writer"]
+    assert sorted(record.chunk_id for record in logged) == ["chunk-30", "chunk-7"]
+
+
+def test_transient_errors_are_retried_without_dead_lettering(tmp_path):
+    documents, ids = corpus(10)
+    store = RejectingStore(transient=2)
+    writer = BatchWriter(store.add_documents, batch_size=10, concurrency=1, retries=3,
+                         dead_letter_path=str(tmp_path / "dead_letter.jsonl"))
+
+    assert writer.write_all(documents, ids) == {}
+
+    assert set(store.documents) == set(ids)
+    assert writer.retried == 2
+    assert writer.splits == 0
+    assert not (tmp_path / "dead_letter.jsonl").exists()
@@ -0,0 +1,143 @@
+import asyncio
+
+import jwt
+import pytest
+
+from clerk_auth import JWKSCache, VerifiedTokenCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def key_set(*kids):
+    return {"keys": [{"kty": "oct", "kid": kid, "k": "c2VjcmV0"} for kid in kids]}
+
+
+class FakeFetcher:
+    """Serves the key sets it is given, the last one repeatedly; an exception instance is raised instead."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.urls = []
+
+    async def __call__(self, url):
+        self.urls.append(url)
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def make_cache(fetcher, clock):
+    return JWKSCache(url="https://example.test/jwks", ttl=100, min_refresh_interval=30, fetcher=fetcher, clock=clock)
+
+
+def test_keys_are_fetched_once_within_the_ttl():
+    clock = FakeClock()
+    fetcher = FakeFetcher(key_set("k1"))
+    cache = make_cache(fetcher, clock)
+
+    async def scenario():
+        first = await cache.get_key("k1")
+        clock.now += 74
+        second = await cache.get_key("k1")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first.key_id == second.key_id == "k1"
+    assert fetcher.urls == ["https://example.test/jwks"]
+
+
+def test_keys_are_refreshed_in_the_background_before_the_ttl():
+    clock = FakeClock()
+    fetcher = FakeFetcher(key_set("k1"), key_set("k1", "k2"))
+    cache = make_cache(fetcher, clock)
+
+    async def scenario():
+        await cache.get_key("k1")
+        clock.now += 80
+        # Served from the cache while the refresh runs
+        key = await cache.get_key("k1")
+        await cache._background_refresh
+        return key
+
+    assert asyncio.run(scenario()).key_id == "k1"
+    assert cache.fetch_count == 2
+    assert set(cache.keys) == {"k1", "k2"}
+
+
+def test_expired_keys_are_refetched_and_kept_when_the_refetch_fails():
+    clock = FakeClock()
+    fetcher = FakeFetcher(key_set("k1"), key_set("k2"), RuntimeError("Clerk is down"))
+    cache = make_cache(fetcher, clock)
+
+    async def scenario():
+        await cache.get_key("k1")
+        clock.now += 101
+        rotated = await cache.get_key("k2")
+        clock.now += 101
+        stale = await cache.get_key("k2")
+        return rotated, stale
+
+    rotated, stale = asyncio.run(scenario())
+
+    assert rotated.key_id == stale.key_id == "k2"
+    assert cache.fetch_count == 3
+
+
+def test_unknown_kid_refetches_at_most_once_per_interval():
+    clock = FakeClock()
+    fetcher = FakeFetcher(key_set("k1"), key_set("k1"), key_set("k1", "k2"))
+    cache = make_cache(fetcher, clock)
+
+    async def scenario():
+        await cache.get_key("k1")
+        # The first fetch counts as an attempt too
+        clock.now += 30
+        for _ in range(3):
+            with pytest.raises(jwt.InvalidTokenError):
+                await cache.get_key("k2")
+        after_first_refetch = cache.fetch_count
+        clock.now += 30
+        key = await cache.get_key("k2")
+        return after_first_refetch, key
+
+    after_first_refetch, key = asyncio.run(scenario())
+
+    # Three tokens with an unknown kid cost a single refetch until the interval has passed
+    assert after_first_refetch == 2
+    assert key.key_id == "k2"
+    assert cache.fetch_count == 3
+
+
+def test_verified_token_is_evicted_at_exp():
+    clock = FakeClock()
+    cache = VerifiedTokenCache(max_size=8, clock=clock)
+    cache.put("token", {"sub": "u1", "exp": clock.now + 60})
+
+    clock.now += 59
+    assert cache.get("token") == {"sub": "u1", "exp": 1060.0}
+
+    clock.now += 1
+    assert cache.get("token") is None
+    assert cache._entries == {}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_token_is_evicted_at_the_size_cap():
+    clock = FakeClock()
+    cache = VerifiedTokenCache(max_size=2, clock=clock)
+    cache.put("a", {"sub": "a"})
+    cache.put("b", {"sub": "b"})
+    cache.get("a")
+    cache.put("c", {"sub": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"sub": "a"}
+    assert cache.get("c") == {"sub": "c"}
@@ -0,0 +1,74 @@
+import pytest
+from langchain_core.documents import Document
+
+from context import assemble_context
+
+
+def chunk(text, source="a.txt", **metadata):
+    return Document(page_content=text, metadata={"source": source, **metadata})
+
+
+FEE = "The hostel fee is due in July. Late payment adds a fine of 500 rupees."
+REFUND = "Late payment adds a fine of 500 rupees. Refunds take two weeks."
+LONG = "Admission requires a completed form, two photographs and the fee receipt."
+
+
+@pytest.mark.parametrize("docs, budget, expected", [
+    pytest.param(
+        [chunk(FEE), chunk(FEE), chunk("The  hostel fee is due\nin July.  Late payment adds a fine of 500 rupees.")],
+        0,
+        f"[1] a.txt\n{FEE}",
+        id="exact and whitespace-only duplicates",
+    ),
+    pytest.param(
+        [chunk(FEE), chunk("Late payment adds a fine", source="b.txt")],
+        0,
+        f"[1] a.txt\n{FEE}",
+        id="chunk contained in a better one",
+    ),
+    pytest.param(
+        [chunk(REFUND, chunk_index=4), chunk(FEE, chunk_index=3)],
+        0,
+        "[1] a.txt\nThe hostel fee is due in July. Late payment adds a fine of 500 rupees. Refunds take two weeks.",
+        id="overlapping chunks stitched in document order",
+    ),
+    pytest.param(
+        [chunk("Admissions open in May.", chunk_index=0, page=0), chunk("Apply online by June.", chunk_index=1, page=1)],
+        0,
+        "[1] a.txt, pp. 1-2\nAdmissions open in May. Apply online by June.",
+        id="adjacent chunks joined across pages",
+    ),
+    pytest.param(
+        [chunk("Admissions open in May.", chunk_index=0), chunk("Apply online by June.", chunk_index=5)],
+        0,
+        "[1] a.txt\nAdmissions open in May.\n\n[2] a.txt\nApply online by June.",
+        id="distant chunks of one source kept apart",
+    ),
+    pytest.param(
+        [chunk(FEE, source="a.txt", chunk_index=3), chunk(REFUND, source="b.txt", chunk_index=4)],
+        0,
+        f"[1] a.txt\n{FEE}\n\n[2] b.txt\n{REFUND}",
+        id="overlapping chunks of different sources kept apart",
+    ),
+    pytest.param(
+        [chunk(LONG, page=2)],
+        5,
+        f"[1] a.txt, p. 3\n{LONG}"[:20],
+        id="budget smaller than the first passage truncates it",
+    ),
+    pytest.param(
+        [chunk("x" * 40, source="a"), chunk("y" * 100, source="b"), chunk("z" * 20, source="c")],
+        30,
+        f"[1] a\n{'x' * 40}\n\n[3] c\n{'z' * 20}",
+        id="passage over the budget skipped for a shorter one",
+    ),
+    pytest.param(
+        [chunk("Lower ranked.", source="a", score=0.2), chunk("Higher ranked.", source="b", score=0.9)],
+        0,
+        "[1] b\nHigher ranked.\n\n[2] a\nLower ranked.",
+        id="ordered by score",
+    ),
+    pytest.param("Already formatted.", 5, "Already formatted.", id="string passed through"),
+])
+def test_assemble_context(docs, budget, expected):
+    assert assemble_context(docs, token_budget=budget) == expected
@@ -0,0 +1,211 @@
+import functools
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import ingest
+from fakes import InMemoryVectorStore, LocalBlobStore
+from ingest_pipeline import run_pipeline
+
+
+def text_blob(topic, paragraphs=4):
+    """A text file long enough to be split into several chunks."""
+    return "\n\n".join(f"{topic} paragraph {i}. " + f"Details about {topic} number {i}. " * 25 for i in range(paragraphs)).encode()
+
+
+class _Codec:
+    """The parts of the Astra DB document codec that rebuild_manifest uses."""
+
+    base_projection = {}
+
+    def decode(self, record):
+        return record[1]
+
+    def get_id(self, record):
+        return record[0]
+
+
+class CollectionStore(InMemoryVectorStore):
+    """InMemoryVectorStore that can also be scanned like an Astra DB collection, and rejects chunks containing `poison`."""
+
+    def __init__(self, poison=None):
+        super().__init__()
+        self.poison = poison
+        self.deleted = []
+        self.document_codec = _Codec()
+        self.astra_env = SimpleNamespace(collection=SimpleNamespace(find=lambda query, projection: list(self.documents.items())))
+
+    def add_documents(self, documents, ids=None):
+        if self.poison and any(self.poison in doc.page_content for doc in documents):
+            raise ValueError("document rejected")
+        return super().add_documents(documents, ids=ids)
+
+    def delete(self, ids=None):
+        self.deleted.extend(ids or [])
+        return super().delete(ids=ids)
+
+
+@pytest.fixture
+def container(monkeypatch):
+    store = LocalBlobStore([
+        ("library.txt", text_blob("library")),
+        ("hostel.txt", text_blob("hostel")),
+        ("fees.txt", text_blob("fees")),
+    ])
+    monkeypatch.setattr(ingest, "get_blob_service_client", lambda: store)
+    monkeypatch.setattr(ingest, "AZURE_STORAGE_CONNECTION_STRING", "local-blob-store")
+    # Parse in-thread: parser processes would only add start-up time here
+    monkeypatch.setattr(ingest, "run_pipeline", functools.partial(run_pipeline, parse_workers=0))
+    return store
+
+
+@pytest.fixture
+def manifest_path(tmp_path):
+    return str(tmp_path / "ingest_manifest.json")
+
+
+def sync(manifest_path, vstore, full=False):
+    return ingest.sync_from_azure(manifest_path=manifest_path, full=full, vstore=vstore)
+
+
+def chunk_ids(manifest_path, blob_name):
+    return ingest.load_manifest(manifest_path)["blobs"][blob_name]["chunk_ids"]
+
+
+def test_first_sync_stores_every_blob_with_deterministic_ids(container, manifest_path):
+    vstore = CollectionStore()
+
+    stats = sync(manifest_path, vstore)
+
+    assert stats["blobs_changed"] == 3
+    manifest = ingest.load_manifest(manifest_path)
+    assert set(vstore.documents) == {i for entry in manifest["blobs"].values() for i in entry["chunk_ids"]}
+    library = manifest["blobs"]["library.txt"]
+    assert library["content_hash"] == ingest.content_hash(container.files["library.txt"])
+    assert [vstore.documents[i].metadata["chunk_index"] for i in library["chunk_ids"]] == list(range(len(library["chunk_ids"])))
+
+
+def test_unchanged_blobs_are_skipped(container, manifest_path):
+    vstore = CollectionStore()
+    sync(manifest_path, vstore)
+    downloads = container.downloads
+
+    stats = sync(manifest_path, vstore)
+
+    assert stats["blobs_unchanged"] == 3
+    assert stats["blobs_changed"] == 0
+    assert stats["chunks_upserted"] == 0
+    assert container.downloads == downloads
+
+
+def test_changed_blob_replaces_its_chunks_and_deletes_the_old_ids(container, manifest_path):
+    vstore = CollectionStore()
+    sync(manifest_path, vstore)
+    old_ids = chunk_ids(manifest_path, "library.txt")
+
+    container.files["library.txt"] = text_blob("library opening hours", paragraphs=2)
+    stats = sync(manifest_path, vstore)
+
+    new_ids = chunk_ids(manifest_path, "library.txt")
+    assert stats["blobs_changed"] == 1
+    assert stats["blobs_unchanged"] == 2
+    assert set(old_ids).isdisjoint(new_ids)
+    assert set(vstore.deleted) == set(old_ids)
+    assert not set(old_ids) & set(vstore.documents)
+    assert set(new_ids) <= set(vstore.documents)
+
+
+def test_deleted_blob_removes_its_chunks(container, manifest_path):
+    vstore = CollectionStore()
+    sync(manifest_path, vstore)
+    hostel_ids = chunk_ids(manifest_path, "hostel.txt")
+
+    del container.files["hostel.txt"]
+    stats = sync(manifest_path, vstore)
+
+    assert stats["blobs_deleted"] == 1
+    assert stats["chunks_deleted"] == len(hostel_ids)
+    assert not set(hostel_ids) & set(vstore.documents)
+    assert "hostel.txt" not in ingest.load_manifest(manifest_path)["blobs"]
+
+
+def test_lost_manifest_is_rebuilt_from_the_collection(container, manifest_path, tmp_path):
+    vstore = CollectionStore()
+    sync(manifest_path, vstore)
+    with open(manifest_path) as f:
+        original = json.load(f)["blobs"]
+
+    # A redeploy wiped the disk; one blob changed and one was removed meanwhile
+    lost_path = str(tmp_path / "after-redeploy.json")
+    container.files["library.txt"] = text_blob("library opening hours", paragraphs=2)
+    del container.files["hostel.txt"]
+    stats = sync(lost_path, vstore)
+
+    assert stats["blobs_unchanged"] == 1  # fees.txt: downloaded, same hash, not re-embedded
+    assert stats["blobs_changed"] == 1
+    assert stats["blobs_deleted"] == 1
+    rebuilt = ingest.load_manifest(lost_path)["blobs"]
+    assert rebuilt["fees.txt"]["chunk_ids"] == original["fees.txt"]["chunk_ids"]
+    assert set(vstore.deleted) == set(original["library.txt"]["chunk_ids"]) | set(original["hostel.txt"]["chunk_ids"])
+    assert set(vstore.documents) == {i for entry in rebuilt.values() for i in entry["chunk_ids"]}
+
+
+def test_rebuild_manifest_groups_chunks_by_source_in_order(container, manifest_path):
+    vstore = CollectionStore()
+    sync(manifest_path, vstore)
+    # Chunks ingested before content hashes were stored
+    for document in vstore.documents.values():
+        if document.metadata["source"] == "fees.txt":
+            del document.metadata["content_hash"]
+
+    manifest = ingest.rebuild_manifest(vstore)
+
+    stored = ingest.load_manifest(manifest_path)["blobs"]
+    assert manifest["blobs"]["library.txt"]["chunk_ids"] == stored["library.txt"]["chunk_ids"]
+    assert manifest["blobs"]["library.txt"]["content_hash"] == stored["library.txt"]["content_hash"]
+    assert manifest["blobs"]["fees.txt"]["content_hash"] is None
+    assert manifest["blobs"]["fees.txt"]["etag"] is None
+
+
+def test_partly_written_blob_is_tracked_and_cleaned_up_on_retry(container, manifest_path):
+    vstore = CollectionStore(poison="POISON")
+    sync(manifest_path, vstore)
+    old_ids = chunk_ids(manifest_path, "library.txt")
+
+    # The new version has one chunk the store rejects; the rest are written
+    container.files["library.txt"] = text_blob("library hours", paragraphs=3) + b"\n\nPOISON"
+    stats = sync(manifest_path, vstore)
+
+    assert stats["blobs_failed"] == 1
+    assert stats["chunks_dead_lettered"] == 1
+    entry = ingest.load_manifest(manifest_path)["blobs"]["library.txt"]
+    assert entry["partial"] is True
+    assert entry["etag"] is None
+    written = set(vstore.documents) - {i for name in ("hostel.txt", "fees.txt") for i in chunk_ids(manifest_path, name)}
+    assert written - set(old_ids)
+    assert written <= set(entry["chunk_ids"])
+
+    # Once the blob is fixed, the retry keeps only the chunks of the new version
+    container.files["library.txt"] = text_blob("library hours", paragraphs=3)
+    stats = sync(manifest_path, vstore)
+
+    new_ids = chunk_ids(manifest_path, "library.txt")
+    assert stats["blobs_changed"] == 1
+    assert "partial" not in ingest.load_manifest(manifest_path)["blobs"]["library.txt"]
+    remaining = set(vstore.documents) - {i for name in ("hostel.txt", "fees.txt") for i in chunk_ids(manifest_path, name)}
+    assert remaining == set(new_ids)
+
+
+def test_partly_written_new_blob_is_removed_with_the_blob(container, manifest_path):
+    vstore = CollectionStore(poison="POISON")
+    container.files["broken.txt"] = text_blob("broken", paragraphs=3) + b"\n\nPOISON"
+    sync(manifest_path, vstore)
+    written = set(vstore.documents) & set(chunk_ids(manifest_path, "broken.txt"))
+    assert written
+
+    del container.files["broken.txt"]
+    sync(manifest_path, vstore)
+
+    assert not written & set(vstore.documents)
+    assert "broken.txt" not in ingest.load_manifest(manifest_path)["blobs"]
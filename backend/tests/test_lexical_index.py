@@ -0,0 +1,148 @@
+import json
+import os
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from lexical_index import INFO_FILE, HybridRetriever, LexicalIndex, StaleIndexError, tokenize
+
+COURSES = [
+    "CS 101 Introduction to Programming covers loops, functions and recursion.",
+    "EE 210 Circuit Analysis covers resistors, capacitors and op-amps.",
+    "The library opens at eight and closes at midnight during exams.",
+    "Hostel rooms are allotted by lottery at the start of the year.",
+    "The cafeteria serves breakfast, lunch and dinner every day.",
+    "Scholarships are awarded on merit and need.",
+]
+# Enough other chunks that a rare term has a realistic IDF
+NOTICES = [f"Notice {i}: the {office} office is open on weekdays." for i, office in enumerate(
+    ["admissions", "accounts", "examination", "placement", "sports", "transport", "medical", "alumni",
+     "hostel", "library", "registrar", "security", "canteen", "counselling", "research"])]
+
+
+@pytest.fixture
+def index(tmp_path):
+    texts = COURSES + NOTICES
+    ids = [f"c{i}" for i in range(len(texts))]
+    return LexicalIndex.build(str(tmp_path / "courses"), ids, texts, [{"source": f"{i}.txt"} for i in ids])
+
+
+class StaticRetriever(BaseRetriever):
+    """Stands in for the vector retriever; records every query it was asked."""
+
+    documents: list
+    queries: list = []
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.queries.append(query)
+        return self.documents
+
+
+def vector_retriever():
+    return StaticRetriever(documents=[Document(id="v1", page_content="From the vector store.")], queries=[])
+
+
+def build(directory):
+    return LexicalIndex.build(str(directory), ["a", "b"], ["CS101 covers loops.", "Hostel rules."],
+                              [{"source": "a.txt"}, {"source": "b.txt"}])
+
+
+def set_version(directory, version):
+    path = os.path.join(str(directory), INFO_FILE)
+    with open(path) as f:
+        info = json.load(f)
+    info["version"] = version
+    with open(path, "w") as f:
+        json.dump(info, f)
+
+
+def test_index_with_another_version_is_not_read(tmp_path):
+    build(tmp_path / "lexical")
+    set_version(tmp_path / "lexical", 1)
+
+    with pytest.raises(StaleIndexError):
+        LexicalIndex.load(str(tmp_path / "lexical"))
+
+
+def test_stale_index_is_rebuilt_once_at_startup(tmp_path, main_module, monkeypatch):
+    directory = tmp_path / "lexical"
+    build(directory)
+    set_version(directory, 1)
+    monkeypatch.setattr(main_module, "LEXICAL_INDEX_DIR", str(directory))
+    rebuilds = []
+
+    def rebuild():
+        rebuilds.append(True)
+        return build(directory)
+
+    first = main_module.load_lexical_index(rebuild)
+    second = main_module.load_lexical_index(rebuild)
+
+    assert len(rebuilds) == 1
+    assert first.count == second.count == 2
+
+
+@pytest.mark.parametrize("query", ["CS 101", "CS101", "cs-101", "What is CS 101?"])
+def test_spaced_and_joined_codes_find_the_same_chunk(index, query):
+    assert "cs101" in tokenize(query)
+
+    best, score, coverage = index.search(query, k=3)[0]
+
+    assert best.id == "c0"
+    assert coverage == pytest.approx(1.0)
+    assert score > 0
+
+
+def test_unknown_words_lower_coverage(index):
+    _, _, known = index.search("CS 101", k=1)[0]
+    _, _, mixed = index.search("CS 101 quantum entanglement", k=1)[0]
+
+    assert known == pytest.approx(1.0)
+    assert mixed < 0.8
+    assert index.search("quantum entanglement", k=1) == []
+
+
+def hit(doc_id, score, coverage):
+    return (Document(id=doc_id, page_content=doc_id), score, coverage)
+
+
+@pytest.mark.parametrize("query, hits, decisive", [
+    ("CS 101", [hit("a", 8.0, 1.0), hit("b", 3.0, 0.4)], True),
+    ("CS 101", [hit("a", 6.0, 1.0)], True),
+    ("CS 101", [], False),
+    # No code in the question
+    ("loops and recursion", [hit("a", 8.0, 1.0), hit("b", 3.0, 0.4)], False),
+    # Coverage below 0.8
+    ("CS 101", [hit("a", 8.0, 0.7), hit("b", 3.0, 0.4)], False),
+    # Score below 5.0
+    ("CS 101", [hit("a", 4.9, 1.0), hit("b", 1.0, 0.4)], False),
+    # Less than a 2x margin over the runner-up
+    ("CS 101", [hit("a", 8.0, 1.0), hit("b", 4.5, 1.0)], False),
+    ("CS 101", [hit("a", 8.0, 1.0), hit("b", 4.0, 1.0)], True),
+])
+def test_decisive_rule(query, hits, decisive):
+    retriever = HybridRetriever(vector_retriever=vector_retriever(), lexical=None)
+
+    assert retriever._is_decisive(query, hits) is decisive
+
+
+def test_decisive_lexical_hit_skips_the_vector_search(index):
+    vector = vector_retriever()
+    retriever = HybridRetriever(vector_retriever=vector, lexical=index, k=3)
+
+    docs = retriever.invoke("CS 101")
+
+    assert vector.queries == []
+    assert [doc.id for doc in docs] == ["c0"]
+
+
+def test_hit_that_is_not_decisive_is_fused_with_the_vector_results(index):
+    vector = vector_retriever()
+    retriever = HybridRetriever(vector_retriever=vector, lexical=index, k=3)
+
+    docs = retriever.invoke("CS 101 quantum entanglement")
+
+    assert vector.queries == ["CS 101 quantum entanglement"]
+    # Reciprocal-rank fusion: both lists' first results tie, the vector list is ranked first
+    assert [doc.id for doc in docs] == ["v1", "c0"]
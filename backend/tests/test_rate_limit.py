@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import rate_limit
+from rate_limit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_the_burst_then_limits():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=0.5, burst=3, clock=clock)
+
+    assert [limiter.acquire("a") for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Empty bucket: the next token arrives after 1 / rate seconds
+    assert limiter.acquire("a") == pytest.approx(2.0)
+    assert limiter.stats()["allowed"] == 3
+    assert limiter.stats()["limited"] == 1
+
+
+def test_bucket_refills_at_the_rate_up_to_the_burst():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=0.5, burst=2, clock=clock)
+    limiter.acquire("a")
+    limiter.acquire("a")
+
+    clock.now += 2.0
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") > 0
+
+    # A long idle period refills only up to the burst
+    clock.now += 3600
+    assert [limiter.acquire("a") for _ in range(3)][:2] == [0.0, 0.0]
+    assert limiter.limited == 2
+
+
+def test_keys_have_separate_buckets_and_the_oldest_are_dropped():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=0.1, burst=1, max_keys=2, clock=clock)
+
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("b") == 0.0
+    assert limiter.acquire("a") > 0
+    limiter.acquire("c")
+
+    assert limiter.stats()["keys"] == 2
+    # "b" was evicted, so it comes back with a full bucket
+    assert limiter.acquire("b") == 0.0
+
+
+def test_enforce_raises_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    limiter = RateLimiter(rate=1 / 60, burst=1, clock=FakeClock())
+    rate_limit.enforce(limiter, "ip:1.2.3.4", "chat")
+
+    with pytest.raises(HTTPException) as raised:
+        rate_limit.enforce(limiter, "ip:1.2.3.4", "chat")
+
+    assert raised.value.status_code == 429
+    assert raised.value.headers["Retry-After"] == "60"
+
+
+def test_refresh_rejected_by_the_global_limit_keeps_the_client_token(main_module, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    clock = FakeClock()
+    client_limiter = RateLimiter(rate=1 / 3600, burst=2, clock=clock)
+    global_limiter = RateLimiter(rate=1 / 3600, burst=1, clock=clock)
+    monkeypatch.setattr(main_module, "refresh_limiter", client_limiter)
+    monkeypatch.setattr(main_module, "refresh_global_limiter", global_limiter)
+    global_limiter.acquire("global")
+    request = Request({"type": "http", "client": ("203.0.113.7", 5000), "headers": []})
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(main_module.refresh_rate_limit(request, None))
+
+    assert raised.value.detail.startswith("Too many requests")
+    # Both of the client's tokens are still there
+    assert client_limiter.acquire("ip:203.0.113.7") == 0.0
+    assert client_limiter.acquire("ip:203.0.113.7") == 0.0
+
+
+def forwarded_request(*forwarded_for, peer="10.0.0.2"):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded_for]
+    return Request({"type": "http", "client": (peer, 5000), "headers": headers})
+
+
+def test_client_ip_uses_the_entry_appended_by_the_trusted_proxy():
+    # The client sent "1.1.1.1"; the proxy appended the address it saw
+    request = forwarded_request("1.1.1.1, 198.51.100.9")
+
+    assert rate_limit.client_ip(request, trusted_hops=1) == "198.51.100.9"
+    assert rate_limit.client_ip(request, trusted_hops=2) == "1.1.1.1"
+    assert rate_limit.client_ip(request, trusted_hops=0) == "10.0.0.2"
+
+
+def test_spoofed_forwarded_for_does_not_change_the_bucket():
+    keys = {
+        rate_limit.client_ip(forwarded_request(f"{i}.{i}.{i}.{i}", "198.51.100.9"), trusted_hops=1)
+        for i in range(5)
+    }
+
+    assert keys == {"198.51.100.9"}
+
+
+def test_client_ip_joins_repeated_headers_and_falls_back_to_the_peer():
+    assert rate_limit.client_ip(forwarded_request("1.1.1.1", "198.51.100.9"), trusted_hops=1) == "198.51.100.9"
+    assert rate_limit.client_ip(forwarded_request(), trusted_hops=1) == "10.0.0.2"
@@ -0,0 +1,130 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from concurrency import AdmissionController
+from sessions import SessionStore, SQLiteSessionStore
+
+
+def scanned_totals(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def test_workers_share_sessions_and_totals(path):
+    first = SQLiteSessionStore(path, max_sessions=3, max_turns=2)
+    second = SQLiteSessionStore(path, max_sessions=3, max_turns=2)
+
+    first.append("a", "What is CS101?", "Intro to programming.")
+    second.append("a", "Who teaches it?", "Dr. Rao.")
+    first.append("a", "When?", "Mondays.")
+
+    assert [question for question, _ in second.history("a")[1]] == ["Who teaches it?", "When?"]
+    stats = second.stats()
+    assert (stats["sessions"], stats["bytes"]) == scanned_totals(path)
+
+
+def test_totals_follow_evictions_expiry_summaries_and_clear(path):
+    store = SQLiteSessionStore(path, max_sessions=2, max_turns=1, ttl=60, summaries=True)
+    for key in ("a", "b", "c"):
+        store.append(key, f"question {key}", "answer " * 20)
+    assert store.evictions == 1
+    assert (store.stats()["sessions"], store.stats()["bytes"]) == scanned_totals(path) == (2, store.total_bytes)
+
+    # A second turn pushes the first into the summary queue
+    assert store.append("c", "follow-up", "more") is True
+    summary, turns = store.take_pending("c")
+    assert turns == [("question c", "answer " * 20)]
+    store.set_summary("c", "Asked about c.")
+    assert (store.stats()["sessions"], store.stats()["bytes"]) == scanned_totals(path)
+
+    store.ttl = 0.01
+    time.sleep(0.02)
+    store.append("d", "new", "session")
+    assert store.expirations == 2
+    assert (store.stats()["sessions"], store.stats()["bytes"]) == scanned_totals(path) == (1, store.total_bytes)
+
+    store.clear()
+    assert store.stats()["sessions"] == 0
+    assert store.stats()["bytes"] == 0
+
+
+def test_totals_are_counted_once_for_an_existing_file(path):
+    store = SQLiteSessionStore(path)
+    store.append("a", "q", "a")
+    with sqlite3.connect(path) as conn:
+        conn.execute("DROP TABLE session_totals")
+
+    reopened = SQLiteSessionStore(path)
+
+    assert (reopened.stats()["sessions"], reopened.stats()["bytes"]) == scanned_totals(path)
+
+
+def test_waiting_for_another_workers_lock_does_not_block_the_event_loop(path):
+    store = SQLiteSessionStore(path, timeout=5)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        append = asyncio.create_task(store.aappend("a", "q", "a"))
+        await asyncio.sleep(0.3)
+        other.execute("COMMIT")
+        await append
+        ticking.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
+    assert store.history("a")[1] == [("q", "a")]
+
+
+def test_memory_store_has_the_same_async_entry_points():
+    store = SessionStore(max_turns=1, summaries=True)
+
+    async def scenario():
+        await store.aappend("a", "first", "one")
+        assert await store.aappend("a", "second", "two") is True
+        summary, turns = await store.atake_pending("a")
+        await store.aset_summary("a", "Asked about one.")
+        return turns, await store.ahistory("a")
+
+    turns, history = asyncio.run(scenario())
+    assert turns == [("first", "one")]
+    assert history == ("Asked about one.", [("second", "two")])
+
+
+@pytest.mark.parametrize("sqlite", [False, True])
+def test_rejected_summary_keeps_its_turns_queued(main_module, monkeypatch, path, sqlite):
+    store = SQLiteSessionStore(path, max_turns=1, summaries=True) if sqlite else SessionStore(max_turns=1, summaries=True)
+    saturated = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout=0.05)
+    monkeypatch.setattr(main_module, "session_store", store)
+    monkeypatch.setattr(main_module, "chat_limiter", saturated)
+
+    async def scenario():
+        await saturated.acquire()
+        await store.aappend("a", "first", "one")
+        assert await store.aappend("a", "second", "two") is True
+        await main_module.summarize_session("a")
+        # The deferred summary starts again with the next turn, and nothing was lost
+        restarted = await store.aappend("a", "third", "three")
+        return restarted, await store.atake_pending("a")
+
+    restarted, (summary, turns) = asyncio.run(scenario())
+    assert restarted is True
+    assert summary == ""
+    assert turns == [("first", "one"), ("second", "two")]
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+
+import pytest
+
+from jobs import JobBusy, JobRunner
+from shared_state import SharedState
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two workers' coordinators over the same directory."""
+    directory = str(tmp_path / "shared_state")
+    return SharedState(directory), SharedState(directory)
+
+
+def test_generation_bump_is_seen_by_the_other_worker_once(workers):
+    first, second = workers
+    assert first.changed() is None
+
+    assert second.bump("refresh") == 1
+    assert second.changed() is None
+    assert first.changed() == 1
+
+    first.seen_generation = 1
+    assert first.changed() is None
+    assert first.bump("refresh") == 2
+    assert second.changed() == 2
+
+
+def test_lock_is_exclusive_across_workers_until_released(workers):
+    first, second = workers
+    lock = first.acquire("refresh-data")
+
+    assert lock is not None
+    assert second.acquire("refresh-data") is None
+
+    lock.release()
+    other = second.acquire("refresh-data")
+    assert other is not None
+    other.release()
+
+
+def test_running_job_is_reported_and_reused_by_the_other_worker(workers):
+    first, second = workers
+    started, finish = threading.Event(), threading.Event()
+
+    def work(job):
+        started.set()
+        finish.wait(5)
+        job.progress(blobs_processed=3)
+        return {"chunks": 7}
+
+    async def scenario():
+        runner, other = JobRunner(shared=first), JobRunner(shared=second)
+        job, created = runner.submit("refresh-data", work)
+        await asyncio.to_thread(started.wait, 5)
+
+        running = other.get(job.id)
+        reused, reused_created = other.submit("refresh-data", work)
+
+        finish.set()
+        await asyncio.gather(*runner._tasks)
+        return job, created, running, reused, reused_created, other.get(job.id)
+
+    job, created, running, reused, reused_created, finished = asyncio.run(scenario())
+
+    assert created is True
+    assert running.status == "running"
+    assert (reused.id, reused_created) == (job.id, False)
+    assert finished.status == "succeeded"
+    assert finished.blobs_processed == 3
+    assert finished.result == {"chunks": 7}
+    # The lock is released with the job
+    lock = second.acquire("refresh-data")
+    assert lock is not None
+    lock.release()
+
+
+def test_lock_held_without_a_job_makes_submit_busy(workers):
+    first, second = workers
+    lock = first.acquire("refresh-data")
+    first.set_owner("refresh-data", None)
+
+    async def scenario():
+        JobRunner(shared=second).submit("refresh-data", lambda job: {})
+
+    with pytest.raises(JobBusy):
+        asyncio.run(scenario())
+    lock.release()
+
+
+def test_refresh_answers_409_while_another_process_holds_the_lock(client, main_module, monkeypatch, workers):
+    first, second = workers
+    monkeypatch.setattr(main_module, "job_runner", JobRunner(shared=second))
+    # What `python ingest.py` does while it syncs
+    lock = first.acquire("refresh-data")
+    first.set_owner("refresh-data", None)
+    try:
+        response = client.post("/api/refresh-data")
+    finally:
+        lock.release()
+
+    assert response.status_code == 409
@@ -0,0 +1,122 @@
+import asyncio
+import json
+
+import pytest
+
+from fakes import FakeRetriever
+from streaming import stream_chat_events
+
+
+class FailingRetriever(FakeRetriever):
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        raise RuntimeError("vector store unavailable")
+
+
+class StaticRetriever:
+    async def ainvoke(self, query, config=None):
+        return []
+
+
+class TokenStream:
+    """Upstream token iterator that yields `tokens`, then raises `error` (or stops), and records aclose()."""
+
+    def __init__(self, tokens, error=None):
+        self.tokens = list(tokens)
+        self.error = error
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.tokens:
+            return self.tokens.pop(0)
+        if self.error is not None:
+            raise self.error
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        self.closed = True
+
+
+class StreamChain:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def astream(self, inputs, config=None):
+        return self.stream
+
+
+def read_frames(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_stream_frames_are_sources_then_tokens_then_done(client, main_module):
+    response = client.post("/api/chat/stream", json={"question": "When is the library open?"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    frames = read_frames(response)
+    types = [frame["type"] for frame in frames]
+    assert types[0] == "sources"
+    assert types[-1] == "done"
+    assert set(types[1:-1]) == {"token"}
+    assert frames[0]["sources"][0]["source"] == "doc_0.txt"
+    answer = "".join(frame["text"] for frame in frames[1:-1])
+    assert answer == main_module.llm.answer
+    assert frames[-1]["chunks"] == len(frames) - 2
+    assert frames[-1]["answer_chars"] == len(answer)
+
+
+def test_cached_stream_keeps_the_frame_order(client, main_module):
+    question = {"question": "What are the hostel rules?"}
+    client.post("/api/chat/stream", json=question)
+
+    frames = read_frames(client.post("/api/chat/stream", json=question))
+
+    assert [frame["type"] for frame in frames] == ["sources", "token", "done"]
+    assert frames[-1]["cached"] is True
+
+
+def test_retrieval_failure_yields_a_single_error_frame(client, main_module, monkeypatch):
+    state = main_module.RagState(retriever=FailingRetriever(documents=[]), chain=main_module.rag.chain)
+    monkeypatch.setattr(main_module, "rag", state)
+
+    response = client.post("/api/chat/stream", json={"question": "What is the fee structure?"})
+
+    assert response.status_code == 200
+    frames = read_frames(response)
+    assert len(frames) == 1
+    assert frames[0]["type"] == "error"
+    assert frames[0]["stage"] == "retrieval"
+    assert "vector store unavailable" in frames[0]["error"]
+
+
+@pytest.mark.parametrize("error, last_frame", [
+    (None, "done"),
+    (RuntimeError("connection reset"), "error"),
+])
+def test_upstream_stream_is_closed_when_generation_ends(error, last_frame):
+    upstream = TokenStream(["Hello", " world"], error)
+
+    async def scenario():
+        return [event async for event in stream_chat_events(StaticRetriever(), StreamChain(upstream), "Hi?")]
+
+    frames = asyncio.run(scenario())
+
+    assert frames[-1]["type"] == last_frame
+    assert upstream.closed
+
+
+def test_upstream_stream_is_closed_when_the_client_goes_away():
+    upstream = TokenStream(["Hello", " world"])
+
+    async def scenario():
+        events = stream_chat_events(StaticRetriever(), StreamChain(upstream), "Hi?")
+        assert (await events.__anext__())["type"] == "sources"
+        assert (await events.__anext__())["type"] == "token"
+        await events.aclose()
+
+    asyncio.run(scenario())
+
+    assert upstream.closed
@@ -14,6 +14,8 @@ export default function ChatPage() {
   const { user } = useUser();
   const { getToken } = useAuth();
   const messagesEndRef = useRef<HTMLDivElement | null>(null);
+  // Conversation ID issued by the backend, sent back so follow-ups keep their context
+  const sessionIdRef = useRef<string | null>(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -52,6 +54,7 @@ export default function ChatPage() {
           body: JSON.stringify({
             question: input, // Changed from 'query' to 'question' to match backend
             user_name: user?.firstName || user?.fullName || "User",
+            session_id: sessionIdRef.current,
           }),
         }
       );
@@ -64,6 +67,9 @@ export default function ChatPage() {
       }
 
       const data = await response.json();
+      if (data.session_id) {
+        sessionIdRef.current = data.session_id;
+      }
       const assistantMessage =
         data.answer || "I'm sorry, I couldn't process that request.";
 